@@ -0,0 +1,135 @@
+"""
+Batch Fetch Benchmark for Mr. Mark Chatbot
+Query count and latency per handler request: one-query-per-bucket loop vs. batched GROUP BY
+(quarter / week / range handlers and branch x month comparisons).
+
+Run: python3 benchmark_batch_fetch.py [path/to/sales.db] [iterations]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import main
+from query_handlers import handle_quarter_query, handle_week_query, handle_range_query
+from comparison_engine import build_comparison_matrix
+
+
+# --- 1. Legacy per-bucket loops (the pre-batching handler behaviour) ---
+def legacy_monthly(start_date, end_date, br_id):
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    year, month = start.year, start.month
+    total = 0.0
+    while (year, month) <= (end.year, end.month):
+        total += main.fetch_monthly_sum_from_db(year, month, br_id)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return total
+
+
+def legacy_compare(branches, periods):
+    totals = {br: 0.0 for br in branches}
+    for _, m_num, m_year in periods:
+        for br in branches:
+            totals[br] += main.fetch_monthly_sum_from_db(m_year, m_num, br)
+    return totals
+
+
+def legacy_daily(start_date, end_date, br_id):
+    current = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    total = 0.0
+    while current <= end:
+        total += main.fetch_from_db(current.strftime("%Y-%m-%d"), br_id) or 0.0
+        current += timedelta(days=1)
+    return total
+
+
+# --- 2. Measurement ---
+def measure(db_path, fn, iterations):
+    """Return (selects per call, pool checkouts per call, avg ms per call)."""
+    pool = db_pool.get_pool(db_path)
+    captured = []
+
+    # Count statements on a traced connection (nested checkouts reuse it)
+    with pool.connection() as conn:
+        conn.set_trace_callback(captured.append)
+        try:
+            fn()
+        finally:
+            conn.set_trace_callback(None)
+    selects = len([q for q in captured if q.lstrip().upper().startswith("SELECT")])
+
+    # Count checkouts and time without holding an outer connection
+    before = pool.stats()["checkouts"]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    checkouts = (pool.stats()["checkouts"] - before) / iterations
+    return selects, checkouts, elapsed / iterations * 1000
+
+
+def run(db_path="sales.db", iterations=50, year=2025):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Time a migrated copy: the given database is only read
+        copy = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(db_path, copy)
+        try:
+            return _run(copy, iterations, year, label=db_path)
+        finally:
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+
+
+def _run(db_path, iterations, year, label):
+    main.DB_NAME = db_path
+    week_start = f"{year}-03-03"
+    week_end = f"{year}-03-09"
+    past_24 = main.get_past_months(24, datetime(year, 12, 15).date())
+    scenarios = [
+        ("quarter Q2 ALL",
+         lambda: legacy_monthly(f"{year}-04-01", f"{year}-06-30", "ALL"),
+         lambda: handle_quarter_query(2, year, "ALL", main.fetch_monthly_sums)),
+        ("week (7 days) br 1",
+         lambda: legacy_daily(week_start, week_end, 1),
+         lambda: handle_week_query(week_start, week_end, 1, main.fetch_daily_sums)),
+        ("range full year br 1",
+         lambda: legacy_monthly(f"{year}-01-01", f"{year}-12-31", 1),
+         lambda: handle_range_query(f"{year}-01-01", f"{year}-12-31", 1, main.fetch_monthly_sums)),
+        ("range 31 days daily ALL",
+         lambda: legacy_daily(f"{year}-01-01", f"{year}-01-31", "ALL"),
+         lambda: main.fetch_daily_sums(f"{year}-01-01", f"{year}-01-31", "ALL")),
+        ("compare 2 br x 24 months",
+         lambda: legacy_compare([1, 2], past_24),
+         lambda: build_comparison_matrix([1, 2], past_24, main.fetch_monthly_sums)),
+        ("compare 4 br x 24 months",
+         lambda: legacy_compare([1, 2, 3, 4], past_24),
+         lambda: build_comparison_matrix([1, 2, 3, 4], past_24, main.fetch_monthly_sums)),
+    ]
+
+    print(f"Database: {label}  iterations: {iterations}")
+    print(f"{'Scenario':<26}{'Queries before':>15}{'after':>7}{'Conns before':>14}{'after':>7}{'ms before':>11}{'after':>8}")
+    print("-" * 88)
+    results = []
+    for label, before_fn, after_fn in scenarios:
+        q0, c0, t0 = measure(db_path, before_fn, iterations)
+        q1, c1, t1 = measure(db_path, after_fn, iterations)
+        results.append((label, q0, q1, c0, c1, t0, t1))
+        print(f"{label:<26}{q0:>15}{q1:>7}{c0:>14.0f}{c1:>7.0f}{t0:>11.3f}{t1:>8.3f}")
+    db_pool.close_all_pools()
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    db = sys.argv[1] if len(sys.argv) > 1 else "sales.db"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run(db, n)
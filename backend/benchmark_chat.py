@@ -0,0 +1,322 @@
+"""
+Chat API Benchmark for Mr. Mark Chatbot
+Reproducible load test for POST /chat. It boots the app in process (ASGI, no server)
+on a generated synthetic sales.db of configurable size (years x branches x revenue
+accounts) and replays a weighted mix of the query types the bot answers at a target
+concurrency, with Ollama and the ERP API stubbed. It reports p50/p95/p99 latency,
+throughput and DB queries per request, overall and per query type.
+
+Results are saved as JSON; --compare prints the change against an earlier run (e.g. the
+JSON from the previous commit), so regressions show up as numbers, not impressions.
+
+Run: python3 benchmark_chat.py [--years 3] [--branches 5] [--accounts 3] [--requests 400]
+                               [--concurrency 16] [--ollama-delay 0.05] [--out FILE] [--compare FILE]
+"""
+
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import accounting
+import chat_executor
+import db_migrations
+import db_pool
+import erp_client
+import llm_cache
+import llm_scheduler
+import main
+import session_store
+import tracing
+from fake_erp import FakeERP
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request
+
+# (name, weight, role, branch_id, message): the query types of test_suite.py / TEST_PLAN.md.
+# STAFF users are pinned to their branch_id and ask without naming one.
+QUERY_MIX: List[Tuple[str, int, str, str, str]] = [
+    ("month_branch", 18, "ADMIN", "ALL", "Total sales in January 2025 branch 1"),
+    ("month_company", 8, "ADMIN", "ALL", "Total sales in January 2025 for all branches"),
+    ("year_summary", 6, "ADMIN", "ALL", "full year summary for 2025 across all branches"),
+    ("quarter", 10, "MANAGER", "ALL", "Give me a summary of Branch 1 Q1 performance"),
+    ("best_day", 6, "ADMIN", "ALL", "Which day in June had highest sale for Branch 1?"),
+    ("best_month", 6, "ADMIN", "ALL", "Best month in 2025 for branch 1"),
+    ("monthly_average", 6, "ADMIN", "ALL", "Average sales in March 2025 branch 1"),
+    ("branch_ranking", 4, "ADMIN", "ALL", "Which branch had highest sales in 2025?"),
+    ("compare_branches", 8, "ADMIN", "ALL", "Compare Branch 1 vs Branch 2 in Jan"),
+    ("staff_day", 10, "STAFF", "2", "Sales on 2025-03-09"),
+    ("today_live", 8, "ADMIN", "ALL", "Today sales all branches"),
+    ("account_balance", 4, "ADMIN", "ALL", "What is the total Sales Revenue for 2025?"),
+    ("clarification", 6, "ADMIN", "ALL", "Jan sales branch 1"),
+]
+FAILURE_ANSWERS = (main.CHAT_FALLBACK_RESPONSE["answer"], main.CHAT_BUSY_RESPONSE["answer"])
+
+
+# ===============================
+# SYNTHETIC DATABASE
+# ===============================
+def build_db(path: str, years: int = 3, branches: int = 5, accounts: int = 3, last_year: int = 2025,
+             seed: int = 42) -> int:
+    """
+    One row per branch per day (the ERP's daily key) for `years` years ending with
+    `last_year`, each booked to one of `accounts` revenue ledger accounts under
+    Operating Revenue. Same seed, same database.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT, sale_date TEXT NOT NULL,
+            amount REAL NOT NULL, br_id INTEGER DEFAULT 1, account_id INTEGER)
+    """)
+    conn.execute("""
+        CREATE TABLE accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, parent_id INTEGER, name TEXT NOT NULL,
+            level INTEGER NOT NULL, type TEXT NOT NULL, allow_ledger TEXT NOT NULL)
+    """)
+    # Default chart of accounts (migrate_accounting.py); "Sales Revenue" is ledger account 8
+    conn.executemany("INSERT INTO accounts (id, parent_id, name, level, type, allow_ledger) VALUES (?, ?, ?, ?, ?, ?)", [
+        (1, None, "Assets", 1, "ASSET", "no"), (2, None, "Income", 1, "INCOME", "no"),
+        (3, None, "Expenses", 1, "EXPENSE", "no"), (4, 1, "Current Assets", 2, "ASSET", "no"),
+        (5, 4, "Cash on Hand", 3, "ASSET", "yes"), (6, 4, "Bank Accounts", 3, "ASSET", "yes"),
+        (7, 2, "Operating Revenue", 2, "INCOME", "no"), (8, 7, "Sales Revenue", 3, "INCOME", "yes"),
+    ])
+    account_ids = [8]
+    for n in range(2, max(1, accounts) + 1):
+        cur = conn.execute("INSERT INTO accounts (parent_id, name, level, type, allow_ledger) "
+                           "VALUES (7, ?, 3, 'INCOME', 'yes')", (f"Sales Revenue {n}",))
+        account_ids.append(cur.lastrowid)
+
+    day, end = date(last_year - years + 1, 1, 1), date(last_year, 12, 31)
+    rows = []
+    while day <= end:
+        for br in range(1, branches + 1):
+            rows.append((f"Daily_Sales_{day.isoformat()}", day.isoformat(), round(rng.uniform(50_000, 5_000_000), 2),
+                         br, account_ids[(day.toordinal() + br) % len(account_ids)]))
+        day += timedelta(days=1)
+    conn.executemany("INSERT INTO sales (item_name, sale_date, amount, br_id, account_id) VALUES (?, ?, ?, ?, ?)",
+                     rows)
+    conn.commit()
+    conn.close()
+    db_migrations.ensure_schema(path)  # indexes and rollups built before timing
+    return len(rows)
+
+
+# ===============================
+# LOAD GENERATION
+# ===============================
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))  # ceil(n * q / 100)
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = sorted(s["latency_ms"] for s in samples)
+    db = [s["db_queries"] for s in samples if s["db_queries"] is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if not s["ok"]),
+        "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 3) if latencies else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "max_ms": round(latencies[-1], 3) if latencies else None,
+        "db_queries_mean": round(sum(db) / len(db), 2) if db else None,
+        "db_queries_max": max(db) if db else None,
+    }
+
+
+def build_schedule(n: int, seed: int = 42, mix: Sequence[Tuple[str, int, str, str, str]] = QUERY_MIX) -> List[Tuple]:
+    """The same `n` (name, role, branch_id, message) picks for the same seed."""
+    rng = random.Random(seed)
+    picks = rng.choices(mix, weights=[m[1] for m in mix], k=n)
+    return [(name, role, branch_id, message) for name, _, role, branch_id, message in picks]
+
+
+async def _send(request_id: str, name: str, role: str, branch_id: str, message: str) -> Dict[str, Any]:
+    # Own session per request: no follow-up context carried between picks
+    body = {"message": message, "role": role, "branch_id": branch_id, "session_id": request_id}
+    start = time.perf_counter()
+    status, chunks = await asgi_request(main.app, "POST", "/chat", body,
+                                        headers=[(b"x-request-id", request_id.encode())])
+    latency = time.perf_counter() - start
+    data = json.loads(b"".join(chunks) or b"{}")
+    trace = tracing.get_trace(request_id)
+    return {
+        "type": name,
+        "latency_ms": latency * 1000,
+        "ok": status == 200 and data.get("answer") not in FAILURE_ANSWERS,
+        "db_queries": trace["sql_count"] if trace else None,
+    }
+
+
+async def replay(schedule: List[Tuple], concurrency: int, label: str = "bench") -> Tuple[List[Dict[str, Any]], float]:
+    """Closed loop: `concurrency` clients, each sending its next request as soon as one returns."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, item in enumerate(schedule):
+        queue.put_nowait((f"{label}-{i}", *item))
+    samples: List[Dict[str, Any]] = []
+
+    async def client():
+        while not queue.empty():
+            samples.append(await _send(*queue.get_nowait()))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(max(1, concurrency))))
+    return samples, time.perf_counter() - start
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(years: int = 3, branches: int = 5, accounts: int = 3, requests: int = 400, concurrency: int = 16,
+        ollama_delay: float = 0.05, erp_delay: float = 0.01, llm_cache_enabled: bool = True, seed: int = 42,
+        out: Optional[str] = None, verbose: bool = True) -> Dict[str, Any]:
+    """Build the database, replay the mix (after one warm-up request per query type), report."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        start = time.perf_counter()
+        rows = build_db(path, years, branches, accounts, seed=seed)
+        build_s = time.perf_counter() - start
+
+        main.DB_NAME = path
+        accounting.DB_NAME = path
+        chat_executor.configure(workers=concurrency, max_pending=concurrency * 2)
+        llm_scheduler.configure(parallel=concurrency)   # the stand-in has no parallel limit
+        llm_cache.configure(ttl=llm_cache.LLM_CACHE_TTL if llm_cache_enabled else 0)
+        session_store.configure("memory")
+        tracing.configure(keep=requests + len(QUERY_MIX), slow_ms=float("inf"))
+        try:
+            with FakeOllama(delay=ollama_delay) as ollama, FakeERP(delay=erp_delay) as erp:
+                main.OLLAMA_URL = ollama.url
+                erp_client.configure(url=erp.url, branches=list(range(1, branches + 1)))
+                warmup = [(name, role, branch_id, message) for name, _, role, branch_id, message in QUERY_MIX]
+                asyncio.run(replay(warmup, 1, label="warmup"))
+                warm_ollama, warm_erp = len(ollama.requests), len(erp.requests)
+
+                samples, wall = asyncio.run(replay(build_schedule(requests, seed), concurrency))
+                ollama_calls = len(ollama.requests) - warm_ollama
+                erp_calls = len(erp.requests) - warm_erp
+        finally:
+            tracing.configure()
+            session_store.configure()
+            llm_cache.configure()
+            erp_client.configure()
+            chat_executor.configure()
+            llm_scheduler.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            accounting.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+    by_type = {}
+    for name, *_ in QUERY_MIX:
+        picked = [s for s in samples if s["type"] == name]
+        if picked:
+            by_type[name] = summarize(picked)
+    result = {
+        "benchmark": "chat",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {"years": years, "branches": branches, "accounts": accounts, "rows": rows,
+                   "requests": requests, "concurrency": concurrency, "ollama_delay_s": ollama_delay,
+                   "erp_delay_s": erp_delay, "llm_cache": llm_cache_enabled, "seed": seed},
+        "db_build_s": round(build_s, 3),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else None,
+        "ollama_calls": ollama_calls,
+        "erp_calls": erp_calls,
+        "overall": summarize(samples),
+        "by_type": by_type,
+    }
+    if out:
+        with open(out, "w") as f:
+            json.dump(result, f, indent=2)
+    if verbose:
+        print_report(result)
+        if out:
+            print(f"Saved: {out}")
+    return result
+
+
+# ===============================
+# REPORTING
+# ===============================
+def print_report(result: Dict[str, Any]):
+    cfg = result["config"]
+    print(f"Rows: {cfg['rows']:,} ({cfg['years']}y x {cfg['branches']} branches x {cfg['accounts']} accounts)"
+          f"  requests: {cfg['requests']}  concurrency: {cfg['concurrency']}  Ollama delay: {cfg['ollama_delay_s']}s")
+    print(f"Throughput: {result['throughput_rps']} req/s  wall: {result['wall_s']}s"
+          f"  Ollama calls: {result['ollama_calls']}  ERP calls: {result['erp_calls']}")
+    print(f"{'Query type':<18}{'n':>5}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db q':>7}")
+    print("-" * 65)
+    for name, s in list(result["by_type"].items()) + [("ALL", result["overall"])]:
+        print(f"{name:<18}{s['requests']:>5}{s['errors']:>5}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+              f"{s['p99_ms']:>10.1f}{s['db_queries_mean']:>7}")
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, Optional[float]]]:
+    """% change per headline number (negative latency / positive throughput = faster)."""
+    def pct(old, new):
+        return round((new - old) / old * 100, 1) if old and new is not None else None
+
+    rows = {"throughput_rps": pct(baseline.get("throughput_rps"), current.get("throughput_rps"))}
+    for key in ("p50_ms", "p95_ms", "p99_ms", "db_queries_mean"):
+        rows[key] = pct(baseline["overall"].get(key), current["overall"].get(key))
+    per_type = {name: pct(baseline.get("by_type", {}).get(name, {}).get("p95_ms"), s["p95_ms"])
+                for name, s in current.get("by_type", {}).items()}
+    return {"overall": rows, "p95_by_type": per_type}
+
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any]):
+    diff = compare(baseline, current)
+    if baseline.get("config") != current.get("config"):
+        print("⚠️ Configurations differ; numbers are not directly comparable")
+    print(f"Change vs {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):")
+    for key, value in list(diff["overall"].items()) + [(f"p95 {k}", v) for k, v in diff["p95_by_type"].items()]:
+        print(f"  {key:<24}{'n/a' if value is None else f'{value:+.1f}%':>10}")
+
+
+# Example usage
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load-test POST /chat in process on a synthetic database")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--branches", type=int, default=5)
+    parser.add_argument("--accounts", type=int, default=3, help="revenue ledger accounts")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ollama-delay", type=float, default=0.05, help="seconds per fake Ollama completion")
+    parser.add_argument("--erp-delay", type=float, default=0.01, help="seconds per fake ERP request")
+    parser.add_argument("--no-llm-cache", action="store_true", help="every analysed answer reaches Ollama")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="benchmark_chat.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    opts = parser.parse_args()
+    current = run(opts.years, opts.branches, opts.accounts, opts.requests, opts.concurrency, opts.ollama_delay,
+                  opts.erp_delay, not opts.no_llm_cache, opts.seed, opts.out)
+    if opts.compare:
+        with open(opts.compare) as f:
+            print_comparison(json.load(f), current)
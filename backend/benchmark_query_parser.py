@@ -0,0 +1,183 @@
+"""
+Query Parser Benchmark for Mr. Mark Chatbot
+Time to run the chat flow's extract_* calls over the test phrases: the per-alias regex
+loops (pre-query_parser behaviour) vs. one combined-pattern pass, cold and memoized.
+
+Run: python3 benchmark_query_parser.py [iterations]
+"""
+
+import calendar
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import query_parser
+from query_parser import MONTH_ALIASES
+
+# test_suite.py TEST_CASES messages, parameter_extractor.py examples, and extractor edge cases
+PHRASES = [
+    "Jan sales branch 1", "full year summary for 2025 across all branches",
+    "Give me a summary of Branch 1 Q1 performance", "Which day in June had highest sale for Branch 1?",
+    "Full company sales for Jan", "Compare Branch 1 vs Branch 2 in Jan", "Branch 1 and 2",
+    "How much sale having in 2025 march month?", "1",
+    "Sales on 2026-01-07", "Quarter 1 2025", "Week 2026-01-06 to 2026-01-12",
+    "Date range 2025-01-01 to 2025-03-31", "Past 3 months", "Sales in June 2025", "Total sales in 2025",
+    "Average sales for Branch 1", "Compare Branch 1 and Branch 2", "Highest performing branch this month",
+    "yesterday sales branch 2", "today", "how much sale having in 2025 march month? branch 1",
+    "sales on jan the 5th 2024", "5th of january sales", "sales on the 30th of feb", "feb 30 and mar 2",
+    "compare march and may 2024 for branch 1 vs 3", "set a goal of 1,500,000 for q2",
+    "target 2.5m in quarter 3", "decamber 2024 total", "sept 14 branch 4", "current month average",
+    "what were the sales in october and nov", "best month in 2023", "branch 2 & 5 in august",
+]
+
+# Typical extract_* calls made on one message by main._chat_pipeline
+CALLS = ["year", "year", "date", "month", "month", "month", "branch", "branches", "months", "quarter",
+         "goal", "date", "month"]
+
+
+# --- 1. Per-alias loops (the pre-query_parser extractor behaviour) ---
+def legacy_year(text):
+    match = re.search(r'\b(202[0-9])\b', text)
+    return int(match.group(1)) if match else 2025
+
+
+def legacy_date(text):
+    text = text.lower()
+    now_ist = datetime.utcnow() + timedelta(hours=5, minutes=30)
+    if "yesterday" in text:
+        return (now_ist - timedelta(days=1)).strftime("%Y-%m-%d")
+    if "today" in text:
+        return now_ist.strftime("%Y-%m-%d")
+    match_iso = re.search(r'\d{4}-\d{2}-\d{2}', text)
+    if match_iso:
+        return match_iso.group(0)
+    target_year = legacy_year(text)
+    for m_name, m_num in MONTH_ALIASES.items():
+        for match in re.finditer(fr'\b{m_name}\b\s*(?:the\s*)?(\d+)(st|nd|rd|th)?\b', text):
+            day = int(match.group(1))
+            if 1 <= day <= 31:
+                try:
+                    return date(target_year, m_num, day).strftime("%Y-%m-%d")
+                except ValueError:
+                    continue
+    for match in re.finditer(r'\b(\d+)(st|nd|rd|th)?\s+(?:of\s+)?([a-zA-Z]+)\b', text):
+        day = int(match.group(1))
+        m_name_can = match.group(3).lower()
+        if 1 <= day <= 31 and m_name_can in MONTH_ALIASES:
+            try:
+                return date(target_year, MONTH_ALIASES[m_name_can], day).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return None
+
+
+def legacy_month(text):
+    text = text.lower()
+    if "this month" in text or "current month" in text:
+        return calendar.month_name[datetime.now().month], datetime.now().month
+    for m_name, m_num in MONTH_ALIASES.items():
+        if re.search(fr'\b{m_name}\b', text):
+            return calendar.month_name[m_num], m_num
+    return None
+
+
+def legacy_months(text):
+    text = text.lower()
+    found, seen = [], set()
+    for m_name, m_num in MONTH_ALIASES.items():
+        if m_num in seen: continue
+        if re.search(fr'\b{m_name}\b', text):
+            found.append((calendar.month_name[m_num], m_num))
+            seen.add(m_num)
+    found.sort(key=lambda x: x[1])
+    return found
+
+
+def legacy_branch(text):
+    match = re.search(r'branch\s*(\d+)', text.lower())
+    return int(match.group(1)) if match else None
+
+
+def legacy_branches(text):
+    text = text.lower()
+    ids = [int(m) for m in re.findall(r'branch\s*(\d+)', text)]
+    multi_match = re.search(r'branch\s+(\d+)\s*(?:vs|and|&|,)\s*(\d+)', text)
+    if multi_match:
+        ids += [int(multi_match.group(1)), int(multi_match.group(2))]
+    return sorted(set(ids))
+
+
+def legacy_quarter(text):
+    match = re.search(r'\bq([1-4])\b', text.lower())
+    if not match: match = re.search(r'quarter\s*([1-4])', text.lower())
+    return int(match.group(1)) if match else None
+
+
+def legacy_goal(text):
+    match = re.search(r'(?:goal|target|aim).*?(\d+(?:,\d{3})*(?:\.\d+)?)\s*(m|k|million|thousand)?', text.lower())
+    if match:
+        val = float(match.group(1).replace(',', ''))
+        mult = match.group(2)
+        if mult in ['m', 'million']: val *= 1_000_000
+        elif mult in ['k', 'thousand']: val *= 1_000
+        return val
+    return None
+
+
+LEGACY = {"year": legacy_year, "date": legacy_date, "month": legacy_month, "months": legacy_months,
+          "branch": legacy_branch, "branches": legacy_branches, "quarter": legacy_quarter, "goal": legacy_goal}
+
+
+FIELDS = {"goal": "goal_amount"}
+
+
+def parsed(name, text):
+    """The same answer read from the ParsedQuery."""
+    value = getattr(query_parser.parse_query(text), FIELDS.get(name, name))
+    return list(value) if isinstance(value, tuple) and name in ("months", "branches") else value
+
+
+# --- 2. Measurement ---
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations / len(PHRASES) * 1e6   # µs per message
+
+
+def run(iterations=200):
+    def legacy():
+        for text in PHRASES:
+            for name in CALLS:
+                LEGACY[name](text)
+
+    def cold():
+        query_parser.clear_cache()
+        for text in PHRASES:
+            for name in CALLS:
+                parsed(name, text)
+
+    def warm():
+        for text in PHRASES:
+            for name in CALLS:
+                parsed(name, text)
+
+    results = [("per-alias loops", timed(legacy, iterations)), ("single pass (cold)", timed(cold, iterations)),
+               ("single pass (cached)", timed(warm, iterations))]
+    base = results[0][1]
+    print(f"{len(PHRASES)} phrases x {len(CALLS)} extract calls each, iterations: {iterations}")
+    print(f"{'Extractor':<24}{'µs / message':>14}{'speedup':>10}")
+    print("-" * 48)
+    for label, us in results:
+        print(f"{label:<24}{us:>14.1f}{base / us:>9.1f}x")
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,99 @@
+"""
+Sales Cube Benchmark for Mr. Mark Chatbot
+Latency per chat helper call answered from the SQLite rollups vs. the in-memory NumPy
+cube (sales_cube.py), on a synthetic multi-year, multi-branch database.
+
+Run: python3 benchmark_sales_cube.py [years] [branches] [iterations]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import main
+import sales_cube
+
+
+def build_db(path, years=3, branches=10, last_year=2025):
+    """One row per branch per day for `years` years ending with `last_year`."""
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT, sale_date TEXT NOT NULL,
+            amount REAL NOT NULL, br_id INTEGER DEFAULT 1, account_id INTEGER)
+    """)
+    day, end = date(last_year - years + 1, 1, 1), date(last_year, 12, 31)
+    rows = []
+    while day <= end:
+        rows += [(day.isoformat(), round(rng.uniform(500, 5000), 2), br) for br in range(1, branches + 1)]
+        day += timedelta(days=1)
+    conn.executemany("INSERT INTO sales (sale_date, amount, br_id) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    db_migrations.ensure_schema(path)  # rollups built before timing
+    return len(rows)
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def run(years=3, branches=10, iterations=200, year=2025):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        rows = build_db(path, years, branches, year)
+        main.DB_NAME = path
+        scenarios = [
+            ("day total ALL", lambda: main.fetch_from_db(f"{year}-03-09", "ALL")),
+            ("month total br 1", lambda: main.fetch_monthly_sum_from_db(year, 3, 1)),
+            ("month average ALL", lambda: main.fetch_monthly_average(year, 3, "ALL")),
+            ("year total ALL", lambda: main.fetch_year_total(year, "ALL")),
+            ("best month ALL", lambda: main.find_extreme_month(year, "max", "ALL")),
+            ("worst day in month br 2", lambda: main.find_extreme_day_in_month(year, 6, 2, "MIN")),
+            ("best branch (year)", lambda: main.get_repository().extreme_branch(year, 0, True)),
+            ("24 months x all branches", lambda: main.fetch_monthly_sums(f"{year - 1}-01-01", f"{year}-12-31",
+                                                                          "ALL", by_branch=True)),
+        ]
+        try:
+            sales_cube.configure(True)
+            start = time.perf_counter()
+            main.get_repository().ping()
+            load_ms = (time.perf_counter() - start) * 1000
+            cube = sales_cube.stats()["cubes"][0]
+            print(f"Rows: {rows:,}  cube {cube['shape']} {cube['bytes'] / 1e6:.1f} MB loaded in {load_ms:.1f} ms"
+                  f"  iterations: {iterations}")
+            print(f"{'Scenario':<28}{'sqlite ms':>11}{'cube ms':>10}{'speedup':>9}")
+            print("-" * 58)
+            results = []
+            for label, fn in scenarios:
+                sales_cube.configure(False)
+                t0 = timed(fn, iterations)
+                sales_cube.configure(True)
+                fn()  # load outside the timing
+                t1 = timed(fn, iterations)
+                results.append((label, t0, t1))
+                print(f"{label:<28}{t0:>11.3f}{t1:>10.3f}{t0 / t1 if t1 else 0:>8.1f}x")
+            return results
+        finally:
+            sales_cube.configure()
+            main.DB_NAME = "sales.db"
+            db_pool.close_all_pools()
+
+
+# Example usage
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:4]]
+    run(*args)
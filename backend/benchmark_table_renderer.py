@@ -0,0 +1,190 @@
+"""
+Table Renderer Benchmark for Mr. Mark Chatbot
+Time to format large result tables: the per-formatter code main.py used before
+table_renderer (regex per cell, strings built with +=) vs. the shared layout engine,
+on a 1,500-account hierarchy table and a three-year daily sales table with a total row.
+
+Run: python3 benchmark_table_renderer.py [iterations]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, timedelta
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import table_renderer
+
+LEGACY_HEADER_MAP = {
+    "period": "Period", "sales_lkr": "Sales", "metric": "Metric", "total_sales_lkr": "Total Sales",
+    "average_lkr": "Average Sales", "live_sales_lkr": "Live Sales", "date": "Date", "month": "Month"
+}
+
+
+def _legacy_normalize(values):
+    out = []
+    for v in values:
+        if v is None:
+            out.append("NULL")
+        elif isinstance(v, (int, float)):
+            out.append(f"{v:,.2f}" if isinstance(v, float) else str(v))
+        else:
+            out.append(str(v))
+    return out
+
+
+def legacy_psql_table(headers, rows, footer_row=None):
+    """format_psql_table / format_psql_table_with_footer before table_renderer."""
+    normalized = [_legacy_normalize(row) for row in rows]
+    normalized_footer = _legacy_normalize(footer_row) if footer_row is not None else None
+    display_headers = []
+    for h in headers:
+        lower_h = str(h).lower()
+        display_headers.append(LEGACY_HEADER_MAP[lower_h] if lower_h in LEGACY_HEADER_MAP else str(h).title())
+    col_widths = [len(h) for h in display_headers]
+    for row in normalized + ([normalized_footer] if normalized_footer is not None else []):
+        for i, cell in enumerate(row):
+            if len(cell) > col_widths[i]:
+                col_widths[i] = len(cell)
+    is_numeric_col = []
+    for col_idx in range(len(display_headers)):
+        all_numeric = True
+        for row in normalized:
+            if not re.match(r'^-?[\d,]+\.?\d*$', row[col_idx].replace(',', '')):
+                all_numeric = False
+                break
+        is_numeric_col.append(all_numeric)
+
+    def pad(text, width, align_right=False):
+        return str(text).rjust(width) if align_right else str(text).ljust(width)
+
+    lines = [" | ".join(pad(h, col_widths[i]) for i, h in enumerate(display_headers)),
+             "-+-".join("-" * w for w in col_widths)]
+    for row in normalized:
+        lines.append(" | ".join(pad(cell, col_widths[i], is_numeric_col[i]) for i, cell in enumerate(row)))
+    if normalized_footer is not None:
+        lines.append("-+-".join("-" * w for w in col_widths))
+        lines.append(" | ".join(pad(cell, col_widths[i], is_numeric_col[i])
+                                for i, cell in enumerate(normalized_footer)))
+    ascii_table = "\n".join(lines)
+    html = '<div class="gpt-codeblock">'
+    html += '<div class="gpt-header">'
+    html += '<span class="lang">pgsql</span>'
+    html += '<button class="copy-btn-code">Copy code</button>'
+    html += '</div>'
+    html += f'<pre><code>\n{ascii_table}\n</code></pre>'
+    html += '</div>'
+    return html
+
+
+def legacy_as_table(headers, rows):
+    """format_as_table before table_renderer."""
+    if not rows:
+        return ""
+    col_widths = [len(h) for h in headers]
+    for row in rows:
+        for i, cell in enumerate(row):
+            if len(str(cell)) > col_widths[i]:
+                col_widths[i] = len(str(cell))
+    column_alignments = []
+    for i in range(len(headers)):
+        is_col_numeric = True
+        for row in rows:
+            val = str(row[i]).replace("LKR", "").replace(",", "").replace("%", "").strip()
+            try:
+                float(val)
+            except ValueError:
+                if val:
+                    is_col_numeric = False
+                    break
+        column_alignments.append('right' if is_col_numeric else 'left')
+
+    def pad_strict(text, width, align='left'):
+        text = str(text)
+        return text.rjust(width) if align == 'right' else text.ljust(width)
+
+    lines = []
+    header_line = ""
+    for i, h in enumerate(headers):
+        header_line += pad_strict(h, col_widths[i]) if i == 0 else " | " + pad_strict(h, col_widths[i])
+    lines.append(header_line)
+    sep_line = ""
+    for i, w in enumerate(col_widths):
+        sep_line += "-" * w if i == 0 else "-+-" + "-" * w
+    lines.append(sep_line)
+    for row in rows:
+        row_line = ""
+        for i, cell in enumerate(row):
+            cell_str = pad_strict(cell, col_widths[i], column_alignments[i])
+            row_line += cell_str if i == 0 else " | " + cell_str
+        lines.append(row_line)
+    return "\n" + "\n".join(lines) + "\n"
+
+
+HIERARCHY_HEADERS = ["ID", "Parent", "Name", "Level", "Type", "Allow Ledger"]
+DAILY_HEADERS = ["Date", "Sales"]
+
+
+def hierarchy_rows(count=1500, seed=11):
+    """Rows the way the 'show hierarchy' handler builds them (indented names, NULL roots)."""
+    rng = random.Random(seed)
+    rows, depths = [], {}
+    for acc_id in range(1, count + 1):
+        parent = rng.randint(1, acc_id - 1) if acc_id > 5 else None
+        depth = depths[parent] + 1 if parent else 0
+        depths[acc_id] = depth
+        ledger = rng.random() < 0.7
+        rows.append([str(acc_id), str(parent) if parent else "NULL", f"{'&nbsp;&nbsp;' * depth}Account {acc_id}",
+                     str(depth + 1), rng.choice(["Asset", "Liability", "Income", "Expense"]),
+                     "<b>Yes</b>" if ledger else "No"])
+    return rows
+
+
+def daily_rows(days=1095, seed=11):
+    """Three years of daily totals, formatted like the range / week handlers."""
+    rng = random.Random(seed)
+    start = date(2023, 1, 1)
+    return [[(start + timedelta(days=i)).isoformat(), f"{rng.uniform(-5000, 2500000):,.2f}"] for i in range(days)]
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000   # ms per table
+
+
+def run(iterations=50):
+    hierarchy, daily = hierarchy_rows(), daily_rows()
+    footer = ["Total Sales", f"{sum(float(r[1].replace(',', '')) for r in daily):,.2f}"]
+    cases = [
+        ("hierarchy html", len(hierarchy),
+         lambda: legacy_psql_table(HIERARCHY_HEADERS, hierarchy),
+         lambda: table_renderer.render(HIERARCHY_HEADERS, hierarchy)),
+        ("daily html + total", len(daily),
+         lambda: legacy_psql_table(DAILY_HEADERS, daily, footer),
+         lambda: table_renderer.render(DAILY_HEADERS, daily, footer=footer)),
+        ("daily plain ascii", len(daily),
+         lambda: legacy_as_table(DAILY_HEADERS, daily),
+         lambda: "\n" + table_renderer.render(DAILY_HEADERS, daily, fmt="ascii", style="plain") + "\n"),
+    ]
+    results = []
+    for label, n, legacy, new in cases:
+        assert legacy() == new(), label   # byte-identical output
+        results.append((label, n, timed(legacy, iterations), timed(new, iterations)))
+    table_renderer.configure()
+    print(f"iterations: {iterations}")
+    print(f"{'Table':<22}{'rows':>6}{'legacy ms':>12}{'renderer ms':>13}{'speedup':>10}")
+    print("-" * 63)
+    for label, n, old_ms, new_ms in results:
+        print(f"{label:<22}{n:>6}{old_ms:>12.2f}{new_ms:>13.2f}{old_ms / new_ms:>9.1f}x")
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
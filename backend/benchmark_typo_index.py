@@ -0,0 +1,110 @@
+"""
+Typo Index Benchmark for Mr. Mark Chatbot
+Time of fuzzy_correct_months per message: difflib.get_close_matches over the twelve
+months for every word (pre-typo_index behaviour) vs. the precomputed index, cold and
+with the token memo warm.
+
+Run: python3 benchmark_typo_index.py [iterations]
+"""
+
+import difflib
+import os
+import random
+import sys
+import time
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import typo_index
+from benchmark_query_parser import PHRASES
+from typo_index import MONTHS
+
+TYPOS = ["octomber", "decamber", "janury", "februry", "mach", "octobrrrr", "septmber", "novemebr", "agust",
+         "jully", "marchh", "aprl"]
+
+
+def typo_corpus(count=400, seed=7):
+    """Month names with 1-3 random deletions / insertions / substitutions / swaps."""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = []
+    for _ in range(count):
+        w = list(rng.choice(MONTHS))
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(w))
+            op = rng.randrange(4)
+            if op == 0 and len(w) > 2:
+                del w[i]
+            elif op == 1:
+                w.insert(i, rng.choice(letters))
+            elif op == 2:
+                w[i] = rng.choice(letters)
+            elif i + 1 < len(w):
+                w[i], w[i + 1] = w[i + 1], w[i]
+        words.append("".join(w))
+    return words
+
+
+# Chat messages with typos, plus one long pasted message
+MESSAGES = PHRASES + [f"sales in {t} 2024 for branch 2" for t in TYPOS] + [
+    "hello mr mark could you please summarise the overall performance of every branch during the "
+    "octomber and novemebr period compared against the previous financial year including averages, "
+    "highest days, lowest days and the general trend because management meeting is tomorrow morning"]
+
+
+def legacy_fuzzy_correct(text):
+    """fuzzy_correct_months before typo_index (difflib per word)."""
+    corrected_words = []
+    for word in text.split():
+        clean_word = word.lower().strip(",.?!")
+        if len(clean_word) < 4:
+            corrected_words.append(word)
+            continue
+        matches = difflib.get_close_matches(clean_word, MONTHS, n=1, cutoff=0.7)
+        corrected_words.append(matches[0] if matches else word)
+    return " ".join(corrected_words)
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations / len(MESSAGES) * 1e6   # µs per message
+
+
+def run(iterations=200):
+    def legacy():
+        for msg in MESSAGES:
+            legacy_fuzzy_correct(msg)
+
+    def cold():
+        typo_index.configure()
+        for msg in MESSAGES:
+            main.fuzzy_correct_months(msg)
+
+    def warm():
+        for msg in MESSAGES:
+            main.fuzzy_correct_months(msg)
+
+    try:
+        results = [("difflib per word", timed(legacy, iterations)), ("typo index (cold memo)", timed(cold, iterations)),
+                   ("typo index (warm memo)", timed(warm, iterations))]
+        index_stats = typo_index.stats()
+    finally:
+        typo_index.configure()
+    base = results[0][1]
+    words = sum(len(m.split()) for m in MESSAGES)
+    print(f"{len(MESSAGES)} messages ({words} words), iterations: {iterations}")
+    print(f"{'Path':<26}{'µs / message':>14}{'speedup':>10}")
+    print("-" * 50)
+    for label, us in results:
+        print(f"{label:<26}{us:>14.1f}{base / us:>9.1f}x")
+    print(f"Index: {index_stats}")
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
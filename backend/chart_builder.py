@@ -0,0 +1,161 @@
+"""
+Chart Builder for Mr. Mark Chatbot
+Chart data built on the server from the query result, instead of asking TinyLlama
+to append a [CHART_JSON] block to its analysis. Handlers offer the series they
+just computed (quarter / week / range / past-N months, comparisons, best branch);
+/chat returns the first one as "chart", in the same shape the [CHART_JSON] block
+used (chart_type, title, labels, datasets) plus the unit. The LLM is then only
+asked for the 1-3 sentence note.
+
+Charts follow the visualization rules: more than one data point, and not for STAFF.
+CHART_MODE=llm restores the old behaviour (the prompt asks the model for the block).
+"""
+
+import contextvars
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# --- CONFIGURATION (env overridable) ---
+CHART_MODE = os.getenv("CHART_MODE", "server").lower()   # "server" | "llm"
+CHART_UNIT = os.getenv("CHART_UNIT", "LKR")
+
+NO_CHART_ROLES = {"STAFF"}
+SKIP_LABELS = {"DIFFERENCE"}   # summary rows that are not data points
+CHART_BLOCK_RE = re.compile(r"\s*\[CHART_JSON\].*?(?:\[/CHART_JSON\]|$)", re.S)
+
+
+def amount(value: Any) -> Optional[float]:
+    """1234.5, "1,234.50" or "1,234.50 LKR" -> 1234.5 (None when not a number)."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(CHART_UNIT, "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _chart(chart_type: str, title: str, labels: List[str], datasets: List[Dict[str, Any]],
+           unit: str) -> Dict[str, Any]:
+    return {"chart_type": chart_type, "title": title, "labels": labels, "datasets": datasets, "unit": unit}
+
+
+def series_chart(title: str, rows: Sequence[Sequence[Any]], chart_type: str = "line",
+                 series_label: str = "Sales", unit: str = CHART_UNIT) -> Optional[Dict[str, Any]]:
+    """One series from [label, amount] table rows (DIFFERENCE rows and non-numeric amounts skipped)."""
+    labels, data = [], []
+    for row in rows:
+        label = str(row[0])
+        value = amount(row[-1])
+        if label.upper() in SKIP_LABELS or value is None:
+            continue
+        labels.append(label)
+        data.append(round(value, 2))
+    if len(data) < 2:
+        return None
+    return _chart(chart_type, title, labels, [{"label": series_label, "data": data}], unit)
+
+
+def matrix_chart(title: str, matrix: Dict[str, Any], unit: str = CHART_UNIT) -> Optional[Dict[str, Any]]:
+    """
+    Bar chart of a comparison_engine matrix: one bar per branch for a single period,
+    otherwise periods on the x axis and one dataset per branch.
+    """
+    branches = matrix["branches"]
+    if len(branches) < 2:
+        return None
+    if len(matrix["periods"]) == 1:
+        return _chart("bar", title, [f"Branch {br}" for br in branches],
+                      [{"label": "Sales", "data": [round(matrix["totals"][br], 2) for br in branches]}], unit)
+    labels = [f"{name} {year}" for name, _, year in matrix["periods"]]
+    datasets = [{"label": f"Branch {br}", "data": [round(v, 2) for v in matrix["cells"][br]]} for br in branches]
+    return _chart("bar", title, labels, datasets, unit)
+
+
+def ranking_chart(title: str, totals: Dict[Any, float], descending: bool = True,
+                  unit: str = CHART_UNIT) -> Optional[Dict[str, Any]]:
+    """Bar chart of branch totals, best (or worst) first."""
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=descending)
+    return series_chart(title, [[f"Branch {br}", total] for br, total in ranked], chart_type="bar", unit=unit)
+
+
+def strip_chart_block(text: str) -> str:
+    """Drop a [CHART_JSON] block the model added anyway (server mode only)."""
+    if CHART_MODE != "server" or "[CHART_JSON]" not in text:
+        return text
+    return CHART_BLOCK_RE.sub("", text).strip()
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+# Charts offered during the current chat turn; None outside collect()
+_OFFERED: contextvars.ContextVar = contextvars.ContextVar("offered_charts", default=None)
+_COUNTS = {"offered": 0, "attached": 0, "line": 0, "bar": 0}
+_LOCK = threading.Lock()
+
+
+def server_charts() -> bool:
+    return CHART_MODE == "server"
+
+
+def enabled_for(role: str) -> bool:
+    """True when a chart would be attached for this role (lets handlers skip extra queries)."""
+    return server_charts() and (role or "").upper() not in NO_CHART_ROLES
+
+
+def offer(chart: Optional[Dict[str, Any]]):
+    """Handler hook: keep `chart` for the current turn (None is ignored)."""
+    offered = _OFFERED.get()
+    if chart is None or offered is None:
+        return
+    offered.append(chart)
+    with _LOCK:
+        _COUNTS["offered"] += 1
+
+
+@contextmanager
+def collect() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the charts offered in this context."""
+    charts: List[Dict[str, Any]] = []
+    token = _OFFERED.set(charts)
+    try:
+        yield charts
+    finally:
+        _OFFERED.reset(token)
+
+
+def pick(charts: List[Dict[str, Any]], role: str) -> Optional[Dict[str, Any]]:
+    """The chart to return for this turn, if any."""
+    if not charts or not enabled_for(role):
+        return None
+    chart = charts[0]
+    with _LOCK:
+        _COUNTS["attached"] += 1
+        _COUNTS[chart["chart_type"]] = _COUNTS.get(chart["chart_type"], 0) + 1
+    return chart
+
+
+def configure(mode: str = CHART_MODE):
+    """Switch between "server" and "llm" charts and reset counters (e.g. from tests)."""
+    global CHART_MODE
+    CHART_MODE = mode.lower()
+    with _LOCK:
+        _COUNTS.update(offered=0, attached=0, line=0, bar=0)
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        return dict(_COUNTS, mode=CHART_MODE)
+
+
+# Example usage
+if __name__ == "__main__":
+    print(series_chart("Q1 2025 Sales - Branch 1",
+                       [["January 2025", "1,250,000.00"], ["February 2025", "980,000.00"], ["March 2025", "1,100,000.00"]]))
+    print(ranking_chart("Highest Sales in 2025", {1: 5.2e6, 2: 7.9e6, 3: 4.1e6}))
+    print(strip_chart_block('Sales rose in March. [CHART_JSON] {"chart_type": "line"} [/CHART_JSON]'))
@@ -0,0 +1,167 @@
+"""
+Chat Executor for Mr. Mark Chatbot
+Bounded worker pool that keeps the blocking chat pipeline (SQLite, ERP, Ollama) off the event loop.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+# --- CONFIGURATION (env overridable) ---
+# Requests processed at the same time (each may hold an Ollama call for up to 60s)
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "8"))
+# Requests allowed in flight (running + waiting for a worker); beyond this we answer "busy"
+CHAT_MAX_PENDING = int(os.getenv("CHAT_MAX_PENDING", "64"))
+
+
+class ChatBusyError(Exception):
+    """Raised when more than max_pending chat requests are already in flight."""
+
+
+class ChatExecutor:
+    """
+    Runs sync callables on a fixed-size thread pool with an admission limit.
+
+    - Work runs inside a copy of the caller's contextvars context, so request-scoped
+      context (metrics, tracing) follows the request into the worker thread.
+    - Requests over the admission limit fail fast with ChatBusyError instead of
+      queueing without bound.
+    """
+
+    def __init__(self, workers: int = CHAT_WORKERS, max_pending: int = CHAT_MAX_PENDING):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(self.workers, int(max_pending))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._in_flight = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chat")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Await fn(*args) on the pool. Raises ChatBusyError when over capacity."""
+        with self._lock:
+            if self._in_flight >= self.max_pending:
+                self._rejected += 1
+                raise ChatBusyError(f"{self._in_flight} chat requests already in flight")
+            self._in_flight += 1
+
+        submitted = time.perf_counter()
+        ctx = contextvars.copy_context()
+
+        def _work():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                self._running += 1
+                self._wait_total += waited
+                if waited > self._wait_max:
+                    self._wait_max = waited
+            try:
+                return ctx.run(fn, *args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), _work)
+            with self._lock:
+                self._completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads (used on app shutdown and in tests)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Concurrency snapshot for /stats."""
+        with self._lock:
+            started = self._completed + self._failed + self._running
+            avg_ms = (self._wait_total / started * 1000) if started else 0.0
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "running": self._running,
+                "queued": self._in_flight - self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "queue_wait_avg_ms": round(avg_ms, 3),
+                "queue_wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_EXECUTOR = ChatExecutor()
+
+
+def get_executor() -> ChatExecutor:
+    return _EXECUTOR
+
+
+def configure(workers: int = CHAT_WORKERS, max_pending: int = CHAT_MAX_PENDING) -> ChatExecutor:
+    """Replace the shared executor (e.g. from tests or the load test)."""
+    global _EXECUTOR
+    old = _EXECUTOR
+    _EXECUTOR = ChatExecutor(workers, max_pending)
+    old.shutdown(wait=False)
+    return _EXECUTOR
+
+
+async def run(fn: Callable[..., Any], *args) -> Any:
+    """Shortcut: `await chat_executor.run(fn, *args)` on the shared executor."""
+    return await _EXECUTOR.run(fn, *args)
+
+
+def stats() -> Dict[str, Any]:
+    return _EXECUTOR.stats()
+
+
+def shutdown(wait: bool = True):
+    _EXECUTOR.shutdown(wait=wait)
+
+
+# Example usage
+if __name__ == "__main__":
+    def slow_square(x):
+        time.sleep(0.2)
+        return x * x
+
+    async def demo():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run(slow_square, i) for i in range(8)))
+        print(f"results={results} elapsed={time.perf_counter() - start:.2f}s (serial would be 1.60s)")
+        print(stats())
+
+    asyncio.run(demo())
+    shutdown()
@@ -0,0 +1,118 @@
+"""
+Comparison Engine for Mr. Mark Chatbot
+Branch x period sales matrices from a single batched query, for N-branch comparisons.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+
+Period = Tuple[str, int, int]  # (month_name, month_num, year) as returned by get_past_months
+
+
+def build_comparison_matrix(branches: List[int], periods: List[Period], fetch_monthly_sums_fn) -> Dict[str, Any]:
+    """
+    Fetch every (branch, month) cell for the comparison in one query.
+
+    Args:
+        branches: Branch IDs in display order (two or more)
+        periods: Months to compare, e.g. get_past_months(6)
+        fetch_monthly_sums_fn: Batched fetch (start_date, end_date, br_ids, by_branch=True)
+                               -> {(year, month, br_id): total}
+
+    Returns:
+        Dict with branches, periods, cells {br_id: [amount per period]} and totals {br_id: sum}
+    """
+    cells = {br: [0.0] * len(periods) for br in branches}
+    totals = {br: 0.0 for br in branches}
+    if not branches or not periods:
+        return {"branches": list(branches), "periods": list(periods), "cells": cells, "totals": totals}
+
+    # One span covering every requested month; months outside `periods` are ignored
+    keys = sorted((year, month) for _, month, year in periods)
+    (first_y, first_m), (last_y, last_m) = keys[0], keys[-1]
+    sums = fetch_monthly_sums_fn(f"{first_y}-{first_m:02d}-01", f"{last_y}-{last_m:02d}-01", list(branches), by_branch=True)
+
+    for idx, (_, month, year) in enumerate(periods):
+        for br in branches:
+            amount = sums.get((year, month, br), 0.0)
+            cells[br][idx] = amount
+            totals[br] += amount
+
+    return {"branches": list(branches), "periods": list(periods), "cells": cells, "totals": totals}
+
+
+def summary_rows(matrix: Dict[str, Any], summary_label: str) -> List[List[str]]:
+    """
+    One row per branch with its total over all periods (["entity", "Summary", "Sales"] table).
+    Two branches get a DIFFERENCE row (first - second); more get a TOTAL row.
+    """
+    branches = matrix["branches"]
+    totals = matrix["totals"]
+    rows = [[f"Branch {br}", summary_label, f"{totals[br]:,.2f}"] for br in branches]
+
+    if len(branches) == 2:
+        rows.append(["DIFFERENCE", "-", f"{totals[branches[0]] - totals[branches[1]]:,.2f}"])
+    elif len(branches) > 2:
+        rows.append(["TOTAL", "-", f"{sum(totals.values()):,.2f}"])
+    return rows
+
+
+def breakdown_table(matrix: Dict[str, Any]) -> Tuple[List[str], List[List[str]]]:
+    """Month-by-branch grid: headers ["Period", "Branch 1", ...] and one row per month."""
+    branches = matrix["branches"]
+    headers = ["Period"] + [f"Branch {br}" for br in branches]
+    rows = []
+    for idx, (month_name, _, year) in enumerate(matrix["periods"]):
+        rows.append([f"{month_name} {year}"] + [f"{matrix['cells'][br][idx]:,.2f}" for br in branches])
+    return headers, rows
+
+
+def percentage_rows(matrix: Dict[str, Any]) -> List[List[str]]:
+    """
+    Variance of every other branch against the first (base) branch
+    (["base_entity", "comparison_entity", "percentage_variance"] table).
+    """
+    branches = matrix["branches"]
+    totals = matrix["totals"]
+    base = branches[0]
+    rows = []
+    for br in branches[1:]:
+        pct_str = "N/A"
+        if totals[base] > 0:
+            pct = ((totals[base] - totals[br]) / totals[base]) * 100
+            direction = "lower" if pct >= 0 else "higher"
+            pct_str = f"{abs(pct):.2f}% {direction}"
+        rows.append([f"Branch {base}", f"Branch {br}", pct_str])
+    return rows
+
+
+def branch_list_label(branches: List[int]) -> str:
+    """'Branch 1 and Branch 2' / 'Branch 1, Branch 2 and Branch 3'."""
+    names = [f"Branch {br}" for br in branches]
+    if len(names) <= 2:
+        return " and ".join(names)
+    return ", ".join(names[:-1]) + f" and {names[-1]}"
+
+
+# Example usage
+if __name__ == "__main__":
+    # Mock batched fetch for testing
+    def mock_fetch_monthly_sums(start_date, end_date, br_ids, by_branch=False):
+        return {(2025, m, br): 1000.0 * br + m for m in range(1, 13) for br in br_ids}
+
+    periods = [("April", 4, 2025), ("May", 5, 2025), ("June", 6, 2025)]
+    matrix = build_comparison_matrix([1, 2, 3], periods, mock_fetch_monthly_sums)
+
+    print("Comparison Engine Tests:")
+    print("-" * 80)
+    print(f"\n1. Summary ({branch_list_label(matrix['branches'])}):")
+    for row in summary_rows(matrix, "Past 3 Mo"):
+        print(f"  {row}")
+    print("\n2. Breakdown:")
+    headers, rows = breakdown_table(matrix)
+    print(f"  {headers}")
+    for row in rows:
+        print(f"  {row}")
+    print("\n3. Percentage vs base:")
+    for row in percentage_rows(matrix):
+        print(f"  {row}")
@@ -0,0 +1,358 @@
+"""
+Schema Migrations for Mr. Mark Chatbot
+Versioned, idempotent migrations for the SQLite sales store (tracked via PRAGMA user_version).
+
+Run manually:   python3 db_migrations.py [path/to/sales.db] [--rebuild-rollups] [--dedupe]
+Run at startup: main.py applies pending migrations once per database file.
+
+Migration 3 adds the unique (br_id, sale_date) key. If the table already holds
+duplicate days it stops and lists them; after checking them, rerun with --dedupe
+(or MIGRATE_DEDUPE=1) to keep the newest copy of each day and log every row removed.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from typing import Callable, List, Tuple
+
+import db_pool
+
+# --- CONFIGURATION (env overridable) ---
+# Let migration 3 delete duplicate (br_id, sale_date) rows instead of refusing
+MIGRATE_DEDUPE = os.getenv("MIGRATE_DEDUPE", "0") == "1"
+# Conflicting days listed in the error when it refuses
+DUPLICATE_REPORT_LIMIT = 20
+
+
+class DuplicateDaysError(Exception):
+    """Raised by migration 3 when sales has several rows for one (br_id, sale_date); `rows` lists them."""
+
+    def __init__(self, rows: List[tuple]):
+        days = sorted({(r[1], r[2]) for r in rows})
+        listed = "\n".join(f"  br_id={r[1]} sale_date={r[2]} id={r[0]} amount={float(r[3]):,.2f}" for r in rows
+                           if (r[1], r[2]) in days[:DUPLICATE_REPORT_LIMIT])
+        more = f"\n  ... and {len(days) - DUPLICATE_REPORT_LIMIT} more days" if len(days) > DUPLICATE_REPORT_LIMIT else ""
+        super().__init__(f"{len(days)} (br_id, sale_date) days have more than one sales row:\n{listed}{more}\n"
+                         "Resolve them, or rerun with --dedupe (MIGRATE_DEDUPE=1) to keep the newest row of each day.")
+        self.rows = rows
+
+
+def _create_sales_indexes(conn: sqlite3.Connection):
+    """
+    Composite covering indexes for the hot aggregation queries.
+
+    Every fetch helper filters on a half-open sale_date range (optionally with
+    br_id or account_id) and only reads amount, so these let SQLite answer from
+    the index alone without touching the table.
+    """
+    # Branch-scoped lookups: WHERE br_id = ? AND sale_date >= ? AND sale_date < ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_br_date_amount ON sales (br_id, sale_date, amount, account_id)")
+    # All-branch lookups and per-branch rankings: WHERE sale_date >= ? AND sale_date < ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_date_br_amount ON sales (sale_date, br_id, amount, account_id)")
+    # Accounting balances when accounts are selective: WHERE account_id = ? [AND br_id = ?] AND sale_date range
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_account_br_date ON sales (account_id, br_id, sale_date, amount)")
+    conn.execute("ANALYZE sales")
+
+
+# ===============================
+# ROLLUP LAYER
+# ===============================
+# Pre-aggregated SUM/COUNT of sales per (period, br_id, account_id), kept in step
+# with the raw table by triggers so every fetch helper is a primary-key lookup.
+# NULL br_id / account_id are stored as 0 (primary key columns cannot be NULL).
+ROLLUP_TABLES = {
+    # table: [(column, definition, key expression over a sales row alias)]
+    "sales_rollup_daily": [
+        ("sale_date", "TEXT NOT NULL", "{r}.sale_date"),
+    ],
+    "sales_rollup_monthly": [
+        ("year", "INTEGER NOT NULL", "CAST(substr({r}.sale_date, 1, 4) AS INTEGER)"),
+        ("month", "INTEGER NOT NULL", "CAST(substr({r}.sale_date, 6, 2) AS INTEGER)"),
+    ],
+    "sales_rollup_yearly": [
+        ("year", "INTEGER NOT NULL", "CAST(substr({r}.sale_date, 1, 4) AS INTEGER)"),
+    ],
+}
+_ROLLUP_DIMENSIONS = [
+    ("br_id", "INTEGER NOT NULL", "COALESCE({r}.br_id, 0)"),
+    ("account_id", "INTEGER NOT NULL", "COALESCE({r}.account_id, 0)"),
+]
+
+
+def _rollup_columns(table):
+    return ROLLUP_TABLES[table] + _ROLLUP_DIMENSIONS
+
+
+def _rollup_apply_sql(table, row_alias, sign):
+    """Trigger statements adding (sign='+') or removing (sign='-') one sales row."""
+    cols = _rollup_columns(table)
+    names = ", ".join(c[0] for c in cols)
+    exprs = ", ".join(c[2].format(r=row_alias) for c in cols)
+    stmts = [
+        f"INSERT INTO {table} ({names}, total, row_count) "
+        f"VALUES ({exprs}, {sign}{row_alias}.amount, {sign}1) "
+        f"ON CONFLICT ({names}) DO UPDATE SET "
+        f"total = total + excluded.total, row_count = row_count + excluded.row_count;"
+    ]
+    if sign == "-":
+        match = " AND ".join(f"{c[0]} = {c[2].format(r=row_alias)}" for c in cols)
+        stmts.append(f"DELETE FROM {table} WHERE {match} AND row_count <= 0;")
+    return "\n".join(stmts)
+
+
+def rebuild_rollups(conn: sqlite3.Connection):
+    """Recompute every rollup table from the raw sales rows."""
+    conn.execute("DELETE FROM sales_rollup_daily")
+    conn.execute("DELETE FROM sales_rollup_monthly")
+    conn.execute("DELETE FROM sales_rollup_yearly")
+    conn.execute("""
+        INSERT INTO sales_rollup_daily (sale_date, br_id, account_id, total, row_count)
+        SELECT sale_date, COALESCE(br_id, 0), COALESCE(account_id, 0), SUM(amount), COUNT(*)
+        FROM sales GROUP BY 1, 2, 3
+    """)
+    conn.execute("""
+        INSERT INTO sales_rollup_monthly (year, month, br_id, account_id, total, row_count)
+        SELECT CAST(substr(sale_date, 1, 4) AS INTEGER), CAST(substr(sale_date, 6, 2) AS INTEGER),
+               br_id, account_id, SUM(total), SUM(row_count)
+        FROM sales_rollup_daily GROUP BY 1, 2, 3, 4
+    """)
+    conn.execute("""
+        INSERT INTO sales_rollup_yearly (year, br_id, account_id, total, row_count)
+        SELECT year, br_id, account_id, SUM(total), SUM(row_count)
+        FROM sales_rollup_monthly GROUP BY 1, 2, 3
+    """)
+
+
+def _create_rollups(conn: sqlite3.Connection):
+    """Daily / monthly / yearly rollup tables, backfill, and maintenance triggers."""
+    for table in ROLLUP_TABLES:
+        cols = _rollup_columns(table)
+        col_defs = ", ".join(f"{c[0]} {c[1]}" for c in cols)
+        key = ", ".join(c[0] for c in cols)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {col_defs},
+                total REAL NOT NULL DEFAULT 0,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({key})
+            ) WITHOUT ROWID
+        """)
+
+    rebuild_rollups(conn)
+
+    on_insert = "\n".join(_rollup_apply_sql(t, "NEW", "+") for t in ROLLUP_TABLES)
+    on_delete = "\n".join(_rollup_apply_sql(t, "OLD", "-") for t in ROLLUP_TABLES)
+    conn.execute("DROP TRIGGER IF EXISTS trg_sales_rollup_insert")
+    conn.execute("DROP TRIGGER IF EXISTS trg_sales_rollup_delete")
+    conn.execute("DROP TRIGGER IF EXISTS trg_sales_rollup_update")
+    conn.execute(f"CREATE TRIGGER trg_sales_rollup_insert AFTER INSERT ON sales BEGIN\n{on_insert}\nEND")
+    conn.execute(f"CREATE TRIGGER trg_sales_rollup_delete AFTER DELETE ON sales BEGIN\n{on_delete}\nEND")
+    conn.execute(
+        "CREATE TRIGGER trg_sales_rollup_update AFTER UPDATE OF sale_date, amount, br_id, account_id ON sales "
+        f"BEGIN\n{on_delete}\n{on_insert}\nEND"
+    )
+
+
+# Every row of a (br_id, sale_date) day that has more than one: id, br_id, sale_date, amount
+DUPLICATE_DAYS_SQL = """
+    SELECT s.id, s.br_id, s.sale_date, s.amount FROM sales s
+    JOIN (SELECT br_id, sale_date FROM sales WHERE br_id IS NOT NULL
+          GROUP BY br_id, sale_date HAVING COUNT(*) > 1) d
+      ON d.br_id = s.br_id AND d.sale_date = s.sale_date
+    ORDER BY s.br_id, s.sale_date, s.id
+"""
+
+
+def duplicate_rows_to_remove(duplicates: List[tuple]) -> List[int]:
+    """
+    Ids to delete before adding the unique (br_id, sale_date) key (shared with Postgres).
+
+    Raises DuplicateDaysError unless dedupe is on; with it, every row but the newest
+    (highest id) of each day, each one logged.
+    """
+    if not duplicates:
+        return []
+    if not _SETTINGS["dedupe"]:
+        raise DuplicateDaysError(duplicates)
+    keep = {}
+    for row_id, br_id, sale_date, _ in duplicates:
+        keep[(br_id, sale_date)] = row_id   # rows are ordered by id: the last one is the newest
+    removed = [r for r in duplicates if keep[(r[1], r[2])] != r[0]]
+    print(f"⚠️ Removing {len(removed)} duplicate sales rows before adding the (br_id, sale_date) key "
+          "(newest row of each day kept)")
+    for row_id, br_id, sale_date, amount in removed:
+        print(f"   removed id={row_id} br_id={br_id} sale_date={sale_date} amount={float(amount):,.2f} "
+              f"(kept id={keep[(br_id, sale_date)]})")
+    return [r[0] for r in removed]
+
+
+def _create_daily_key(conn: sqlite3.Connection):
+    """
+    One row per (br_id, sale_date): the ERP publishes a single daily total per branch.
+
+    Overlapping delete+reinsert syncs could leave duplicate days behind. They are
+    never removed silently: without dedupe the migration raises DuplicateDaysError
+    listing them; with it the newest copy (highest id) is kept, each removed row is
+    logged, and the delete trigger takes them out of the rollups.
+    The unique index is the conflict target sync_engine upserts on.
+    """
+    removed = duplicate_rows_to_remove(conn.execute(DUPLICATE_DAYS_SQL).fetchall())
+    conn.executemany("DELETE FROM sales WHERE id = ?", [(row_id,) for row_id in removed])
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_sales_br_date ON sales (br_id, sale_date)")
+
+
+def _create_query_logs(conn: sqlite3.Connection):
+    """Chat audit log written by query_logger.py (created here once instead of per insert)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            user_query TEXT,
+            intent TEXT,
+            response_text TEXT
+        )
+    """)
+
+
+def _create_slow_requests(conn: sqlite3.Connection):
+    """Span trees of chat turns slower than TRACE_SLOW_MS, written by tracing.py."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS slow_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            endpoint TEXT,
+            user_query TEXT,
+            duration_ms REAL,
+            sql_count INTEGER,
+            trace_json TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_slow_requests_request_id ON slow_requests (request_id)")
+
+
+# Ordered list of (version, description, function). Append only.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "covering indexes on sales", _create_sales_indexes),
+    (2, "daily/monthly/yearly sales rollups", _create_rollups),
+    (3, "unique (br_id, sale_date) daily key", _create_daily_key),
+    (4, "query_logs audit table", _create_query_logs),
+    (5, "slow_requests trace log", _create_slow_requests),
+]
+
+
+def _ensure_base_schema(conn: sqlite3.Connection):
+    """Same base table the original sync_year.py created, plus the accounting column."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT,
+            sale_date TEXT NOT NULL,
+            amount REAL NOT NULL,
+            br_id INTEGER DEFAULT 1
+        )
+    """)
+    columns = [info[1] for info in conn.execute("PRAGMA table_info(sales)").fetchall()]
+    if "account_id" not in columns:
+        conn.execute("ALTER TABLE sales ADD COLUMN account_id INTEGER")
+
+
+def apply_migrations(conn: sqlite3.Connection, verbose: bool = False) -> int:
+    """
+    Apply every migration newer than the database's user_version.
+
+    Returns:
+        The schema version after migrating.
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    pending = [m for m in MIGRATIONS if m[0] > current]
+    if not pending:
+        return current
+
+    _ensure_base_schema(conn)
+    conn.commit()
+    for version, description, migrate in pending:
+        if verbose:
+            print(f"Applying migration {version}: {description}...")
+        # One write transaction per migration so concurrent writers never see half a schema
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+        if verbose:
+            print(f"✅ Migration {version} applied.")
+    return current
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_SETTINGS = {"dedupe": MIGRATE_DEDUPE}
+_READY = set()
+_READY_LOCK = threading.Lock()
+
+
+def configure(dedupe: bool = MIGRATE_DEDUPE):
+    """Allow (or forbid) migration 3 to delete duplicate days (e.g. from tests or the CLI)."""
+    _SETTINGS["dedupe"] = dedupe
+
+
+def ensure_schema(db_path: str = "sales.db"):
+    """Apply pending migrations once per database file for this process."""
+    key = os.path.abspath(db_path)
+    if key in _READY:
+        return
+    with _READY_LOCK:
+        if key in _READY:
+            return
+        with db_pool.connection(db_path) as conn:
+            apply_migrations(conn)
+        _READY.add(key)
+
+
+def migrated_copy(src: str, dst: str) -> int:
+    """
+    Copy `src` to `dst` and migrate the copy, deduplicating days if needed (tests and
+    benchmarks work on a snapshot of the tracked sales.db; the original is never written).
+
+    Returns:
+        The copy's schema version.
+    """
+    shutil.copy(src, dst)
+    conn = sqlite3.connect(dst)
+    try:
+        with _READY_LOCK:
+            dedupe, _SETTINGS["dedupe"] = _SETTINGS["dedupe"], True
+            try:
+                return apply_migrations(conn)
+            finally:
+                _SETTINGS["dedupe"] = dedupe
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    db_path = args[0] if args else "sales.db"
+    configure(dedupe=MIGRATE_DEDUPE or "--dedupe" in sys.argv)
+    conn = sqlite3.connect(db_path)
+    try:
+        version = apply_migrations(conn, verbose=True)
+    except DuplicateDaysError as e:
+        print(f"❌ Migration stopped: {e}")
+        conn.close()
+        sys.exit(1)
+    if "--rebuild-rollups" in sys.argv:
+        print("Rebuilding rollups from raw sales...")
+        rebuild_rollups(conn)
+        conn.commit()
+        print("✅ Rollups rebuilt.")
+    conn.close()
+    print(f"Schema version: {version}")
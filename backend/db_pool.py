@@ -0,0 +1,257 @@
+"""
+SQLite Connection Pool for Mr. Mark Chatbot
+Shared, thread-safe pool of tuned SQLite connections used by every fetch helper.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+# --- CONFIGURATION (env overridable) ---
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+# Applied to every new connection. journal_mode=WAL lets readers run while the
+# sync jobs / query logger write; the rest trade durability-on-power-loss for speed,
+# which is fine because the ERP is the source of truth and can be re-synced.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": os.getenv("DB_CACHE_SIZE", "-16000"),      # negative = KiB (16 MB)
+    "mmap_size": os.getenv("DB_MMAP_SIZE", "268435456"),     # 256 MB
+    "temp_store": "MEMORY",
+    "busy_timeout": "5000",
+}
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections for one database file.
+
+    - Idle connections are kept in a LIFO queue so the warmest one is reused.
+    - A thread that already holds a connection gets the same one back on nested
+      checkouts (e.g. a fetch helper called from inside another), so it never
+      deadlocks against itself.
+    - Checkout latency and contention counters are tracked for stats().
+    """
+
+    def __init__(self, db_path: str, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 pragmas: Optional[Dict[str, str]] = None):
+        self.db_path = db_path
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._all = []
+
+        # Metrics
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._reused = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    # ---------------------------------------------------------
+    # CONNECTION LIFECYCLE
+    # ---------------------------------------------------------
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        # Fast path: an idle connection is ready
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Grow the pool if we are still under the limit
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                grow = True
+            else:
+                grow = False
+                self._waits += 1
+
+        if grow:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            with self._lock:
+                self._all.append(conn)
+            return conn
+
+        # Pool exhausted: wait for a release
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(f"No SQLite connection free after {self.timeout}s ({self.db_path})")
+
+    @staticmethod
+    def _close(conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            current = any(c is conn for c in self._all)
+        if not current:
+            # Checked out before close_all(): close it instead of re-queuing it
+            self._close(conn)
+            return
+        # Never hand a connection with an open transaction to the next caller
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the with-block.
+
+        Usage:
+            with pool.connection() as conn:
+                conn.execute(...)
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            # Nested checkout on the same thread: reuse, no queue traffic
+            self._local.depth += 1
+            with self._lock:
+                self._reused += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        start = time.perf_counter()
+        conn = self._acquire()
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._latency_total += elapsed
+            if elapsed > self._latency_max:
+                self._latency_max = elapsed
+
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            with self._lock:
+                self._in_use -= 1
+            self._release(conn)
+
+    def close_all(self):
+        """
+        Close every connection (used on shutdown and in tests). Idle ones are closed now;
+        checked-out ones are closed by _release when their block ends, so a query in
+        flight is never cut off and a closed connection never goes back on the queue.
+        """
+        with self._lock:
+            self._all = []
+            self._created = 0
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    # ---------------------------------------------------------
+    # METRICS
+    # ---------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and checkout latency snapshot."""
+        with self._lock:
+            checkouts = self._checkouts
+            avg_ms = (self._latency_total / checkouts * 1000) if checkouts else 0.0
+            return {
+                "db_path": self.db_path,
+                "max_size": self.max_size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": checkouts,
+                "reused_in_thread": self._reused,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "checkout_latency_avg_ms": round(avg_ms, 3),
+                "checkout_latency_max_ms": round(self._latency_max * 1000, 3),
+            }
+
+
+# ===============================
+# MODULE-LEVEL REGISTRY
+# ===============================
+_POOLS: Dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_path: str = "sales.db") -> ConnectionPool:
+    """Return the shared pool for a database file, creating it on first use."""
+    key = os.path.abspath(db_path)
+    pool = _POOLS.get(key)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(key)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                _POOLS[key] = pool
+    return pool
+
+
+def connection(db_path: str = "sales.db"):
+    """Shortcut: `with db_pool.connection(DB_NAME) as conn: ...`"""
+    return get_pool(db_path).connection()
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every pool opened by this process."""
+    return {path: pool.stats() for path, pool in list(_POOLS.items())}
+
+
+def close_all_pools():
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+# Example usage
+if __name__ == "__main__":
+    pool = get_pool("sales.db")
+    with pool.connection() as conn:
+        print("journal_mode:", conn.execute("PRAGMA journal_mode").fetchone()[0])
+        print("rows:", conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0])
+    print(pool.stats())
@@ -0,0 +1,228 @@
+"""
+Real-Time ERP Client for Mr. Mark Chatbot
+Keep-alive client for the ERP sales API: branches are fetched concurrently and the last
+response per branch is kept for a short TTL, so "today's sales all branches" costs one
+parallel round trip and repeat asks within the TTL cost none.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+import metrics
+import tracing
+from chat_executor import CHAT_WORKERS
+
+
+# --- CONFIGURATION (env overridable) ---
+ERP_URL = os.getenv("ERP_URL", "https://api.emark.live/api/mobile/sales")
+ERP_DB = os.getenv("ERP_DB", "84")
+ERP_FORWARDED_FOR = os.getenv("ERP_FORWARDED_FOR", "144.76.94.137")
+ERP_BRANCHES = [int(b) for b in os.getenv("ERP_BRANCHES", "1,2,3").split(",") if b.strip()]
+ERP_TIMEOUT = float(os.getenv("ERP_TIMEOUT", "5"))          # seconds per request (all branches run in parallel)
+ERP_CACHE_TTL = float(os.getenv("ERP_CACHE_TTL", "30"))     # seconds a branch response is reused; 0 disables
+ERP_TODAY_RANGE = os.getenv("ERP_TODAY_RANGE", "1")         # days requested for "today" (was 30)
+# Fan-out threads shared by every chat worker; 0 = CHAT_WORKERS x branches, so concurrent
+# "today" questions never queue behind each other's branch requests
+ERP_WORKERS = int(os.getenv("ERP_WORKERS", "0"))
+
+
+def _row_total(row: Dict[str, Any]) -> float:
+    """API returns 'total_sales' (older payloads: 'total_sale')."""
+    return float(row.get("total_sales", row.get("total_sale", 0)) or 0)
+
+
+class ERPClient:
+    """
+    - One keep-alive requests.Session per thread (requests.Session is not thread-safe).
+    - fetch_many() fans out one request per branch on a thread pool shared by all chat
+      workers (`workers` threads, default one per branch per chat worker).
+    - Successful responses are cached per (branch, type, year, range) for `ttl` seconds;
+      failures are never cached.
+    """
+
+    def __init__(self, url: str = ERP_URL, branches: Sequence[int] = tuple(ERP_BRANCHES),
+                 timeout: float = ERP_TIMEOUT, ttl: float = ERP_CACHE_TTL, db: str = ERP_DB,
+                 forwarded_for: str = ERP_FORWARDED_FOR, workers: int = ERP_WORKERS):
+        self.url = url
+        self.branches = [int(b) for b in branches]
+        self.timeout = float(timeout)
+        self.ttl = float(ttl)
+        self.db = db
+        self.headers = {"X-Forwarded-For": forwarded_for}
+        self._local = threading.local()
+        self.workers = int(workers) if workers and int(workers) > 0 else max(1, CHAT_WORKERS * len(self.branches))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="erp")
+        self._cache: Dict[Tuple, Tuple[float, List[Dict[str, Any]]]] = {}  # key -> (expires_at, rows)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._requests = 0
+        self._hits = 0
+        self._errors = 0
+        self._request_time = 0.0
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    # ---------------------------------------------------------
+    # FETCHING
+    # ---------------------------------------------------------
+    def fetch_rows(self, br_id: int, type_: str = "daily", year: Optional[str] = None,
+                   range_: str = ERP_TODAY_RANGE) -> List[Dict[str, Any]]:
+        """
+        Rows of one branch ('data' list of the API response), cached for ttl seconds.
+
+        Raises:
+            requests.RequestException / ValueError on network, HTTP or JSON errors.
+        """
+        year = str(year or datetime.now().year)
+        key = (int(br_id), type_, year, str(range_))
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._hits += 1
+                return entry[1]
+
+        payload = {"db": self.db, "br_id": str(br_id), "year": year, "range": str(range_), "type": type_}
+        start = time.perf_counter()
+        ok = False
+        try:
+            with tracing.span("erp.request", br_id=int(br_id), type=type_, year=year, range=str(range_)):
+                resp = self._session().post(self.url, headers=self.headers, data=payload, timeout=self.timeout)
+                resp.raise_for_status()
+                data = resp.json()
+            ok = True
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._requests += 1
+                self._request_time += elapsed
+            metrics.observe_http("erp", elapsed, ok)
+
+        rows = data.get("data", []) if isinstance(data, dict) else []
+        rows = rows if isinstance(rows, list) else []
+        if self.ttl > 0:
+            with self._lock:
+                self._cache[key] = (time.time() + self.ttl, rows)
+        return rows
+
+    def fetch_many(self, branches: Sequence[int], **kwargs) -> Dict[int, Any]:
+        """
+        {br_id: rows or Exception}, one concurrent request per uncached branch.
+        Each task runs in a copy of the caller's context, so per-request metrics see its calls.
+        """
+        futures = {b: self._pool.submit(contextvars.copy_context().run, self.fetch_rows, b, **kwargs)
+                   for b in branches}
+        results: Dict[int, Any] = {}
+        for b, future in futures.items():
+            try:
+                results[b] = future.result()
+            except Exception as e:
+                results[b] = e
+        return results
+
+    # ---------------------------------------------------------
+    # TODAY'S SALES
+    # ---------------------------------------------------------
+    def resolve_branches(self, branch_id) -> List[int]:
+        if branch_id in (None, "ALL"):
+            return list(self.branches)
+        if isinstance(branch_id, (list, tuple)):
+            return [int(b) for b in branch_id]
+        return [int(branch_id)]
+
+    def today_totals(self, branch_id="ALL") -> Dict[int, Any]:
+        """{br_id: today's total or Exception} for one branch, a list, or "ALL"."""
+        today_str = datetime.now().strftime("%Y-%m-%d")
+        totals: Dict[int, Any] = {}
+        for b, rows in self.fetch_many(self.resolve_branches(branch_id)).items():
+            if isinstance(rows, Exception):
+                totals[b] = rows
+            else:
+                totals[b] = sum(_row_total(r) for r in rows if r.get("period") == today_str)
+        return totals
+
+    def today_total(self, branch_id="ALL") -> float:
+        """Today's sales summed over the requested branches; failed branches count as 0."""
+        total = 0.0
+        for b, value in self.today_totals(branch_id).items():
+            if isinstance(value, Exception):
+                print(f"⚠️ ERP API Real-Time Error (Branch {b}): {value}")
+                continue
+            total += value
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._requests
+            return {
+                "url": self.url,
+                "branches": list(self.branches),
+                "workers": self.workers,
+                "ttl_s": self.ttl,
+                "timeout_s": self.timeout,
+                "cached": len(self._cache),
+                "requests": self._requests,
+                "hits": self._hits,
+                "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+                "errors": self._errors,
+                "avg_request_ms": round(self._request_time / self._requests * 1000, 1) if self._requests else 0.0,
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_CLIENT = ERPClient()
+
+
+def get_client() -> ERPClient:
+    return _CLIENT
+
+
+def configure(**kwargs) -> ERPClient:
+    """Replace the shared client (e.g. from tests or to change the branch list)."""
+    global _CLIENT
+    old, _CLIENT = _CLIENT, ERPClient(**kwargs)
+    old.close()
+    return _CLIENT
+
+
+def today_total(branch_id="ALL") -> float:
+    return _CLIENT.today_total(branch_id)
+
+
+def stats() -> Dict[str, Any]:
+    return _CLIENT.stats()
+
+
+# Example usage
+if __name__ == "__main__":
+    start = time.perf_counter()
+    print(f"Today (ALL): {today_total('ALL'):,.2f} LKR in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    print(f"Again (cached): {today_total('ALL'):,.2f} LKR in {time.perf_counter() - start:.3f}s")
+    print(stats())
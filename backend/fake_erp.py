@@ -0,0 +1,126 @@
+"""
+Fake ERP Server for Mr. Mark Chatbot
+Local stand-in for the ERP sales API (form-encoded POST, {"data": [...]} response), used
+by tests and benchmarks.
+
+Run: python3 fake_erp.py [port] [delay_seconds]
+Then: ERP_URL=http://127.0.0.1:<port>/api/mobile/sales uvicorn main:app
+"""
+
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+
+def default_total(br_id: int, day: str) -> float:
+    """Deterministic daily total: 1,000 LKR per branch number."""
+    return 1000.0 * br_id
+
+
+class FakeERP:
+    """
+    Threaded HTTP server answering POST /api/mobile/sales.
+
+    - `delay` seconds of simulated latency per request.
+    - Daily rows for the last `range` days (ending today) are built with `total_fn(br_id, day)`.
+    - Branches listed in `fail_branches` get HTTP 500.
+    - Every request's form fields are recorded in `requests` for assertions.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0,
+                 total_fn: Callable[[int, str], float] = default_total, fail_branches=()):
+        self.delay = delay
+        self.total_fn = total_fn
+        self.fail_branches = {int(b) for b in fail_branches}
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._active = 0
+        self.max_concurrent = 0
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                if self.path != "/api/mobile/sales":
+                    self.send_error(404)
+                    return
+                fake._handle_sales(self, form)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/mobile/sales"
+
+    def _rows(self, form: Dict[str, str]) -> List[Dict[str, Any]]:
+        br_id = int(form.get("br_id", 1))
+        days = max(1, int(form.get("range", 1)))
+        today = datetime.now().date()
+        rows = []
+        for i in range(days):
+            day = (today - timedelta(days=i)).strftime("%Y-%m-%d")
+            rows.append({"period": day, "total_sales": self.total_fn(br_id, day)})
+        return rows
+
+    def _handle_sales(self, handler: BaseHTTPRequestHandler, form: Dict[str, str]):
+        with self._lock:
+            self.requests.append(form)
+            self._active += 1
+            self.max_concurrent = max(self.max_concurrent, self._active)
+        try:
+            time.sleep(self.delay)
+            if int(form.get("br_id", 1)) in self.fail_branches:
+                status, payload = 500, {"error": "branch unavailable"}
+            else:
+                status, payload = 200, {"data": self._rows(form)}
+            data = json.dumps(payload).encode()
+            handler.send_response(status)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def start(self) -> "FakeERP":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# Example usage
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    server = FakeERP(port=port, delay=delay)
+    print(f"Fake ERP listening on {server.url} (delay {delay}s). Ctrl+C to stop.")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
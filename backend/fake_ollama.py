@@ -0,0 +1,207 @@
+"""
+Fake Ollama Server for Mr. Mark Chatbot
+Local stand-in for the Ollama HTTP API, used by tests and load tests (no model required).
+
+Run: python3 fake_ollama.py [port] [delay_seconds] [prompt_eval_seconds_per_token]
+Then: OLLAMA_URL=http://127.0.0.1:<port> uvicorn main:app
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_RESPONSE = "Branch sales are shown in the table above."
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")   # rough stand-in for the model's tokenizer
+_DURATION_RE = re.compile(r"^(-?[\d.]+)(ms|s|m|h)?$")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+
+
+def keep_alive_seconds(value: Any) -> float:
+    """Ollama keep_alive ("30m", "10s", 300, -1 = forever, 0 = unload now) in seconds (default 5m)."""
+    match = _DURATION_RE.match(str(value if value is not None else "5m").strip())
+    if not match:
+        return 300.0
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def templated_tokens(system: str, prompt: str) -> List[str]:
+    """Prompt as the model sees it (TinyLlama chat template), split into tokens."""
+    text = (f"<|system|>\n{system}</s>\n" if system else "") + f"<|user|>\n{prompt}</s>\n<|assistant|>\n"
+    return _TOKEN_RE.findall(text)
+
+
+class FakeOllama:
+    """
+    Threaded HTTP server answering POST /api/generate.
+
+    - `delay` seconds of simulated generation time per request (time to first token
+      when streaming).
+    - `response` is the text returned to every prompt; with "stream": true it is sent
+      word by word as NDJSON lines, `token_delay` seconds apart.
+    - Prompt evaluation works like a loaded model's KV cache: the last evaluated prompt
+      is kept per model until its keep_alive runs out, and only the tokens after the
+      common prefix are evaluated, `prompt_eval_delay` seconds each. The counts are
+      reported as prompt_eval_count / prompt_eval_duration and summed in
+      `prompt_eval_tokens`.
+    - `models` maps extra model names to the SYSTEM baked into them (a model created
+      from a Modelfile); a request's own "system" overrides it.
+    - Every request body is recorded in `requests` for assertions.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0,
+                 response: str = DEFAULT_RESPONSE, token_delay: float = 0.0, prompt_eval_delay: float = 0.0,
+                 models: Optional[Dict[str, str]] = None):
+        self.delay = delay
+        self.response = response
+        self.token_delay = token_delay
+        self.prompt_eval_delay = prompt_eval_delay
+        self.models = dict(models or {})
+        self.requests: List[Dict[str, Any]] = []
+        self.prompt_eval_tokens = 0
+        self._loaded: Dict[str, Any] = {}   # model -> (evaluated tokens, expiry or None)
+        self._lock = threading.Lock()
+        self._active = 0
+        self.max_concurrent = 0
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive and chunked streaming, like the real Ollama server
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    body = {}
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                fake._handle_generate(self, body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _evaluate(self, body: Dict[str, Any]) -> int:
+        """Prompt tokens to evaluate for this request (the rest is reused from the KV cache)."""
+        model = body.get("model", "tinyllama")
+        tokens = templated_tokens(body.get("system", self.models.get(model, "")), body.get("prompt", ""))
+        keep = keep_alive_seconds(body.get("keep_alive"))
+        now = time.monotonic()
+        with self._lock:
+            cached, expires = self._loaded.get(model, ([], None))
+            if expires is not None and now > expires:
+                cached = []   # unloaded after keep_alive
+            reused = 0
+            for old, new in zip(cached, tokens[:-1]):   # the last token is always evaluated
+                if old != new:
+                    break
+                reused += 1
+            if keep == 0:
+                self._loaded.pop(model, None)
+            else:
+                self._loaded[model] = (tokens, None if keep < 0 else now + keep)
+            self.prompt_eval_tokens += len(tokens) - reused
+        return len(tokens) - reused
+
+    def _handle_generate(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]):
+        with self._lock:
+            self.requests.append(body)
+            self._active += 1
+            self.max_concurrent = max(self.max_concurrent, self._active)
+        try:
+            start = time.perf_counter()
+            evaluated = self._evaluate(body)
+            time.sleep(evaluated * self.prompt_eval_delay)
+            prompt_eval = {"prompt_eval_count": evaluated,
+                           "prompt_eval_duration": int((time.perf_counter() - start) * 1e9)}
+            time.sleep(self.delay)
+            if body.get("stream", True):
+                self._stream_tokens(handler, body, start, prompt_eval)
+                return
+            payload = {
+                "model": body.get("model", "tinyllama"),
+                "response": self.response,
+                "done": True,
+                "total_duration": int((time.perf_counter() - start) * 1e9),
+                **prompt_eval,
+            }
+            data = json.dumps(payload).encode()
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _stream_tokens(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any], start: float,
+                       prompt_eval: Dict[str, int]):
+        # One NDJSON line per HTTP chunk (Transfer-Encoding: chunked)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def write_chunk(data: bytes):
+            handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+
+        model = body.get("model", "tinyllama")
+        tokens = re.findall(r"\s*\S+", self.response)
+        try:
+            for i, token in enumerate(tokens):
+                if i and self.token_delay:
+                    time.sleep(self.token_delay)
+                line = {"model": model, "response": token, "done": False}
+                write_chunk(json.dumps(line).encode() + b"\n")
+            final = {"model": model, "response": "", "done": True,
+                     "total_duration": int((time.perf_counter() - start) * 1e9), **prompt_eval}
+            write_chunk(json.dumps(final).encode() + b"\n")
+            write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True  # client stopped reading (e.g. firewall cut the stream)
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# Example usage
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11435
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    eval_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server = FakeOllama(port=port, delay=delay, prompt_eval_delay=eval_delay)
+    print(f"Fake Ollama listening on {server.url} (delay {delay}s). Ctrl+C to stop.")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,85 +1,267 @@
+"""
+Sales Importer for Mr. Mark Chatbot
+Streams a JSON array (or JSON lines) of daily totals into the sales store in batches,
+skipping (or updating) days already stored for the branch, on SQLite or Postgres.
+
+Run: python3 import_sales.py [sales_2025.json] [--backend sqlite|postgres] [--db sales.db]
+                             [--branch 1] [--update]
+"""
+
+import csv
+import io
 import json
-import psycopg2
 import os
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import db_migrations
+import db_pool
+from sales_repository import DB_BACKEND, PG_CONFIG, SQLITE_DB, prepare_postgres_schema
+from sync_engine import sales_account_id
+
+
+# --- CONFIGURATION (env overridable) ---
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "5000"))        # rows per INSERT batch / transaction
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", "65536"))       # characters read from the file at a time
+
+ITEM_NAME = "Imported_Sale"  # distinguishes imported rows from ERP syncs
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+# ===============================
+# STREAMING PARSER
+# ===============================
+def iter_json_records(fp: TextIO, chunk_size: int = IMPORT_CHUNK) -> Iterator[Any]:
+    """
+    Yield the top-level values of a JSON array or JSON-lines file one at a time.
+
+    Only one chunk plus the record being decoded is held in memory, so multi-year
+    files import in constant space.
+
+    Raises:
+        json.JSONDecodeError on malformed input.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    while True:
+        # Skip array brackets, separators and whitespace between records
+        while pos < len(buf) and buf[pos] in "[], \t\r\n":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = fp.read(chunk_size)  # record spans the chunk boundary
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield value
+        pos = end
+
 
-# 1. Database Configuration
-# Using the standard Docker credentials for MarkSolution
-DB_CONFIG = {
-    "host": "localhost", # Running from host machine (or 'db' if inside docker)
-    "database": "marksolution",
-    "user": "markuser",
-    "password": "markpass",
-    "port": "5432"
-}
-
-def import_sales_data(json_file_path):
-    print(f"🚀 Starting import from {json_file_path}...")
-    
+def parse_record(record: Any, default_branch: int = 1) -> Optional[Tuple[str, float, int]]:
+    """(sale_date, amount, br_id) from one record, or None when it is unusable."""
+    if not isinstance(record, dict):
+        return None
+    # Flexible Parsing: Handle various key names (and the 'total_sale' typo)
+    sale_date = record.get("date") or record.get("period") or record.get("sale_date")
+    amount = next((record[k] for k in ("total_sales", "total_sale", "amount") if record.get(k) is not None), None)
+    if not sale_date or amount is None or not _DATE_RE.match(str(sale_date)[:10]):
+        return None
     try:
-        # 1. Read JSON Data
-        with open(json_file_path, 'r') as f:
-            data = json.load(f)
-            
-        if not isinstance(data, list):
-            print("❌ Error: JSON root must be a list of records.")
-            return
-
-        print(f"📄 Found {len(data)} records to process.")
-        
-        # 2. Connect to Database
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        
-        inserted_count = 0
-        skipped_count = 0
-        
-        # 3. Process Records
-        for record in data:
-            # Flexible Parsing: Handle various key names just in case
-            sale_date = record.get("date") or record.get("period")
-            total_sales = record.get("total_sales") or record.get("total_sale") # Handle typo
-            
-            if not sale_date or total_sales is None:
-                print(f"⚠️ Skipping invalid record: {record}")
-                continue
-                
-            # 4. Duplicate Check (Prevent overwriting)
-            cur.execute("SELECT 1 FROM sales WHERE sale_date = %s", (sale_date,))
-            exists = cur.fetchone()
-            
-            if exists:
-                skipped_count += 1
-                # print(f"⏭️  Skipping existing date: {sale_date}")
-            else:
-                # 5. Insert New Record
-                # item_name is "Imported_Sales" to distinguish source
-                cur.execute(
-                    "INSERT INTO sales (item_name, amount, sale_date) VALUES (%s, %s, %s)",
-                    ("Imported_Sale", total_sales, sale_date)
-                )
-                inserted_count += 1
-                
-        # 6. Commit Transaction
-        conn.commit()
-        
-        print("-" * 30)
-        print("✅ IMPORT COMPLETE")
-        print(f"📥 Inserted: {inserted_count}")
-        print(f"⏭️  Skipped:  {skipped_count}")
-        print("-" * 30)
-        
-        cur.close()
-        conn.close()
+        br_id = int(record.get("br_id") or record.get("branch_id") or default_branch)
+        return str(sale_date)[:10], float(amount), br_id
+    except (TypeError, ValueError):
+        return None
+
+
+# ===============================
+# BACKENDS
+# ===============================
+class SQLiteSink:
+    """Batched executemany upserts on the (br_id, sale_date) key, one transaction per batch."""
+
+    def __init__(self, db_path: str = SQLITE_DB, update: bool = False):
+        self.db_path = db_path
+        db_migrations.ensure_schema(db_path)
+        with db_pool.connection(db_path) as conn:
+            self.account_id = sales_account_id(conn)
+        on_conflict = ("DO UPDATE SET amount = excluded.amount WHERE sales.amount IS NOT excluded.amount"
+                       if update else "DO NOTHING")
+        self.sql = ("INSERT INTO sales (item_name, sale_date, amount, br_id, account_id) VALUES (?, ?, ?, ?, ?) "
+                    f"ON CONFLICT (br_id, sale_date) {on_conflict}")
+
+    def write_batch(self, rows: List[Tuple[str, float, int]]) -> int:
+        """Returns rows inserted (or changed, in update mode)."""
+        params = [(ITEM_NAME, d, a, b, self.account_id) for d, a, b in rows]
+        with db_pool.connection(self.db_path) as conn:
+            conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                written = conn.executemany(self.sql, params).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return max(written, 0)
+
+    def close(self):
+        pass
+
+
+class PostgresSink:
+    """
+    COPY each batch into a temp staging table, then one INSERT ... SELECT with
+    ON CONFLICT on the (br_id, sale_date) unique index.
+    """
 
+    def __init__(self, config: Optional[Dict[str, str]] = None, update: bool = False):
+        import psycopg2  # optional: only needed for the Postgres backend
+
+        self.conn = psycopg2.connect(**(config or PG_CONFIG))
+        on_conflict = ("DO UPDATE SET amount = EXCLUDED.amount WHERE sales.amount IS DISTINCT FROM EXCLUDED.amount"
+                       if update else "DO NOTHING")
+        # Batches arrive deduplicated (see unique_days), as ON CONFLICT requires
+        self.sql = ("INSERT INTO sales (item_name, sale_date, amount, br_id, account_id) "
+                    "SELECT item_name, sale_date, amount, br_id, account_id FROM import_stage "
+                    f"ON CONFLICT (br_id, sale_date) {on_conflict}")
+        # Branch / account columns and the unique (br_id, sale_date) key on older databases
+        prepare_postgres_schema(self.conn)
+        self.account_id = sales_account_id(self.conn)   # same booking as SQLiteSink
+        with self.conn.cursor() as cur:
+            cur.execute("""CREATE TEMP TABLE import_stage
+                           (item_name TEXT, sale_date DATE, amount NUMERIC, br_id INTEGER, account_id INTEGER)
+                           ON COMMIT DELETE ROWS""")
+        self.conn.commit()
+
+    def write_batch(self, rows: List[Tuple[str, float, int]]) -> int:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for d, a, b in rows:
+            writer.writerow((ITEM_NAME, d, a, b, self.account_id))   # None -> empty -> NULL
+        buf.seek(0)
+        try:
+            with self.conn.cursor() as cur:
+                cur.copy_expert("COPY import_stage (item_name, sale_date, amount, br_id, account_id) "
+                                "FROM STDIN WITH (FORMAT csv)", buf)
+                cur.execute(self.sql)
+                written = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return max(written, 0)
+
+    def close(self):
+        self.conn.close()
+
+
+def unique_days(rows: List[Tuple[str, float, int]]) -> List[Tuple[str, float, int]]:
+    """One row per (branch, day) for a batch: a day repeated in the batch keeps its last occurrence."""
+    return list({(d, b): (d, a, b) for d, a, b in rows}.values())
+
+
+def create_sink(backend: str = DB_BACKEND, update: bool = False, db_path: str = SQLITE_DB):
+    if backend == "postgres":
+        return PostgresSink(update=update)
+    if backend != "sqlite":
+        print(f"⚠️ Unknown DB_BACKEND '{backend}', using sqlite")
+    return SQLiteSink(db_path, update=update)
+
+
+# ===============================
+# IMPORT
+# ===============================
+def import_sales_data(json_file_path: str, backend: str = DB_BACKEND, db_path: str = SQLITE_DB,
+                      default_branch: int = 1, update: bool = False, batch_size: int = IMPORT_BATCH,
+                      chunk_size: int = IMPORT_CHUNK, verbose: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Import daily totals from a JSON file.
+
+    Days already stored for the record's branch are skipped, or overwritten with
+    update=True; a day repeated within one batch keeps its last record. Records
+    without a branch go to `default_branch`.
+
+    Returns:
+        Counters and throughput, or None if the import could not run.
+    """
+    if verbose:
+        print(f"🚀 Starting import from {json_file_path} ({backend})...")
+    result = {"records": 0, "written": 0, "skipped": 0, "invalid": 0, "batches": 0,
+              "elapsed_s": 0.0, "records_per_s": 0.0}
+    start = time.perf_counter()
+    sink = None
+    try:
+        batch: List[Tuple[str, float, int]] = []
+
+        def flush():
+            # Same rule on every backend (executemany would keep the first copy, DISTINCT ON the last)
+            written = sink.write_batch(unique_days(batch))
+            result["written"] += written
+            result["skipped"] += len(batch) - written
+            result["batches"] += 1
+            batch.clear()
+
+        with open(json_file_path, "r", encoding="utf-8") as f:
+            sink = create_sink(backend, update=update, db_path=db_path)
+            for record in iter_json_records(f, chunk_size):
+                result["records"] += 1
+                row = parse_record(record, default_branch)
+                if row is None:
+                    result["invalid"] += 1
+                    if verbose and result["invalid"] <= 5:
+                        print(f"⚠️ Skipping invalid record: {record}")
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
     except FileNotFoundError:
         print(f"❌ File not found: {json_file_path}")
-    except psycopg2.OperationalError:
-        print("❌ Could not connect to database. Is it running?")
-        print("Try running: docker-compose up db -d")
+        return None
+    except ImportError:
+        print("❌ Postgres backend needs psycopg2 (pip install psycopg2-binary)")
+        return None
     except Exception as e:
-        print(f"❌ Unexpected Error: {e}")
+        print(f"❌ Import Error: {e}")
+        return None
+    finally:
+        if sink is not None:
+            sink.close()
+
+    result["elapsed_s"] = round(time.perf_counter() - start, 3)
+    result["records_per_s"] = round(result["records"] / result["elapsed_s"], 1) if result["elapsed_s"] else 0.0
+    if verbose:
+        print("-" * 30)
+        print("✅ IMPORT COMPLETE")
+        print(f"📄 Records:  {result['records']:,} in {result['batches']} batches")
+        print(f"📥 {'Written' if update else 'Inserted'}: {result['written']:,}")
+        print(f"⏭️  Skipped:  {result['skipped']:,} (already stored)")
+        print(f"⚠️  Invalid:  {result['invalid']:,}")
+        print(f"⏱️  {result['elapsed_s']}s ({result['records_per_s']:,.0f} records/s)")
+        print("-" * 30)
+    return result
+
 
 if __name__ == "__main__":
-    # Example usage: python3 import_sales.py
-    # Ensure sales_2025.json is in the same folder
-    import_sales_data("sales_2025.json")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk import daily sales totals from JSON")
+    parser.add_argument("file", nargs="?", default="sales_2025.json")
+    parser.add_argument("--backend", default=DB_BACKEND, choices=["sqlite", "postgres"])
+    parser.add_argument("--db", default=SQLITE_DB, help="SQLite database file")
+    parser.add_argument("--branch", type=int, default=1, help="branch for records without br_id")
+    parser.add_argument("--update", action="store_true", help="overwrite amounts of days already stored")
+    opts = parser.parse_args()
+    import_sales_data(opts.file, backend=opts.backend, db_path=opts.db,
+                      default_branch=opts.branch, update=opts.update)
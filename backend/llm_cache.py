@@ -0,0 +1,217 @@
+"""
+LLM Response Cache for Mr. Mark Chatbot
+In-memory LRU (with TTL) in front of an optional SQLite store, so repeat analytical
+questions over unchanged data skip the model entirely.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import db_pool
+
+
+# --- CONFIGURATION (env overridable) ---
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))          # entries kept in memory
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))         # seconds; 0 disables the cache
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")                      # e.g. "llm_cache.db"; empty = memory only
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the answer."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+
+def make_key(role: str, question: str, data_text: str, model: str = "tinyllama") -> str:
+    """sha256 over everything the prompt depends on."""
+    raw = "\x1f".join([model, role.upper(), normalize_question(question), data_text.strip()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-level cache of final (firewall-approved) AI analyses.
+
+    - Memory: OrderedDict LRU bounded by max_entries, each entry expires after ttl.
+    - Disk (optional): SQLite table llm_cache in db_path, shared across workers and
+      restarts; disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL,
+                 db_path: Optional[str] = LLM_CACHE_DB or None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._disk_ready = False
+
+        # Metrics
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    # ---------------------------------------------------------
+    # DISK STORE
+    # ---------------------------------------------------------
+    def _ensure_table(self, conn):
+        if not self._disk_ready:
+            conn.execute("""CREATE TABLE IF NOT EXISTS llm_cache
+                            (key TEXT PRIMARY KEY,
+                             value TEXT NOT NULL,
+                             expires_at REAL NOT NULL)""")
+            conn.commit()
+            self._disk_ready = True
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                self._ensure_table(conn)
+                row = conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and row[1] <= now:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+            return (row[1], row[0]) if row else None
+        except Exception as e:
+            print(f"⚠️ LLM Cache Disk Error: {e}")
+            return None
+
+    def _disk_put(self, key: str, value: str, expires_at: float):
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                self._ensure_table(conn)
+                conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                             (key, value, expires_at))
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ LLM Cache Disk Error: {e}")
+
+    # ---------------------------------------------------------
+    # PUBLIC API
+    # ---------------------------------------------------------
+    def _remember(self, key: str, expires_at: float, value: str):
+        """Insert into the memory LRU (caller holds the lock)."""
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self._expirations += 1
+
+        if self.db_path:
+            entry = self._disk_get(key, now)
+            if entry is not None:
+                with self._lock:
+                    self._remember(key, *entry)
+                    self._hits += 1
+                    self._disk_hits += 1
+                return entry[1]
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key: str, value: str):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._stores += 1
+        if self.db_path:
+            self._disk_put(key, value, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            try:
+                with db_pool.connection(self.db_path) as conn:
+                    self._ensure_table(conn)
+                    conn.execute("DELETE FROM llm_cache")
+                    conn.commit()
+            except Exception as e:
+                print(f"⚠️ LLM Cache Disk Error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "disk": self.db_path or None,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_CACHE = LLMCache()
+
+
+def get_cache() -> LLMCache:
+    return _CACHE
+
+
+def configure(max_entries: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL,
+              db_path: Optional[str] = LLM_CACHE_DB or None) -> LLMCache:
+    """Replace the shared cache (e.g. from tests)."""
+    global _CACHE
+    _CACHE = LLMCache(max_entries, ttl, db_path)
+    return _CACHE
+
+
+def lookup(role: str, question: str, data_text: str, model: str = "tinyllama") -> Optional[str]:
+    return _CACHE.get(make_key(role, question, data_text, model))
+
+
+def store(role: str, question: str, data_text: str, analysis: str, model: str = "tinyllama"):
+    _CACHE.put(make_key(role, question, data_text, model), analysis)
+
+
+def stats() -> Dict[str, Any]:
+    return _CACHE.stats()
+
+
+# Example usage
+if __name__ == "__main__":
+    cache = configure(max_entries=2, ttl=60)
+    table = "Sales in June 2025 for Branch 1: 41,000,000.00 LKR."
+    print("miss:", lookup("ADMIN", "Sales in June 2025 branch 1", table))
+    store("ADMIN", "Sales in June 2025 branch 1", table, "June sales were 41M LKR.")
+    print("hit: ", lookup("admin", "  sales in june 2025   BRANCH 1? ", table))
+    print(stats())
@@ -0,0 +1,200 @@
+"""
+LLM Scheduler for Mr. Mark Chatbot
+Admission control in front of Ollama. Ollama runs OLLAMA_NUM_PARALLEL generations at
+a time and queues the rest internally, so chat turns beyond that only pile up behind a
+60-second timeout. Here at most `parallel` calls hold a slot, up to `queue_size` more
+wait for one in arrival order, and a turn that cannot get a slot within the wait budget
+(or finds the queue full) is answered with its table and no AI analysis.
+
+Each admitted call also gets a deadline (LLM_DEADLINE seconds from arrival, queue wait
+included): the remaining time is the Ollama timeout, and streams stop when it runs out.
+A call is counted as a "deadline" degradation only when it actually fails for it.
+"""
+
+import collections
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+import metrics
+
+# --- CONFIGURATION (env overridable) ---
+# Same variable Ollama reads: generations it runs at once
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+# Calls allowed to wait for a slot; beyond this the analysis is skipped at once
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "8"))
+# Longest wait for a slot before answering without analysis (seconds)
+LLM_QUEUE_BUDGET = float(os.getenv("LLM_QUEUE_BUDGET", "10"))
+# Whole call, queue wait included (seconds)
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", os.getenv("OLLAMA_TIMEOUT", "60")))
+
+
+class LLMBusyError(Exception):
+    """Raised when no Ollama slot is available: `reason` is queue_full, wait_budget or deadline."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class Admission:
+    """Handle yielded by LLMScheduler.slot(): time waited and the call's deadline."""
+
+    def __init__(self, waited: float, deadline_at: float):
+        self.waited = waited
+        self.deadline_at = deadline_at
+        self.missed = False
+
+    def miss_deadline(self):
+        """Record that the call was cut off by its deadline (counted once, when the slot is released)."""
+        self.missed = True
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (0 once it has passed)."""
+        return max(0.0, self.deadline_at - time.perf_counter())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+
+class LLMScheduler:
+    """
+    Bounded FIFO of callers waiting for one of `parallel` Ollama slots.
+
+    Callers are chat worker threads, so waiting blocks the thread (no extra pool).
+    """
+
+    def __init__(self, parallel: int = OLLAMA_NUM_PARALLEL, queue_size: int = LLM_QUEUE_SIZE,
+                 budget: float = LLM_QUEUE_BUDGET, deadline: float = LLM_DEADLINE):
+        self.parallel = max(1, int(parallel))
+        self.queue_size = max(0, int(queue_size))
+        self.budget = float(budget)
+        self.deadline = float(deadline)
+        self._cond = threading.Condition()
+        self._queue: "collections.deque[object]" = collections.deque()
+        self._running = 0
+
+        # Metrics
+        self._admitted = 0
+        self._degraded = {"queue_full": 0, "wait_budget": 0, "deadline": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _reject(self, reason: str, message: str):
+        # Caller holds self._cond
+        self._degraded[reason] += 1
+        metrics.count_llm_degraded(reason)
+        raise LLMBusyError(reason, message)
+
+    @contextmanager
+    def slot(self) -> Iterator[Admission]:
+        """
+        Hold an Ollama slot for the block.
+
+        Raises:
+            LLMBusyError when the queue is full or no slot frees up within the budget.
+        """
+        arrived = time.perf_counter()
+        ticket = object()
+        with self._cond:
+            if self._running >= self.parallel and len(self._queue) >= self.queue_size:
+                self._reject("queue_full", f"{len(self._queue)} LLM calls already waiting")
+            self._queue.append(ticket)
+            try:
+                admitted = self._cond.wait_for(lambda: self._running < self.parallel and self._queue[0] is ticket,
+                                               timeout=self.budget)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()   # the next ticket may now be at the head
+            waited = time.perf_counter() - arrived
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            metrics.observe_llm_wait(waited)
+            if not admitted:
+                self._reject("wait_budget", f"no LLM slot within {self.budget:g}s")
+            if waited >= self.deadline:
+                self._reject("deadline", f"LLM deadline of {self.deadline:g}s spent in the queue")
+            self._running += 1
+            self._admitted += 1
+        admission = Admission(waited, arrived + self.deadline)
+        try:
+            yield admission
+        except Exception:
+            if admission.expired:   # Ollama timed out on the remaining time
+                admission.miss_deadline()
+            raise
+        finally:
+            with self._cond:
+                self._running -= 1
+                if admission.missed:
+                    self._degraded["deadline"] += 1
+                    metrics.count_llm_degraded("deadline")
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue snapshot for /stats."""
+        with self._cond:
+            waits = self._admitted + self._degraded["wait_budget"]
+            return {
+                "parallel": self.parallel,
+                "queue_size": self.queue_size,
+                "budget_s": self.budget,
+                "deadline_s": self.deadline,
+                "running": self._running,
+                "queued": len(self._queue),
+                "admitted": self._admitted,
+                "degraded": dict(self._degraded),
+                "queue_wait_avg_ms": round(self._wait_total / waits * 1000, 3) if waits else 0.0,
+                "queue_wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_SCHEDULER = LLMScheduler()
+
+
+def get_scheduler() -> LLMScheduler:
+    return _SCHEDULER
+
+
+def configure(parallel: int = OLLAMA_NUM_PARALLEL, queue_size: int = LLM_QUEUE_SIZE,
+              budget: float = LLM_QUEUE_BUDGET, deadline: float = LLM_DEADLINE) -> LLMScheduler:
+    """Replace the shared scheduler (e.g. from tests or the load test)."""
+    global _SCHEDULER
+    _SCHEDULER = LLMScheduler(parallel, queue_size, budget, deadline)
+    return _SCHEDULER
+
+
+def slot():
+    """Shortcut: `with llm_scheduler.slot() as admission:` on the shared scheduler."""
+    return _SCHEDULER.slot()
+
+
+def stats() -> Dict[str, Any]:
+    return _SCHEDULER.stats()
+
+
+# Example usage
+if __name__ == "__main__":
+    scheduler = LLMScheduler(parallel=1, queue_size=1, budget=0.3)
+
+    def ask(i):
+        try:
+            with scheduler.slot() as admission:
+                time.sleep(0.5)
+                print(f"call {i}: answered after waiting {admission.waited:.2f}s")
+        except LLMBusyError as e:
+            print(f"call {i}: table only ({e.reason}: {e})")
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+    print(scheduler.stats())
@@ -0,0 +1,165 @@
+"""
+Chat Load Test for Mr. Mark Chatbot
+Fires concurrent /chat requests at the ASGI app in-process against a slow fake Ollama,
+comparing the old inline (event-loop blocking) pipeline with the worker-pool endpoint.
+
+Run: python3 loadtest_chat.py [concurrency] [ollama_delay_seconds] [path/to/sales.db]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import chat_executor
+import db_pool
+import main
+from fake_ollama import FakeOllama
+
+
+DEFAULT_MESSAGE = "Sales in March 2025 for Branch 1"
+
+
+# --- 1. Minimal in-process ASGI client (no httpx needed) ---
+async def asgi_request(app, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+                       headers: Optional[List[Tuple[bytes, bytes]]] = None,
+                       on_chunk: Optional[Callable[[bytes], None]] = None,
+                       response_headers: Optional[List[Tuple[str, str]]] = None) -> Tuple[int, List[bytes]]:
+    """
+    Send one HTTP request through the ASGI app; returns (status, body chunks).
+    `on_chunk` is called as each body chunk is sent (e.g. to time a stream);
+    `response_headers`, if given, receives the (lower-cased name, value) header pairs.
+    """
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())] + list(headers or []),
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.sleep(3600)  # no disconnect while the response is produced
+        return {"type": "http.disconnect"}
+
+    status = 0
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            if response_headers is not None:
+                response_headers.extend((k.decode().lower(), v.decode()) for k, v in message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                chunks.append(message["body"])
+                if on_chunk:
+                    on_chunk(message["body"])
+
+    await app(scope, receive, send)
+    return status, chunks
+
+
+async def post_chat(message: str, role: str = "ADMIN") -> Tuple[float, Dict[str, Any]]:
+    start = time.perf_counter()
+    status, chunks = await asgi_request(main.app, "POST", "/chat", {"message": message, "role": role})
+    data = json.loads(b"".join(chunks) or b"{}")
+    return time.perf_counter() - start, data
+
+
+# --- 2. Scenarios ---
+async def legacy_inline(message: str, role: str = "ADMIN") -> Tuple[float, Dict[str, Any]]:
+    """The pre-executor endpoint: sync pipeline called directly inside the coroutine."""
+    start = time.perf_counter()
+    data = main._chat_implementation_unsafe(main.ChatRequest(message=message, role=role))
+    return time.perf_counter() - start, data
+
+
+async def probe_health(stop: asyncio.Event, samples: List[float]):
+    """Measure GET / latency while chats are in flight (event-loop responsiveness)."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asgi_request(main.app, "GET", "/")
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def run_scenario(label: str, request_fn, concurrency: int, message: str) -> Dict[str, Any]:
+    stop = asyncio.Event()
+    health: List[float] = []
+    prober = asyncio.create_task(probe_health(stop, health))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(request_fn(message) for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await prober
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        "scenario": label,
+        "requests": concurrency,
+        "wall_s": round(wall, 3),
+        "latency_min_s": round(latencies[0], 3),
+        "latency_max_s": round(latencies[-1], 3),
+        "health_probes": len(health),
+        "health_max_ms": round(max(health) * 1000, 1) if health else None,
+    }
+
+
+def run(concurrency: int = 8, delay: float = 1.0, db_path: str = "sales.db",
+        message: str = DEFAULT_MESSAGE, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    main.DB_NAME = db_path
+    chat_executor.configure(workers=workers or concurrency, max_pending=max(concurrency, 1) * 2)
+
+    with FakeOllama(delay=delay) as ollama:
+        main.OLLAMA_URL = ollama.url
+
+        async def scenarios():
+            before = await run_scenario("inline (before)", legacy_inline, concurrency, message)
+            after = await run_scenario("worker pool (after)", post_chat, concurrency, message)
+            return [before, after]
+
+        results = asyncio.run(scenarios())
+        calls = len(ollama.requests)
+        peak = ollama.max_concurrent
+
+    chat_executor.shutdown()
+    db_pool.close_all_pools()
+
+    print(f"Concurrency: {concurrency}  Ollama delay: {delay}s  Ollama calls: {calls}  peak concurrent: {peak}")
+    print(f"{'Scenario':<22}{'wall s':>8}{'min s':>8}{'max s':>8}{'GET / probes':>14}{'GET / max ms':>14}")
+    print("-" * 74)
+    for r in results:
+        print(f"{r['scenario']:<22}{r['wall_s']:>8}{r['latency_min_s']:>8}{r['latency_max_s']:>8}"
+              f"{r['health_probes']:>14}{str(r['health_max_ms']):>14}")
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    d = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    db = sys.argv[3] if len(sys.argv) > 3 else "sales.db"
+    run(n, d, db)
@@ -0,0 +1,336 @@
+"""
+Metrics for Mr. Mark Chatbot
+In-process counters and latency histograms in the Prometheus text format (GET /metrics),
+with no client library needed.
+
+- stage(name): times one step of a chat turn (normalize, classify, db, erp, ollama, ...)
+  into chat_stage_seconds{stage}. Nested use of the same stage is timed once. Each
+  stage is also a span in the request's trace (tracing.py).
+- request(endpoint): scopes one chat turn. DB queries and HTTP calls made anywhere
+  below it (worker threads included, through the copied contextvars context) are
+  counted per request, and the time not covered by any stage is reported as
+  stage="other".
+"""
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import tracing
+
+
+# --- CONFIGURATION (env overridable) ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+
+# Seconds: 1 ms (regex / SQLite lookups) up to 60 s (OLLAMA_TIMEOUT)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labels, k)} {v:g}" for k, v in items]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (Prometheus semantics: le is inclusive)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def snapshot(self, **labels) -> Dict[str, Any]:
+        """count / sum / approximate quantiles (bucket upper bounds) for one label set."""
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            series = list(self._series.get(key) or [0] * (len(self.buckets) + 1) + [0.0])
+        counts, total = series[:-1], series[-1]
+        n = sum(counts)
+
+        def quantile(q):
+            if not n:
+                return None
+            running = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                if running >= q * n:
+                    return bound
+        return {"count": n, "sum": total, "p50": quantile(0.5), "p95": quantile(0.95), "p99": quantile(0.99)}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            running = 0
+            for bound, c in zip(self.buckets, series):
+                running += c
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, ('le', f'{bound:g}'))} {running}")
+            running += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_label_str(self.labels, key, ('le', '+Inf'))} {running}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {running}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+# ===============================
+# REGISTRY
+# ===============================
+REQUESTS = Counter("mrmark_chat_requests_total", "Chat turns by endpoint and outcome", ["endpoint", "outcome"])
+REQUEST_SECONDS = Histogram("mrmark_chat_request_seconds", "Wall time of a chat turn", ["endpoint"])
+STAGE_SECONDS = Histogram("mrmark_chat_stage_seconds", "Time spent per pipeline stage", ["stage"])
+DB_QUERIES = Counter("mrmark_db_queries_total", "Queries sent to the sales store", ["backend"])
+HTTP_CALLS = Counter("mrmark_http_requests_total", "Outbound HTTP calls", ["target", "outcome"])
+HTTP_SECONDS = Histogram("mrmark_http_request_seconds", "Outbound HTTP call latency", ["target"])
+DB_PER_REQUEST = Histogram("mrmark_chat_db_queries_per_request", "DB queries per chat turn", ["endpoint"],
+                           buckets=COUNT_BUCKETS)
+HTTP_PER_REQUEST = Histogram("mrmark_chat_http_calls_per_request", "Outbound HTTP calls per chat turn",
+                             ["endpoint", "target"], buckets=COUNT_BUCKETS)
+LLM_AVOIDED = Counter("mrmark_llm_calls_avoided_total", "Chat notes answered without Ollama (response_rules.py)",
+                      ["role", "shape"])
+PROMPT_EVAL_TOKENS = Counter("mrmark_ollama_prompt_eval_tokens_total",
+                             "Prompt tokens Ollama evaluated (not served from its KV cache)", ["model"])
+PROMPT_EVAL_SECONDS = Histogram("mrmark_ollama_prompt_eval_seconds", "Ollama prompt evaluation time per call",
+                                ["model"])
+LLM_QUEUE_WAIT = Histogram("mrmark_llm_queue_wait_seconds", "Time chat turns waited for an Ollama slot (llm_scheduler.py)")
+LLM_DEGRADED = Counter("mrmark_llm_degraded_total", "Chat turns answered without AI analysis for lack of an Ollama slot",
+                       ["reason"])
+
+_METRICS = [REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, DB_QUERIES, HTTP_CALLS, HTTP_SECONDS,
+            DB_PER_REQUEST, HTTP_PER_REQUEST, LLM_AVOIDED, PROMPT_EVAL_TOKENS, PROMPT_EVAL_SECONDS,
+            LLM_QUEUE_WAIT, LLM_DEGRADED]
+_GAUGES: List[Tuple[str, str, Callable[[], float]]] = []
+
+# Per-request scratch: {"db": n, "http": {target: n}, "staged": seconds}; None outside a request
+_REQUEST: contextvars.ContextVar = contextvars.ContextVar("metrics_request", default=None)
+_ACTIVE_STAGES: contextvars.ContextVar = contextvars.ContextVar("metrics_active_stages", default=())
+
+
+def register_gauge(name: str, help_text: str, fn: Callable[[], float]):
+    """Value read at scrape time (e.g. queue depth)."""
+    _GAUGES.append((name, help_text, fn))
+
+
+@contextmanager
+def stage(name: str, **attrs) -> Iterator[Optional[tracing.Span]]:
+    """
+    Time a pipeline stage; inner re-entries of the same stage are not double counted.
+    Also opens a trace span (with `attrs`) when the request is being traced.
+    """
+    active = _ACTIVE_STAGES.get()
+    if not METRICS_ENABLED or name in active:
+        with tracing.span(name, **attrs) as span:
+            yield span
+        return
+    token = _ACTIVE_STAGES.set(active + (name,))
+    start = time.perf_counter()
+    try:
+        with tracing.span(name, **attrs) as span:
+            yield span
+    finally:
+        elapsed = time.perf_counter() - start
+        _ACTIVE_STAGES.reset(token)
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        current = _REQUEST.get()
+        if current is not None and not active:   # outermost stage: counts toward covered time
+            with current["lock"]:
+                current["staged"] += elapsed
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of stage()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_db(backend: str, n: int = 1):
+    if not METRICS_ENABLED:
+        return
+    DB_QUERIES.inc(n, backend=backend)
+    current = _REQUEST.get()
+    if current is not None:
+        with current["lock"]:
+            current["db"] += n
+
+
+def observe_http(target: str, seconds: float, ok: bool = True):
+    if not METRICS_ENABLED:
+        return
+    HTTP_CALLS.inc(target=target, outcome="ok" if ok else "error")
+    HTTP_SECONDS.observe(seconds, target=target)
+    current = _REQUEST.get()
+    if current is not None:
+        with current["lock"]:
+            current["http"][target] = current["http"].get(target, 0) + 1
+
+
+def count_llm_avoided(role: str, shape: str):
+    if METRICS_ENABLED:
+        LLM_AVOIDED.inc(role=role, shape=shape)
+
+
+def observe_prompt_eval(model: str, tokens: int, seconds: float):
+    if not METRICS_ENABLED:
+        return
+    PROMPT_EVAL_TOKENS.inc(tokens, model=model)
+    PROMPT_EVAL_SECONDS.observe(seconds, model=model)
+
+
+def observe_llm_wait(seconds: float):
+    if METRICS_ENABLED:
+        LLM_QUEUE_WAIT.observe(seconds)
+
+
+def count_llm_degraded(reason: str):
+    if METRICS_ENABLED:
+        LLM_DEGRADED.inc(reason=reason)
+
+
+class RequestScope:
+    """Handle yielded by request(); set .outcome before the block ends (default 'ok')."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.outcome = "ok"
+        self.data = {"db": 0, "http": {}, "staged": 0.0, "lock": threading.Lock()}
+
+    @property
+    def db_queries(self) -> int:
+        return self.data["db"]
+
+    def http_calls(self, target: str) -> int:
+        return self.data["http"].get(target, 0)
+
+
+@contextmanager
+def request(endpoint: str) -> Iterator[RequestScope]:
+    """Scope one chat turn (enter it before handing work to chat_executor)."""
+    scope = RequestScope(endpoint)
+    token = _REQUEST.set(scope.data)
+    start = time.perf_counter()
+    try:
+        yield scope
+    except Exception:
+        scope.outcome = "error"
+        raise
+    finally:
+        _REQUEST.reset(token)
+        if METRICS_ENABLED:
+            elapsed = time.perf_counter() - start
+            REQUESTS.inc(endpoint=endpoint, outcome=scope.outcome)
+            REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+            STAGE_SECONDS.observe(max(0.0, elapsed - scope.data["staged"]), stage="other")
+            DB_PER_REQUEST.observe(scope.data["db"], endpoint=endpoint)
+            for target in ("erp", "ollama"):
+                HTTP_PER_REQUEST.observe(scope.data["http"].get(target, 0), endpoint=endpoint, target=target)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for name, help_text, fn in _GAUGES:
+        try:
+            value = float(fn())
+        except Exception:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+    return "\n".join(lines) + "\n"
+
+
+def configure(enabled: bool = METRICS_ENABLED):
+    """Zero every metric and switch collection on/off (e.g. from tests or benchmarks)."""
+    global METRICS_ENABLED
+    METRICS_ENABLED = enabled
+    for metric in _METRICS:
+        metric.reset()
+
+
+def stats() -> Dict[str, Any]:
+    """Per-stage latency summary for /stats (quantiles are bucket upper bounds)."""
+    with STAGE_SECONDS._lock:
+        stages = sorted({k[0] for k in STAGE_SECONDS._series})
+    return {"enabled": METRICS_ENABLED, "stages": {s: STAGE_SECONDS.snapshot(stage=s) for s in stages}}
+
+
+# Example usage
+if __name__ == "__main__":
+    with request("chat"):
+        with stage("normalize"):
+            time.sleep(0.002)
+        with stage("db"):
+            count_db("sqlite")
+        observe_http("ollama", 0.8)
+    print(render())
@@ -0,0 +1,133 @@
+"""
+Ollama Client for Mr. Mark Chatbot
+Keep-alive HTTP client for /api/generate with blocking and token-streaming calls.
+Every call asks Ollama to keep the model loaded for OLLAMA_KEEP_ALIVE, so the
+evaluated system prompt stays in its KV cache between chat turns (see
+analysis_prompt.py); prompt-eval tokens / time reported by Ollama go to /metrics.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+
+import metrics
+import tracing
+
+
+# --- CONFIGURATION (env overridable) ---
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "60"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")   # Ollama's own default is 5m; "" = leave it
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    """One keep-alive session per worker thread (requests.Session is not thread-safe)."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+
+def _payload(prompt: str, model: str, system: Optional[str], keep_alive: str, stream: bool) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {"model": model, "prompt": prompt, "stream": stream}
+    if system is not None:
+        payload["system"] = system
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+def _observe_eval(model: str, data: Dict[str, Any]):
+    """Prompt-eval figures from Ollama's final response object (absent on some versions)."""
+    if "prompt_eval_count" not in data:
+        return
+    tokens = data["prompt_eval_count"]
+    seconds = data.get("prompt_eval_duration", 0) / 1e9
+    metrics.observe_prompt_eval(model, tokens, seconds)
+    tracing.annotate(prompt_eval_count=tokens, prompt_eval_ms=round(seconds * 1000, 2))
+
+
+def generate(prompt: str, model: str = "tinyllama", base_url: Optional[str] = None,
+             timeout: float = OLLAMA_TIMEOUT, system: Optional[str] = None,
+             keep_alive: str = OLLAMA_KEEP_ALIVE) -> str:
+    """
+    Full completion in one response (stream=False).
+
+    Raises:
+        requests.RequestException on connection / HTTP errors.
+    """
+    url = f"{base_url or OLLAMA_URL}/api/generate"
+    start = time.perf_counter()
+    ok = False
+    try:
+        with tracing.span("ollama.generate", model=model, prompt_chars=len(prompt)):
+            resp = _session().post(url, json=_payload(prompt, model, system, keep_alive, False), timeout=timeout)
+            resp.raise_for_status()
+            data = resp.json()
+            text = data.get("response", "").strip()
+            tracing.annotate(response_chars=len(text))
+            _observe_eval(model, data)
+        ok = True
+        return text
+    finally:
+        metrics.observe_http("ollama", time.perf_counter() - start, ok)
+
+
+def stream(prompt: str, model: str = "tinyllama", base_url: Optional[str] = None,
+           timeout: float = OLLAMA_TIMEOUT, system: Optional[str] = None,
+           keep_alive: str = OLLAMA_KEEP_ALIVE) -> Iterator[str]:
+    """
+    Yield response fragments as Ollama produces them (stream=True, NDJSON lines).
+
+    `timeout` applies to connecting and to each gap between lines, not the whole
+    completion. Closing the generator early closes the HTTP response.
+
+    Raises:
+        requests.RequestException on connection / HTTP errors.
+    """
+    url = f"{base_url or OLLAMA_URL}/api/generate"
+    start = time.perf_counter()
+    ok = False
+    resp = None
+    try:
+        resp = _session().post(url, json=_payload(prompt, model, system, keep_alive, True),
+                               timeout=timeout, stream=True)
+        resp.raise_for_status()
+        # chunk_size=None: hand over each HTTP chunk as soon as it arrives
+        for line in resp.iter_lines(chunk_size=None):
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise requests.RequestException(data["error"])
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                _observe_eval(model, data)
+                break
+        ok = True
+    except GeneratorExit:
+        ok = True   # caller stopped reading (client gone / firewall): not an Ollama failure
+        raise
+    finally:
+        if resp is not None:
+            resp.close()
+        # One call from request to last token (or early close)
+        metrics.observe_http("ollama", time.perf_counter() - start, ok)
+
+
+# Example usage
+if __name__ == "__main__":
+    try:
+        for token in stream("Say hello in five words."):
+            print(token, end="", flush=True)
+        print()
+    except Exception as e:
+        print(f"⚠️ Ollama Error: {e}")
@@ -0,0 +1,100 @@
+"""
+Output Firewall for Mr. Mark Chatbot
+Blocks LLM analysis that leaks internal rules, for whole responses and token streams.
+"""
+
+from typing import List
+
+
+# Any of these (case-insensitive substring) suppresses the AI analysis entirely
+FORBIDDEN_PHRASES: List[str] = [
+    "NO CAUSAL INFERENCE", "FAIL SAFE", "COMMANDMENT", "SYSTEM ROLE",
+    "RESTRICTIONS", "ASSUMING", "ANALYSIS RULES", "PRIORITY -1",
+    "PRIORITY LEVEL", "GUARD LOGIC", "ENFORCEMENT", "SYSTEM BEHAVIOR",
+    "COMPLIANCE", "DEBUG", "THIS SYSTEM MUST", "RULES STATE",
+    "ACCORDING TO POLICY", "RBAC ENFORCES", "CAUSAL GUARD BLOCKS",
+    "FAIL-SAFE", "DO NOT", "MUST", "SHOULD", "INTERNAL RULES",
+    "PROMPTS", "POLICIES", "INSTRUCTIONS", "RBAC EXPLANATIONS",
+    "ROLE DEFINITIONS"
+]
+
+# Analyses shorter than this (or Ollama's error text) are dropped
+MIN_ANALYSIS_LENGTH = 5
+ERROR_MARKER = "trouble thinking"
+
+
+def is_blocked(text: str) -> bool:
+    """True if the text contains any forbidden phrase."""
+    upper = text.upper()
+    return any(bad in upper for bad in FORBIDDEN_PHRASES)
+
+
+def is_usable(text: str) -> bool:
+    """True if a complete analysis may be shown (long enough, no error, no leak)."""
+    return ERROR_MARKER not in text and len(text) >= MIN_ANALYSIS_LENGTH and not is_blocked(text)
+
+
+class StreamFirewall:
+    """
+    Incremental version of is_blocked() for streamed tokens.
+
+    feed() returns only text that can no longer become part of a forbidden
+    phrase: the last (longest phrase - 1) characters are held back until more
+    tokens arrive or finish() is called. Once a phrase is seen, `blocked` is set
+    and nothing further is released, so a forbidden phrase never reaches the
+    client. Callers should discard whatever was already shown when blocked.
+    """
+
+    def __init__(self, phrases: List[str] = None):
+        self.phrases = [p.upper() for p in (phrases or FORBIDDEN_PHRASES)]
+        self.hold = max(len(p) for p in self.phrases) - 1
+        self.text = ""          # everything received (leading whitespace stripped)
+        self.released = 0       # characters of self.text already returned
+        self.blocked = False
+
+    def feed(self, chunk: str) -> str:
+        if self.blocked or not chunk:
+            return ""
+        if not self.text:
+            chunk = chunk.lstrip()
+        self.text += chunk
+        # Only the tail that could contain a newly completed phrase needs scanning
+        window = self.text[max(0, self.released - self.hold):].upper()
+        if any(p in window for p in self.phrases):
+            self.blocked = True
+            return ""
+        safe_end = max(self.released, len(self.text) - self.hold)
+        out = self.text[self.released:safe_end]
+        self.released = safe_end
+        return out
+
+    def finish(self) -> str:
+        """Release the held-back tail (empty if blocked)."""
+        if self.blocked:
+            return ""
+        out = self.text[self.released:].rstrip()
+        self.released = len(self.text)
+        return out
+
+    @property
+    def analysis(self) -> str:
+        """The full analysis text received so far."""
+        return self.text.strip()
+
+
+# Example usage
+if __name__ == "__main__":
+    print("Firewall Tests:")
+    print("-" * 80)
+    for sample in ["Branch 1 sales rose to 2,000,000 LKR.", "You MUST not ask that.", "ok"]:
+        print(f"  {sample!r}: blocked={is_blocked(sample)} usable={is_usable(sample)}")
+
+    fw = StreamFirewall()
+    shown = ""
+    for tok in ["Sales ", "were ", "higher ", "in ", "March", ". The ", "rules ", "state ", "nothing", "."]:
+        shown += fw.feed(tok)
+    shown += fw.finish()
+    print(f"\n  Stream shown: {shown!r}")
+    fw = StreamFirewall()
+    shown = "".join(fw.feed(t) for t in ["Per ", "policy ", "you ", "mu", "st ", "stop", " here."]) + fw.finish()
+    print(f"  Stream blocked={fw.blocked} shown before block: {shown!r}")
@@ -8,7 +8,7 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, List, Tuple
 
 
-def handle_quarter_query(quarter: int, year: int, br_id: Any, fetch_monthly_sum_fn) -> Tuple[List, float]:
+def handle_quarter_query(quarter: int, year: int, br_id: Any, fetch_monthly_sums_fn) -> Tuple[List, float]:
     """
     Handle quarter queries (Q1, Q2, Q3, Q4).
     
@@ -16,7 +16,7 @@ def handle_quarter_query(quarter: int, year: int, br_id: Any, fetch_monthly_sum_
         quarter: Quarter number (1-4)
         year: Year
         br_id: Branch ID
-        fetch_monthly_sum_fn: Function to fetch monthly sum from DB
+        fetch_monthly_sums_fn: Batched fetch (start_date, end_date, br_id) -> {(year, month): total}
         
     Returns:
         (rows, total) for table display
@@ -32,18 +32,22 @@ def handle_quarter_query(quarter: int, year: int, br_id: Any, fetch_monthly_sum_
     months = quarter_months[quarter]
     month_names = [calendar.month_name[m] for m in months]
     
+    # One query for the whole quarter
+    last_day = calendar.monthrange(year, months[-1])[1]
+    sums = fetch_monthly_sums_fn(f"{year}-{months[0]:02d}-01", f"{year}-{months[-1]:02d}-{last_day:02d}", br_id)
+    
     rows = []
     total = 0.0
     
     for month_num, month_name in zip(months, month_names):
-        amount = fetch_monthly_sum_fn(year, month_num, br_id)
+        amount = sums.get((year, month_num), 0.0)
         rows.append([f"{month_name} {year}", f"{amount:,.2f}"])
         total += amount
     
     return rows, total
 
 
-def handle_week_query(start_date: str, end_date: str, br_id: Any, fetch_daily_sales_fn) -> Tuple[List, float]:
+def handle_week_query(start_date: str, end_date: str, br_id: Any, fetch_daily_sums_fn) -> Tuple[List, float]:
     """
     Handle week queries.
     
@@ -51,7 +55,7 @@ def handle_week_query(start_date: str, end_date: str, br_id: Any, fetch_daily_sa
         start_date: Start date (YYYY-MM-DD)
         end_date: End date (YYYY-MM-DD)
         br_id: Branch ID
-        fetch_daily_sales_fn: Function to fetch daily sales from DB
+        fetch_daily_sums_fn: Batched fetch (start_date, end_date, br_id) -> {"YYYY-MM-DD": total}
         
     Returns:
         (rows, total) for table display
@@ -59,13 +63,16 @@ def handle_week_query(start_date: str, end_date: str, br_id: Any, fetch_daily_sa
     start = datetime.strptime(start_date, "%Y-%m-%d").date()
     end = datetime.strptime(end_date, "%Y-%m-%d").date()
     
+    # One query for every day in the span (days without sales count as 0)
+    sums = fetch_daily_sums_fn(start_date, end_date, br_id)
+    
     rows = []
     total = 0.0
     current_date = start
     
     while current_date <= end:
         date_str = current_date.strftime("%Y-%m-%d")
-        amount = fetch_daily_sales_fn(date_str, br_id)
+        amount = sums.get(date_str, 0.0)
         
         # Format: "Monday, Jan 06"
         day_name = current_date.strftime("%A")
@@ -78,7 +85,7 @@ def handle_week_query(start_date: str, end_date: str, br_id: Any, fetch_daily_sa
     return rows, total
 
 
-def handle_range_query(start_date: str, end_date: str, br_id: Any, fetch_monthly_sum_fn) -> Tuple[List, float]:
+def handle_range_query(start_date: str, end_date: str, br_id: Any, fetch_monthly_sums_fn) -> Tuple[List, float]:
     """
     Handle date range queries (group by month for readability).
     
@@ -86,7 +93,7 @@ def handle_range_query(start_date: str, end_date: str, br_id: Any, fetch_monthly
         start_date: Start date (YYYY-MM-DD)
         end_date: End date (YYYY-MM-DD)
         br_id: Branch ID
-        fetch_monthly_sum_fn: Function to fetch monthly sum from DB
+        fetch_monthly_sums_fn: Batched fetch (start_date, end_date, br_id) -> {(year, month): total}
         
     Returns:
         (rows, total) for table display
@@ -94,6 +101,9 @@ def handle_range_query(start_date: str, end_date: str, br_id: Any, fetch_monthly
     start = datetime.strptime(start_date, "%Y-%m-%d").date()
     end = datetime.strptime(end_date, "%Y-%m-%d").date()
     
+    # One query for every month the range touches
+    sums = fetch_monthly_sums_fn(start_date, end_date, br_id)
+    
     rows = []
     total = 0.0
     
@@ -105,7 +115,7 @@ def handle_range_query(start_date: str, end_date: str, br_id: Any, fetch_monthly
         month = current_date.month
         month_name = calendar.month_name[month]
         
-        amount = fetch_monthly_sum_fn(year, month, br_id)
+        amount = sums.get((year, month), 0.0)
         rows.append([f"{month_name} {year}", f"{amount:,.2f}"])
         total += amount
         
@@ -182,11 +192,15 @@ def get_quarter_months(quarter: int) -> List[int]:
 # Example usage
 if __name__ == "__main__":
     # Mock functions for testing
-    def mock_fetch_monthly(year, month, br_id):
-        return 1000000.0 * month  # Mock data
-    
-    def mock_fetch_daily(date, br_id):
-        return 50000.0  # Mock data
+    def mock_fetch_monthly(start_date, end_date, br_id):
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        return {(start.year, m): 1000000.0 * m for m in range(start.month, end.month + 1)}  # Mock data (same year)
+    
+    def mock_fetch_daily(start_date, end_date, br_id):
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        return {(start + timedelta(days=i)).strftime("%Y-%m-%d"): 50000.0 for i in range((end - start).days + 1)}  # Mock data
     
     print("Handler Tests:")
     print("-" * 80)
@@ -0,0 +1,251 @@
+"""
+Query Logger for Mr. Mark Chatbot
+Background writer for the query_logs audit table. log() only appends to a bounded
+in-memory queue; one writer thread per database inserts the rows in batches (every
+LOG_BATCH_SIZE rows or LOG_FLUSH_MS after the oldest pending row), so no commit or
+fsync happens on the response path. When the queue is full the oldest row is dropped
+and counted. Pending rows are flushed on shutdown.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import db_migrations
+import db_pool
+
+
+# --- CONFIGURATION (env overridable) ---
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))   # rows held in memory before dropping the oldest
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "100"))      # rows per INSERT transaction
+LOG_FLUSH_MS = float(os.getenv("LOG_FLUSH_MS", "250"))        # max delay before a partial batch is written
+
+INSERT_SQL = "INSERT INTO query_logs (timestamp, user_query, intent, response_text) VALUES (?, ?, ?, ?)"
+
+
+class QueryLogger:
+    """
+    Bounded queue + single writer thread for one SQLite file.
+
+    The writer owns a dedicated connection (not a pool slot), so logging never
+    competes with chat reads for connections, and it holds the write lock once per
+    batch instead of once per request.
+    """
+
+    def __init__(self, db_path: str = "sales.db", max_queue: int = LOG_QUEUE_SIZE,
+                 batch_size: int = LOG_BATCH_SIZE, flush_ms: float = LOG_FLUSH_MS, insert_sql: str = INSERT_SQL):
+        self.db_path = db_path
+        self.insert_sql = insert_sql   # other audit tables (e.g. tracing.py's slow_requests) reuse the writer
+        self.max_queue = max(1, int(max_queue))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_s = max(0.0, float(flush_ms)) / 1000
+        self._queue: deque = deque(maxlen=self.max_queue)   # (enqueued monotonic, row params)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._flush_requested = False
+        self._writing = 0
+
+        # Metrics
+        self._logged = 0
+        self._written = 0
+        self._batches = 0
+        self._dropped = 0
+        self._errors = 0
+        self._write_time = 0.0
+
+    # ---------------------------------------------------------
+    # PRODUCER SIDE (request threads)
+    # ---------------------------------------------------------
+    def log(self, query: str, intent: str, response: Any):
+        """Queue one row; never blocks on the database."""
+        # Same format as SQLite's CURRENT_TIMESTAMP (UTC), taken when the request logged it
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        self.append((timestamp, query, intent, str(response)))
+
+    def append(self, row: tuple):
+        """Queue the parameters of one insert_sql row; never blocks on the database."""
+        with self._cond:
+            if len(self._queue) == self.max_queue:
+                self._dropped += 1   # deque(maxlen) discards the oldest row on append
+            self._queue.append((time.monotonic(), row))
+            self._logged += 1
+            self._ensure_writer()
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Write everything queued so far. Returns False if it did not finish in time."""
+        with self._cond:
+            if self._thread is None:
+                return not self._queue
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._queue and not self._writing, timeout)
+            self._flush_requested = False
+            return done
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending rows and stop the writer (a later log() starts a new one)."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            if self._thread is thread:
+                self._thread = None
+                self._stopping = False
+
+    # ---------------------------------------------------------
+    # WRITER THREAD
+    # ---------------------------------------------------------
+    def _ensure_writer(self):
+        """Start the writer thread (caller holds the lock)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="query-logger", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Block until a batch is due; None when stopping with nothing left."""
+        with self._cond:
+            while True:
+                if self._queue and (self._stopping or self._flush_requested or len(self._queue) >= self.batch_size):
+                    break
+                if self._queue:
+                    remaining = self._queue[0][0] + self.flush_s - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                elif self._stopping:
+                    return None
+                else:
+                    self._cond.wait()
+            batch = [self._queue.popleft()[1] for _ in range(min(len(self._queue), self.batch_size))]
+            self._writing = len(batch)
+            return batch
+
+    def _connect(self) -> sqlite3.Connection:
+        db_migrations.ensure_schema(self.db_path)   # query_logs / slow_requests come from migrations 4 / 5
+        conn = sqlite3.connect(self.db_path, timeout=db_pool.POOL_TIMEOUT)
+        for name, value in db_pool.DEFAULT_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            start = time.perf_counter()
+            ok = False
+            try:
+                conn = conn or self._connect()
+                with conn:   # one transaction per batch
+                    conn.executemany(self.insert_sql, batch)
+                ok = True
+            except Exception as e:
+                print(f"Log Error: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None   # reconnect for the next batch; this one is dropped
+            with self._cond:
+                if ok:
+                    self._written += len(batch)
+                    self._batches += 1
+                else:
+                    self._errors += 1
+                    self._dropped += len(batch)
+                self._write_time += time.perf_counter() - start
+                self._writing = 0
+                self._cond.notify_all()
+        if conn is not None:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "db_path": self.db_path,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "logged": self._logged,
+                "written": self._written,
+                "batches": self._batches,
+                "avg_batch": round(self._written / self._batches, 1) if self._batches else 0.0,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "avg_write_ms": round(self._write_time / self._batches * 1000, 3) if self._batches else 0.0,
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_LOGGERS: Dict[str, QueryLogger] = {}
+_LOGGERS_LOCK = threading.Lock()
+_SETTINGS = {"max_queue": LOG_QUEUE_SIZE, "batch_size": LOG_BATCH_SIZE, "flush_ms": LOG_FLUSH_MS}
+
+
+def get_logger(db_path: str = "sales.db") -> QueryLogger:
+    """One logger (and writer thread) per database file."""
+    key = os.path.abspath(db_path)
+    logger = _LOGGERS.get(key)
+    if logger is None:
+        with _LOGGERS_LOCK:
+            logger = _LOGGERS.get(key)
+            if logger is None:
+                logger = QueryLogger(db_path, **_SETTINGS)
+                _LOGGERS[key] = logger
+    return logger
+
+
+def log(db_path: str, query: str, intent: str, response: Any):
+    get_logger(db_path).log(query, intent, response)
+
+
+def flush(timeout: float = 5.0) -> bool:
+    return all([logger.flush(timeout) for logger in list(_LOGGERS.values())])
+
+
+def shutdown(timeout: float = 5.0):
+    """Flush and stop every writer (app shutdown)."""
+    for logger in list(_LOGGERS.values()):
+        logger.close(timeout)
+
+
+def configure(max_queue: int = LOG_QUEUE_SIZE, batch_size: int = LOG_BATCH_SIZE, flush_ms: float = LOG_FLUSH_MS):
+    """Flush the current loggers and use new settings (e.g. from tests)."""
+    with _LOGGERS_LOCK:
+        loggers = list(_LOGGERS.values())
+        _LOGGERS.clear()
+        _SETTINGS.update(max_queue=max_queue, batch_size=batch_size, flush_ms=flush_ms)
+    for logger in loggers:
+        logger.close()
+
+
+def stats() -> Dict[str, Any]:
+    return {logger.db_path: logger.stats() for logger in list(_LOGGERS.values())}
+
+
+# Example usage
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+        start = time.perf_counter()
+        for i in range(n):
+            log(path, f"Sales in June branch {i % 5}", "Financial Query (ADMIN)", "Total: 1,234.00")
+        enqueue = time.perf_counter() - start
+        shutdown()
+        total = time.perf_counter() - start
+        print(f"{n} rows: {enqueue / n * 1e6:.1f} µs per log() call, all written after {total:.2f}s")
+        print(stats())
@@ -0,0 +1,178 @@
+"""
+Query Parser for Mr. Mark Chatbot
+Single-pass extraction of dates, months, years, quarters, branches and goal amounts from a
+chat message into one ParsedQuery. All month aliases live in precompiled combined
+patterns (no per-alias regex per call), and parses are memoized per message, so the
+many extract_* calls the chat flow makes on the same text cost one scan.
+"""
+
+import calendar
+import os
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+
+# --- CONFIGURATION (env overridable) ---
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "1024"))   # distinct messages memoized
+
+DEFAULT_YEAR = 2025   # year assumed when the message names none
+IST_OFFSET = timedelta(hours=5, minutes=30)
+
+# Earlier keys win when a message names several months (extract_month_only / extract_date)
+MONTH_ALIASES = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "september": 9, "sept": 9,
+    "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+    "decamber": 12, # Common Typo Support
+    "this month": datetime.now().month,
+    "current month": datetime.now().month
+}
+_CURRENT_MONTH = ("this month", "current month")   # resolved at parse time, not import time
+_ALIAS_RANK = {name: rank for rank, name in enumerate(MONTH_ALIASES)}
+
+# Longest alternatives first; \b keeps 'sep' from matching inside 'september'
+_ALIASES = "|".join(re.escape(m) for m in sorted(MONTH_ALIASES, key=len, reverse=True))
+MONTH_RE = re.compile(rf"\b({_ALIASES})\b")
+MONTH_DAY_RE = re.compile(rf"\b({_ALIASES})\b\s*(?:the\s*)?(\d+)(st|nd|rd|th)?\b")   # "Jan 5th", "jan the 5"
+DAY_MONTH_RE = re.compile(r"\b(\d+)(st|nd|rd|th)?\s+(?:of\s+)?([a-zA-Z]+)\b")          # "5th of January"
+ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+YEAR_RE = re.compile(r"\b(202[0-9])\b")
+QUARTER_RE = re.compile(r"\bq([1-4])\b")
+QUARTER_WORD_RE = re.compile(r"quarter\s*([1-4])")
+BRANCH_RE = re.compile(r"branch\s*(\d+)")
+BRANCH_PAIR_RE = re.compile(r"branch\s+(\d+)\s*(?:vs|and|&|,)\s*(\d+)")
+GOAL_RE = re.compile(r"(?:goal|target|aim).*?(\d+(?:,\d{3})*(?:\.\d+)?)\s*(m|k|million|thousand)?")
+
+
+class ParsedQuery(NamedTuple):
+    """Everything the extract_* helpers report for one message (immutable, safe to share)."""
+    text: str                                   # lower-cased message
+    date: Optional[str]                         # 'YYYY-MM-DD'
+    month: Optional[Tuple[str, int]]            # (name, number) of the first matching alias
+    months: Tuple[Tuple[str, int], ...]         # every month named, by number
+    year: int                                   # first 202x year, else DEFAULT_YEAR
+    quarter: Optional[int]
+    branch: Optional[int]                       # first "branch N"
+    branches: Tuple[int, ...]                   # every branch named, sorted
+    goal_amount: Optional[float]
+
+
+def _month_num(alias: str, current_month: int) -> int:
+    return current_month if alias in _CURRENT_MONTH else MONTH_ALIASES[alias]
+
+
+def _valid_date(year: int, month: int, day: int) -> Optional[str]:
+    if not 1 <= day <= 31:
+        return None
+    try:
+        return date(year, month, day).strftime("%Y-%m-%d")
+    except ValueError:
+        return None  # e.g. Feb 30
+
+
+def _parse_date(text: str, year: int, today: date, current_month: int) -> Optional[str]:
+    if "yesterday" in text:
+        return (today - timedelta(days=1)).strftime("%Y-%m-%d")
+    if "today" in text:
+        return today.strftime("%Y-%m-%d")
+    match_iso = ISO_DATE_RE.search(text)
+    if match_iso:
+        return match_iso.group(0)
+
+    # "January 5th": alias order first, then position (as the per-alias scan did)
+    candidates = sorted(MONTH_DAY_RE.finditer(text), key=lambda m: (_ALIAS_RANK[m.group(1)], m.start()))
+    for match in candidates:
+        found = _valid_date(year, _month_num(match.group(1), current_month), int(match.group(2)))
+        if found:
+            return found
+
+    # Reverse format: "5th of January"
+    for match in DAY_MONTH_RE.finditer(text):
+        m_name = match.group(3).lower()
+        if m_name in MONTH_ALIASES:
+            found = _valid_date(year, MONTH_ALIASES[m_name], int(match.group(1)))
+            if found:
+                return found
+    return None
+
+
+def _parse_goal(text: str) -> Optional[float]:
+    match = GOAL_RE.search(text)
+    if not match:
+        return None
+    val = float(match.group(1).replace(',', ''))
+    mult = match.group(2)
+    if mult in ['m', 'million']: val *= 1_000_000
+    elif mult in ['k', 'thousand']: val *= 1_000
+    return val
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(text: str, today: date, current_month: int) -> ParsedQuery:
+    lower = text.lower()
+    year_match = YEAR_RE.search(text)
+    year = int(year_match.group(1)) if year_match else DEFAULT_YEAR
+
+    aliases = set(MONTH_RE.findall(lower))
+    if "this month" in lower or "current month" in lower:
+        month_num = current_month
+    elif aliases:
+        month_num = _month_num(min(aliases, key=_ALIAS_RANK.get), current_month)
+    else:
+        month_num = None
+    month_nums = sorted({_month_num(a, current_month) for a in aliases})
+
+    quarter_match = QUARTER_RE.search(lower) or QUARTER_WORD_RE.search(lower)
+
+    branch_ids = [int(b) for b in BRANCH_RE.findall(lower)]
+    pair = BRANCH_PAIR_RE.search(lower)
+    if pair:
+        branch_ids += [int(pair.group(1)), int(pair.group(2))]
+
+    return ParsedQuery(
+        text=lower,
+        date=_parse_date(lower, year, today, current_month),
+        month=(calendar.month_name[month_num], month_num) if month_num else None,
+        months=tuple((calendar.month_name[m], m) for m in month_nums),
+        year=year,
+        quarter=int(quarter_match.group(1)) if quarter_match else None,
+        branch=branch_ids[0] if branch_ids else None,
+        branches=tuple(sorted(set(branch_ids))),
+        goal_amount=_parse_goal(lower),
+    )
+
+
+def parse_query(text: str) -> ParsedQuery:
+    """
+    Parse a chat message once; repeated calls with the same text (on the same day)
+    return the cached ParsedQuery.
+    """
+    today_ist = (datetime.utcnow() + IST_OFFSET).date()   # "today" / "yesterday" are IST dates
+    return _parse(text, today_ist, datetime.now().month)
+
+
+def clear_cache():
+    _parse.cache_clear()
+
+
+def stats():
+    info = _parse.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": round(info.hits / lookups, 3) if lookups else 0.0,
+    }
+
+
+# Example usage
+if __name__ == "__main__":
+    for msg in ["Jan sales branch 1", "Which day in June had highest sale for Branch 1?",
+                "Compare Branch 1 vs Branch 2 in Jan", "sales on the 5th of march 2024",
+                "Q3 goal 2.5m for branch 2 and 3"]:
+        print(f"{msg!r}\n  {parse_query(msg)}")
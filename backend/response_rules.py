@@ -0,0 +1,182 @@
+"""
+Response Rules for Mr. Mark Chatbot
+Deterministic fast-path for the note under a data answer. Most answers have a shape
+the system prompt already pins down: a single value ("SINGLE DATA POINT RULE"), two
+values side by side, a chronological series or a branch ranking. For those the
+factual note is filled in from a template in microseconds instead of a TinyLlama call.
+
+The handler that built the answer passes its shape to generate_smart_response
+(series() / comparison() / ranking() / SINGLE); answers without one go to the model.
+
+Policy per role (RESPONSE_RULES default, RESPONSE_RULES_ROLES overrides, e.g.
+"MANAGER:rules,BUSINESS_OWNER:strict"):
+- llm:    always ask the model (previous behaviour, opt-in)
+- rules:  template when the handler gave a shape, the model otherwise (default)
+- strict: template when the handler gave a shape, no note otherwise (never calls the model)
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import chart_builder
+import metrics
+
+# --- CONFIGURATION (env overridable) ---
+POLICIES = ("llm", "rules", "strict")
+RESPONSE_RULES = os.getenv("RESPONSE_RULES", "rules").lower()
+RESPONSE_RULES_ROLES = os.getenv("RESPONSE_RULES_ROLES", "")
+
+SINGLE_POINT_NOTE = "No comparative analysis can be derived from a single data point."
+NO_SALES_NOTE = "No sales were recorded for the period shown."
+
+Shape = Tuple[str, List[str], List[float]]   # (kind, labels, values)
+SINGLE: Shape = ("single", [], [])
+
+
+def _parse_roles(spec: str) -> Dict[str, str]:
+    roles = {}
+    for part in spec.split(","):
+        role, _, policy = part.partition(":")
+        if role.strip() and policy.strip().lower() in POLICIES:
+            roles[role.strip().upper()] = policy.strip().lower()
+    return roles
+
+
+def _money(value: float) -> str:
+    return f"{value:,.2f} {chart_builder.CHART_UNIT}"
+
+
+def _points(rows: Sequence[Sequence[Any]]) -> Tuple[List[str], List[float]]:
+    """[label, amount] table rows -> labels, values (DIFFERENCE rows and non-numbers skipped)."""
+    labels, values = [], []
+    for row in rows:
+        value = chart_builder.amount(row[-1])
+        if str(row[0]).upper() in chart_builder.SKIP_LABELS or value is None:
+            continue
+        labels.append(str(row[0]))
+        values.append(value)
+    return labels, values
+
+
+def series(rows: Sequence[Sequence[Any]]) -> Optional[Shape]:
+    """Chronological [period, amount] rows (quarter, week, range, past-N and multi-month answers)."""
+    labels, values = _points(rows)
+    if not values:
+        return None
+    return ("single", labels, values) if len(values) == 1 else ("series", labels, values)
+
+
+def comparison(rows: Sequence[Sequence[Any]]) -> Optional[Shape]:
+    """Two [label, amount] rows, earlier / base first (year vs year, month vs month, branch vs branch)."""
+    labels, values = _points(rows)
+    return ("comparison", labels, values) if len(values) == 2 else None
+
+
+def ranking(totals: Dict[Any, float], descending: bool = True) -> Optional[Shape]:
+    """Branch totals, best (or worst) first."""
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=descending)
+    if len(ranked) < 2:
+        return None
+    return "ranking", [f"Branch {br}" for br, _ in ranked], [float(total) for _, total in ranked]
+
+
+def _change(old: float, new: float) -> str:
+    if old == 0:
+        return ""
+    pct = (new - old) / abs(old) * 100
+    return f"{abs(pct):.1f}% {'higher' if pct >= 0 else 'lower'}"
+
+
+def note_for(shape: Shape) -> Optional[str]:
+    """The 1-3 sentence factual note for a shape (no causes, no advice); None when there is nothing to say."""
+    kind, labels, values = shape
+    if kind == "single":
+        return SINGLE_POINT_NOTE
+    if not values:
+        return None
+    if all(v == 0 for v in values):
+        return NO_SALES_NOTE
+    if kind == "comparison":
+        (a_label, b_label), (a, b) = labels, values
+        if a == b:
+            return f"{a_label} and {b_label} both recorded {_money(a)}."
+        change = _change(a, b)
+        if not change:
+            return f"{a_label} recorded {_money(a)} and {b_label} recorded {_money(b)}."
+        return (f"{b_label} ({_money(b)}) is {change} than {a_label} ({_money(a)}), "
+                f"a difference of {_money(abs(b - a))}.")
+    hi = max(range(len(values)), key=values.__getitem__)
+    lo = min(range(len(values)), key=values.__getitem__)
+    if values[hi] == values[lo]:
+        return f"All {len(values)} entries recorded {_money(values[hi])}."
+    if kind == "ranking":
+        return (f"Across {len(values)} branches, {labels[hi]} recorded the highest sales ({_money(values[hi])}) "
+                f"and {labels[lo]} the lowest ({_money(values[lo])}).")
+    text = (f"Across {len(values)} entries from {labels[0]} to {labels[-1]}, the highest value was "
+            f"{labels[hi]} ({_money(values[hi])}) and the lowest was {labels[lo]} ({_money(values[lo])}).")
+    change = _change(values[0], values[-1])
+    if change:
+        text += f" {labels[-1]} is {change} than {labels[0]}."
+    return text
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_SETTINGS = {"default": RESPONSE_RULES if RESPONSE_RULES in POLICIES else "rules",
+             "roles": _parse_roles(RESPONSE_RULES_ROLES)}
+_COUNTS = {"templated": 0, "llm_calls_avoided": 0, "llm_fallbacks": 0, "no_note": 0,
+           "shapes": {"single": 0, "comparison": 0, "series": 0, "ranking": 0}}
+_LOCK = threading.Lock()
+
+
+def policy_for(role: str) -> str:
+    return _SETTINGS["roles"].get((role or "").upper(), _SETTINGS["default"])
+
+
+def decide(role: str, shape: Optional[Shape]) -> Tuple[Optional[str], bool]:
+    """
+    (note, call_llm) for an answer of the given shape: a template note, or None with
+    call_llm telling whether the model may still be asked.
+    """
+    policy = policy_for(role)
+    if policy == "llm":
+        return None, True
+    if shape is None and policy == "rules":
+        with _LOCK:
+            _COUNTS["llm_fallbacks"] += 1
+        return None, True
+    note = note_for(shape) if shape else None
+    with _LOCK:
+        _COUNTS["llm_calls_avoided"] += 1
+        if note is None:
+            _COUNTS["no_note"] += 1
+        else:
+            _COUNTS["templated"] += 1
+            _COUNTS["shapes"][shape[0]] += 1
+    metrics.count_llm_avoided((role or "").upper(), shape[0] if shape else "none")
+    return note, False
+
+
+def configure(default: str = RESPONSE_RULES, roles: Optional[Dict[str, str]] = None):
+    """Set the default / per-role policies and reset counters (e.g. from tests)."""
+    with _LOCK:
+        _SETTINGS["default"] = default if default in POLICIES else "rules"
+        _SETTINGS["roles"] = ({r.upper(): p for r, p in roles.items() if p in POLICIES} if roles is not None
+                              else _parse_roles(RESPONSE_RULES_ROLES))
+        _COUNTS.update(templated=0, llm_calls_avoided=0, llm_fallbacks=0, no_note=0,
+                       shapes={"single": 0, "comparison": 0, "series": 0, "ranking": 0})
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        return {"default": _SETTINGS["default"], "roles": dict(_SETTINGS["roles"]),
+                **{k: (dict(v) if isinstance(v, dict) else v) for k, v in _COUNTS.items()}}
+
+
+# Example usage
+if __name__ == "__main__":
+    print(note_for(("comparison", ["2024", "2025"], [410_000_000.0, 452_500_000.0])))
+    print(note_for(("series", ["January 2025", "February 2025", "March 2025"], [42.2e6, 38.9e6, 44.1e6])))
+    print(note_for(ranking({1: 5.2e6, 2: 7.9e6, 3: 4.1e6})))
@@ -0,0 +1,407 @@
+"""
+In-Memory Sales Cube for Mr. Mark Chatbot
+Optional NumPy-backed columnar copy of the daily rollup (day x branch x account arrays of
+totals and row counts). The chat helpers' day / month / year totals, extremes and branch
+rankings become vectorized array slices instead of SQLite round trips.
+
+Enable with SALES_CUBE=1 (requires numpy). The cube is loaded at startup and reloaded
+whenever the store changes: SQLite commits from any connection or process (syncs,
+imports) are detected with PRAGMA data_version; other backends refresh every CUBE_TTL
+seconds or on invalidate().
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sales_repository import SalesRepository, SQLiteSalesRepository, month_bounds, year_bounds
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency: helpers keep querying the repository
+    np = None
+
+
+# --- CONFIGURATION (env overridable) ---
+SALES_CUBE = os.getenv("SALES_CUBE", "0").lower() in ("1", "true", "yes", "on")
+CUBE_TTL = float(os.getenv("CUBE_TTL", "60"))   # seconds; reload period when changes cannot be detected
+
+_EPOCH = date(1970, 1, 1).toordinal()  # datetime64[D] 0 as a date ordinal
+
+
+class SalesCube:
+    """
+    Immutable snapshot of sales_rollup_daily.
+
+    - totals / counts: float64 / int64 arrays shaped (days, branches, accounts) over a
+      dense date axis starting at the first sale.
+    - daily / monthly (+ _n row counts): the cube collapsed over accounts, one contiguous
+      row per branch plus a last 'ALL' row, so a date slice of one branch is a single
+      array view and a day / month lookup is plain index arithmetic.
+
+    Only buckets with rows count (an empty selection returns None, like SUM in SQL).
+    """
+
+    def __init__(self, cells: Sequence[tuple]):
+        self.rows = len(cells)
+        days, brs, accs, tots, cnts = zip(*cells) if cells else ((), (), (), (), ())
+        ordinals = np.array([str(d)[:10] for d in days], dtype="datetime64[D]").astype(np.int64) + _EPOCH
+        br = np.array([b or 0 for b in brs], dtype=np.int64)      # NULL branch / account -> 0, as in the rollup
+        acc = np.array([a or 0 for a in accs], dtype=np.int64)
+
+        self.start = int(ordinals.min()) if self.rows else date.today().toordinal()
+        n_days = int(ordinals.max()) - self.start + 1 if self.rows else 0
+        self.branches, b_idx = np.unique(br, return_inverse=True)
+        self.accounts, a_idx = np.unique(acc, return_inverse=True)
+        self._row = {int(b): i for i, b in enumerate(self.branches)}
+        self._all_row = len(self.branches)
+
+        shape = (n_days, len(self.branches), len(self.accounts))
+        self.totals = np.zeros(shape, dtype=np.float64)
+        self.counts = np.zeros(shape, dtype=np.int64)
+        d_idx = ordinals - self.start
+        np.add.at(self.totals, (d_idx, b_idx, a_idx), np.array(tots, dtype=np.float64))
+        np.add.at(self.counts, (d_idx, b_idx, a_idx), np.array(cnts, dtype=np.int64))
+
+        # (branch + ALL, day)
+        per_branch = self.totals.sum(axis=2).T
+        per_branch_n = self.counts.sum(axis=2).T
+        self.daily = np.ascontiguousarray(np.vstack([per_branch, per_branch.sum(axis=0)]))
+        self.daily_n = np.ascontiguousarray(np.vstack([per_branch_n, per_branch_n.sum(axis=0)]))
+
+        # (branch + ALL, month) on a dense month axis starting at the first month
+        first = date.fromordinal(self.start)
+        self.first_month = first.year * 12 + first.month - 1
+        axis = (np.arange(self.start, self.start + n_days) - _EPOCH).astype("datetime64[D]")
+        day_months = axis.astype("datetime64[M]").astype(np.int64) + 1970 * 12 - self.first_month
+        n_months = int(day_months[-1]) + 1 if n_days else 0
+        self.monthly = np.zeros((self._all_row + 1, n_months), dtype=np.float64)
+        self.monthly_n = np.zeros((self._all_row + 1, n_months), dtype=np.int64)
+        for r in range(self._all_row + 1):
+            self.monthly[r] = np.bincount(day_months, weights=self.daily[r], minlength=n_months)
+            self.monthly_n[r] = np.bincount(day_months, weights=self.daily_n[r], minlength=n_months)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in (self.totals, self.counts, self.daily, self.daily_n,
+                                          self.monthly, self.monthly_n)))
+
+    # ---------------------------------------------------------
+    # SELECTIONS
+    # ---------------------------------------------------------
+    def _day(self, date_str: str, clip: bool = True) -> int:
+        """Position of a day on the date axis (clipped to [0, days] for range bounds)."""
+        i = date.fromisoformat(str(date_str)[:10]).toordinal() - self.start
+        return min(max(i, 0), self.daily.shape[1]) if clip else i
+
+    def _month(self, year, month_num, clip: bool = True) -> int:
+        """Position of a month on the month axis (clipped to [0, months] for range bounds)."""
+        i = int(year) * 12 + int(month_num) - 1 - self.first_month
+        return min(max(i, 0), self.monthly.shape[1]) if clip else i
+
+    @staticmethod
+    def _point(i: int, size: int) -> Tuple[int, int]:
+        """[i, i + 1), or an empty range when i is off the axis."""
+        return (i, i + 1) if 0 <= i < size else (0, 0)
+
+    def _rows(self, br_ids):
+        """Row index for 'ALL' / one branch, a list of rows for a list, None for an unknown branch."""
+        if br_ids is None or br_ids == 'ALL':
+            return self._all_row
+        if isinstance(br_ids, (list, tuple, set)):
+            return sorted({self._row[int(b)] for b in br_ids if int(b) in self._row})
+        return self._row.get(int(br_ids))
+
+    @staticmethod
+    def _span(values, counts, rows, i: int, j: int):
+        """(totals, counts) per bucket in [i, j) for the selected rows."""
+        if rows is None or rows == []:
+            return np.zeros(max(j - i, 0)), np.zeros(max(j - i, 0), dtype=np.int64)
+        if isinstance(rows, list):
+            return values[rows, i:j].sum(axis=0), counts[rows, i:j].sum(axis=0)
+        return values[rows, i:j], counts[rows, i:j]
+
+    @staticmethod
+    def _total(totals, counts) -> Optional[float]:
+        return float(totals.sum()) if counts.sum() > 0 else None
+
+    @staticmethod
+    def _pick(values, counts, descending: bool) -> Optional[int]:
+        """Index of the largest / smallest value among buckets with rows."""
+        candidates = np.flatnonzero(counts > 0)
+        if not len(candidates):
+            return None
+        chosen = values[candidates]
+        return int(candidates[np.argmax(chosen) if descending else np.argmin(chosen)])
+
+    def _days(self, start_date: str, end_exclusive: str):
+        return self._day(start_date), self._day(end_exclusive)
+
+    def _year_months(self, year):
+        return self._month(year, 1), self._month(int(year) + 1, 1)
+
+    # ---------------------------------------------------------
+    # AGGREGATES (same results as the SalesRepository queries)
+    # ---------------------------------------------------------
+    def daily_total(self, date_str: str, br_id=1) -> Optional[float]:
+        i, j = self._point(self._day(date_str, clip=False), self.daily.shape[1])
+        return self._total(*self._span(self.daily, self.daily_n, self._rows(br_id), i, j))
+
+    def monthly_total(self, year, month_num, br_id=1) -> Optional[float]:
+        i, j = self._point(self._month(year, month_num, clip=False), self.monthly.shape[1])
+        return self._total(*self._span(self.monthly, self.monthly_n, self._rows(br_id), i, j))
+
+    def year_total(self, year, br_id=1) -> Optional[float]:
+        return self._total(*self._span(self.monthly, self.monthly_n, self._rows(br_id), *self._year_months(year)))
+
+    def monthly_average(self, year, month_num, br_id=1) -> Optional[float]:
+        if br_id == 'ALL':
+            totals, counts = self._span(self.daily, self.daily_n, self._all_row,
+                                        *self._days(*month_bounds(year, month_num)))
+            present = counts > 0
+            return float(totals[present].mean()) if present.any() else None
+        i, j = self._point(self._month(year, month_num, clip=False), self.monthly.shape[1])
+        totals, counts = self._span(self.monthly, self.monthly_n, self._rows(br_id), i, j)
+        n = counts.sum()
+        return float(totals.sum() / n) if n > 0 else None
+
+    def extreme_month(self, year, descending: bool = True, br_id=1) -> Optional[tuple]:
+        first, last = self._year_months(year)
+        totals, counts = self._span(self.monthly, self.monthly_n, self._rows(br_id), first, last)
+        best = self._pick(totals, counts, descending)
+        if best is None:
+            return None
+        return (self.first_month + first + best) % 12 + 1, float(totals[best])
+
+    def extreme_day(self, start_date: str, end_date: str, descending: bool = True, br_id=1) -> Optional[tuple]:
+        i, j = self._days(start_date, end_date)
+        totals, counts = self._span(self.daily, self.daily_n, self._rows(br_id), i, j)
+        best = self._pick(totals, counts, descending)
+        if best is None:
+            return None
+        return date.fromordinal(self.start + i + best).isoformat(), float(totals[best])
+
+    def extreme_branch(self, year, month_num: int = 0, descending: bool = True) -> Optional[tuple]:
+        if month_num:
+            first, last = self._point(self._month(year, month_num, clip=False), self.monthly.shape[1])
+        else:
+            first, last = self._year_months(year)
+        totals = self.monthly[:self._all_row, first:last].sum(axis=1)
+        counts = self.monthly_n[:self._all_row, first:last].sum(axis=1)
+        best = self._pick(totals, counts, descending)
+        return (int(self.branches[best]), float(totals[best])) if best is not None else None
+
+    def _grid(self, values, counts, br_ids, i: int, j: int):
+        """(rows, totals, counts) per branch row x bucket, for by_branch spans."""
+        rows = self._rows(br_ids)
+        if rows == self._all_row:
+            rows = list(range(self._all_row))
+        elif not isinstance(rows, list):
+            rows = [] if rows is None else [rows]
+        return rows, values[rows, i:j], counts[rows, i:j]
+
+    def daily_sums(self, start_date: str, end_exclusive: str, br_ids=1, by_branch: bool = False) -> List[tuple]:
+        i, j = self._days(start_date, end_exclusive)
+        if by_branch:
+            rows, totals, counts = self._grid(self.daily, self.daily_n, br_ids, i, j)
+            return [(date.fromordinal(self.start + i + d).isoformat(), int(self.branches[rows[r]]),
+                     float(totals[r, d])) for d, r in sorted(zip(*np.nonzero(counts.T > 0)))]
+        totals, counts = self._span(self.daily, self.daily_n, self._rows(br_ids), i, j)
+        return [(date.fromordinal(self.start + i + d).isoformat(), float(totals[d]))
+                for d in np.flatnonzero(counts > 0)]
+
+    def monthly_sums(self, start: Tuple[int, int], end: Tuple[int, int], br_ids=1,
+                     by_branch: bool = False) -> List[tuple]:
+        i, j = self._month(*start), self._month(*end, clip=False) + 1
+        j = min(max(j, i), self.monthly.shape[1])
+
+        def ym(m):
+            key = self.first_month + i + int(m)
+            return key // 12, key % 12 + 1
+
+        if by_branch:
+            rows, totals, counts = self._grid(self.monthly, self.monthly_n, br_ids, i, j)
+            return [(*ym(m), int(self.branches[rows[r]]), float(totals[r, m]))
+                    for m, r in sorted(zip(*np.nonzero(counts.T > 0)))]
+        totals, counts = self._span(self.monthly, self.monthly_n, self._rows(br_ids), i, j)
+        return [(*ym(m), float(totals[m])) for m in np.flatnonzero(counts > 0)]
+
+
+class CubeSalesRepository(SalesRepository):
+    """
+    Serves the hot aggregates from a SalesCube; everything else (accounts, catalogue,
+    health checks) goes to the wrapped repository.
+    """
+
+    def __init__(self, base: SalesRepository, ttl: float = CUBE_TTL):
+        self.base = base
+        self.backend = f"{base.backend}+cube"
+        self.ttl = float(ttl)
+        self._snapshot: Optional[SalesCube] = None
+        self._loaded_at = 0.0
+        self._version = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self._version_conn: Optional[sqlite3.Connection] = None
+
+        # Metrics
+        self._loads = 0
+        self._load_time = 0.0
+        self._served = 0
+
+    def _all(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self.base._all(sql, params)
+
+    # ---------------------------------------------------------
+    # REFRESH
+    # ---------------------------------------------------------
+    def _source_version(self):
+        """SQLite: PRAGMA data_version on a connection that never writes, so any commit changes it."""
+        if not isinstance(self.base, SQLiteSalesRepository):
+            return None
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(self.base.db_path, check_same_thread=False)
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _cube(self) -> SalesCube:
+        with self._lock:
+            if self._snapshot is None:
+                self.base.ping()  # schema / migrations before the version is first read
+            version = self._source_version()
+            expired = version is None and time.time() - self._loaded_at >= self.ttl
+            if self._snapshot is None or self._stale or expired or version != self._version:
+                start = time.perf_counter()
+                self._snapshot = SalesCube(self.base.daily_cells())
+                self._load_time = time.perf_counter() - start
+                self._loads += 1
+                self._loaded_at = time.time()
+                self._version = version
+                self._stale = False
+            self._served += 1
+            return self._snapshot
+
+    def refresh(self):
+        """Drop the snapshot; the next query reloads it."""
+        with self._lock:
+            self._stale = True
+
+    def close(self):
+        with self._lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+
+    def ping(self):
+        self._cube()  # startup / health checks also (re)load the cube
+
+    # ---------------------------------------------------------
+    # SERVED FROM THE CUBE
+    # ---------------------------------------------------------
+    def daily_total(self, date_str, br_id=1):
+        return self._cube().daily_total(date_str, br_id)
+
+    def monthly_total(self, year, month_num, br_id=1):
+        return self._cube().monthly_total(year, month_num, br_id)
+
+    def monthly_average(self, year, month_num, br_id=1):
+        return self._cube().monthly_average(year, month_num, br_id)
+
+    def year_total(self, year, br_id=1):
+        return self._cube().year_total(year, br_id)
+
+    def extreme_month(self, year, descending=True, br_id=1):
+        return self._cube().extreme_month(year, descending, br_id)
+
+    def extreme_day(self, start_date, end_date, descending=True, br_id=1):
+        return self._cube().extreme_day(start_date, end_date, descending, br_id)
+
+    def extreme_branch(self, year, month_num=0, descending=True):
+        return self._cube().extreme_branch(year, month_num, descending)
+
+    def daily_sums(self, start_date, end_exclusive, br_ids=1, by_branch=False):
+        return self._cube().daily_sums(start_date, end_exclusive, br_ids, by_branch)
+
+    def monthly_sums(self, start, end, br_ids=1, by_branch=False):
+        return self._cube().monthly_sums(start, end, br_ids, by_branch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cube = self._snapshot
+            return {
+                "backend": self.backend,
+                "source": self.base.stats(),
+                "rows": cube.rows if cube else 0,
+                "shape": list(cube.totals.shape) if cube else None,
+                "bytes": cube.nbytes if cube else 0,
+                "loads": self._loads,
+                "last_load_ms": round(self._load_time * 1000, 2),
+                "served": self._served,
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_ENABLED = SALES_CUBE
+_CUBES: Dict[int, CubeSalesRepository] = {}
+_CUBES_LOCK = threading.Lock()
+
+
+def enabled() -> bool:
+    return _ENABLED and np is not None
+
+
+def serve(repo: SalesRepository) -> SalesRepository:
+    """The cube-backed view of `repo` when the cube is enabled, else `repo` itself."""
+    if not enabled():
+        return repo
+    cube = _CUBES.get(id(repo))
+    if cube is None or cube.base is not repo:
+        with _CUBES_LOCK:
+            cube = _CUBES.get(id(repo))
+            if cube is None or cube.base is not repo:
+                cube = CubeSalesRepository(repo)
+                _CUBES[id(repo)] = cube
+    return cube
+
+
+def invalidate():
+    """Reload every cube on its next query (e.g. after writing to a non-SQLite store)."""
+    for cube in list(_CUBES.values()):
+        cube.refresh()
+
+
+def configure(enable: bool = SALES_CUBE, ttl: float = CUBE_TTL):
+    """Turn the cube on / off (e.g. from tests); existing snapshots are dropped."""
+    global _ENABLED, CUBE_TTL
+    if enable and np is None:
+        print("⚠️ SALES_CUBE needs numpy (pip install numpy); serving from the database")
+    with _CUBES_LOCK:
+        for cube in _CUBES.values():
+            cube.close()
+        _CUBES.clear()
+        _ENABLED = enable
+        CUBE_TTL = ttl
+
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": enabled(), "cubes": [c.stats() for c in list(_CUBES.values())]}
+
+
+# Example usage
+if __name__ == "__main__":
+    import sales_repository
+
+    configure(True)
+    repo = serve(sales_repository.get_repository())
+    repo.ping()
+    for label, fn in [("year total", lambda: repo.year_total(2025, "ALL")),
+                      ("best month", lambda: repo.extreme_month(2025, True, "ALL")),
+                      ("best branch", lambda: repo.extreme_branch(2025, 0, True))]:
+        start = time.perf_counter()
+        value = fn()
+        print(f"{label:<12} {value}  ({(time.perf_counter() - start) * 1e6:.0f} µs)")
+    print(stats())
@@ -0,0 +1,557 @@
+"""
+Sales Repository for Mr. Mark Chatbot
+One read API for the chat service (day / month / year totals, extremes, batched sums,
+account balances) over interchangeable storage backends, selected with DB_BACKEND:
+
+    sqlite    - local sales.db, served from the rollup tables (default)
+    postgres  - the docker-compose database; pooled psycopg2 connections and
+                server-side prepared statements (PREPARE / EXECUTE)
+
+Both backends expose the same relations (sales, accounts and the sales_rollup_*
+tables - views on Postgres), so every query below is written once.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import db_migrations
+import db_pool
+import metrics
+import tracing
+
+
+# --- CONFIGURATION (env overridable) ---
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite").lower()       # sqlite | postgres
+SQLITE_DB = os.getenv("SQLITE_DB", "sales.db")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+
+# Postgres credentials (same defaults as the Docker setup)
+PG_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),  # 'db' inside docker
+    "database": os.getenv("POSTGRES_DB", "marksolution"),
+    "user": os.getenv("POSTGRES_USER", "markuser"),
+    "password": os.getenv("POSTGRES_PASSWORD", "markpass"),
+    "port": os.getenv("POSTGRES_PORT", "5432"),
+}
+
+
+# ===============================
+# POSTGRES SCHEMA
+# ===============================
+# The rollups are plain aggregate views on Postgres (no triggers). Only the daily view
+# groups on a raw column, so a sale_date range on it is pushed down to idx_sales_date_br_amount.
+# The monthly / yearly views group on EXTRACT(...), which no index can serve: the
+# Postgres repository answers month and year questions from the daily view with
+# half-open sale_date ranges instead, and keeps those two views for ad-hoc reporting.
+POSTGRES_SCHEMA = [
+    "ALTER TABLE sales ADD COLUMN IF NOT EXISTS br_id INTEGER DEFAULT 1",
+    "ALTER TABLE sales ADD COLUMN IF NOT EXISTS account_id INTEGER",
+    """CREATE TABLE IF NOT EXISTS accounts (
+           id SERIAL PRIMARY KEY,
+           parent_id INTEGER REFERENCES accounts(id),
+           name TEXT NOT NULL,
+           level INTEGER NOT NULL,
+           type TEXT NOT NULL CHECK (type IN ('ASSET', 'LIABILITY', 'EQUITY', 'INCOME', 'EXPENSE')),
+           allow_ledger TEXT NOT NULL CHECK (allow_ledger IN ('yes', 'no')))""",
+    """CREATE OR REPLACE VIEW sales_rollup_daily AS
+           SELECT sale_date, br_id, account_id, SUM(amount) AS total, COUNT(*) AS row_count
+           FROM sales GROUP BY sale_date, br_id, account_id""",
+    """CREATE OR REPLACE VIEW sales_rollup_monthly AS
+           SELECT EXTRACT(YEAR FROM sale_date)::int AS year, EXTRACT(MONTH FROM sale_date)::int AS month,
+                  br_id, account_id, SUM(amount) AS total, COUNT(*) AS row_count
+           FROM sales GROUP BY 1, 2, br_id, account_id""",
+    """CREATE OR REPLACE VIEW sales_rollup_yearly AS
+           SELECT EXTRACT(YEAR FROM sale_date)::int AS year, br_id, account_id,
+                  SUM(amount) AS total, COUNT(*) AS row_count
+           FROM sales GROUP BY 1, br_id, account_id""",
+]
+
+
+def prepare_postgres_schema(conn):
+    """
+    Bring a Postgres database up to the shared schema (idempotent).
+
+    Adds the branch / account columns and the unique (br_id, sale_date) key, the
+    accounts table and the rollup views. Duplicate days stop it with
+    db_migrations.DuplicateDaysError unless MIGRATE_DEDUPE is set (same rule as SQLite).
+    """
+    with conn.cursor() as cur:
+        for stmt in POSTGRES_SCHEMA[:2]:
+            cur.execute(stmt)
+        cur.execute("SELECT 1 FROM pg_indexes WHERE tablename = 'sales' AND indexname = 'uq_sales_br_date'")
+        if cur.fetchone() is None:
+            cur.execute(db_migrations.DUPLICATE_DAYS_SQL)
+            try:
+                removed = db_migrations.duplicate_rows_to_remove(
+                    [(r[0], r[1], str(r[2]), r[3]) for r in cur.fetchall()])
+            except db_migrations.DuplicateDaysError:
+                conn.rollback()
+                raise
+            if removed:
+                cur.execute("DELETE FROM sales WHERE id = ANY(%s)", (removed,))
+            cur.execute("CREATE UNIQUE INDEX uq_sales_br_date ON sales (br_id, sale_date)")
+        # Covering (same name as the SQLite index): range scans on the daily view skip the heap
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_sales_date_br_amount ON sales (sale_date, br_id) INCLUDE (amount, account_id)")
+        cur.execute("DROP INDEX IF EXISTS idx_sales_date_br")   # replaced by the covering index
+        for stmt in POSTGRES_SCHEMA[2:]:
+            cur.execute(stmt)
+    conn.commit()
+
+
+# ===============================
+# SHARED QUERIES
+# ===============================
+def branch_filter(br_ids, column: str = "br_id") -> Tuple[str, List[Any]]:
+    """SQL fragment + params for 'ALL', one branch id, or a list of branch ids."""
+    if br_ids is None or br_ids == 'ALL':
+        return "", []
+    if isinstance(br_ids, (list, tuple, set)):
+        ids = [int(b) for b in br_ids]
+        return f" AND {column} IN ({', '.join('?' * len(ids))})", ids
+    return f" AND {column} = ?", [br_ids]
+
+
+def month_bounds(year, month_num):
+    """Half-open [first day, first day of next month) range for index-friendly filters."""
+    year, month_num = int(year), int(month_num)
+    start = f"{year}-{month_num:02d}-01"
+    end = f"{year + 1}-01-01" if month_num == 12 else f"{year}-{month_num + 1:02d}-01"
+    return start, end
+
+
+def year_bounds(year):
+    """Half-open [Jan 1, Jan 1 next year) range for index-friendly filters."""
+    return f"{int(year)}-01-01", f"{int(year) + 1}-01-01"
+
+
+def _order(descending: bool) -> str:
+    return "DESC" if descending else "ASC"
+
+
+class SalesRepository:
+    """
+    Backend-independent queries. Subclasses provide `_all(sql, params)` (qmark
+    placeholders, rows as tuples of str / int / float) and `stats()`.
+    """
+
+    backend = "base"
+
+    def _all(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        raise NotImplementedError
+
+    def _one(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        rows = self._all(sql, params)
+        return rows[0] if rows else None
+
+    def _scalar(self, sql: str, params: Sequence[Any] = ()) -> Optional[float]:
+        row = self._one(sql, params)
+        return float(row[0]) if row and row[0] is not None else None
+
+    def ping(self):
+        self._all("SELECT 1")
+
+    # ---------------------------------------------------------
+    # SINGLE BUCKETS
+    # ---------------------------------------------------------
+    def daily_total(self, date_str: str, br_id=1) -> Optional[float]:
+        br_sql, br_params = branch_filter(br_id)
+        return self._scalar(f"SELECT SUM(total) FROM sales_rollup_daily WHERE sale_date = ?{br_sql}",
+                            (date_str, *br_params))
+
+    def monthly_total(self, year, month_num, br_id=1) -> Optional[float]:
+        br_sql, br_params = branch_filter(br_id)
+        return self._scalar(f"SELECT SUM(total) FROM sales_rollup_monthly WHERE year = ? AND month = ?{br_sql}",
+                            (int(year), int(month_num), *br_params))
+
+    def monthly_average(self, year, month_num, br_id=1) -> Optional[float]:
+        """
+        'ALL': average of daily company totals in the month.
+        One branch: average per recorded sales row (AVG(amount) on the raw table).
+        """
+        if br_id == 'ALL':
+            start_date, end_date = month_bounds(year, month_num)
+            return self._scalar("""
+                SELECT AVG(daily_total)
+                FROM (
+                    SELECT sale_date, SUM(total) as daily_total
+                    FROM sales_rollup_daily
+                    WHERE sale_date >= ? AND sale_date < ?
+                    GROUP BY sale_date
+                ) sub
+            """, (start_date, end_date))
+        return self._scalar("SELECT SUM(total) / SUM(row_count) FROM sales_rollup_monthly "
+                            "WHERE year = ? AND month = ? AND br_id = ?", (int(year), int(month_num), br_id))
+
+    def year_total(self, year, br_id=1) -> Optional[float]:
+        br_sql, br_params = branch_filter(br_id)
+        return self._scalar(f"SELECT SUM(total) FROM sales_rollup_yearly WHERE year = ?{br_sql}",
+                            (int(year), *br_params))
+
+    # ---------------------------------------------------------
+    # EXTREMES
+    # ---------------------------------------------------------
+    def extreme_month(self, year, descending: bool = True, br_id=1) -> Optional[tuple]:
+        """(month, total) of the best / worst month."""
+        br_sql, br_params = branch_filter(br_id)
+        return self._one(f"SELECT month, SUM(total) as total FROM sales_rollup_monthly WHERE year = ?{br_sql} "
+                         f"GROUP BY month ORDER BY total {_order(descending)} LIMIT 1", (int(year), *br_params))
+
+    def extreme_day(self, start_date: str, end_date: str, descending: bool = True, br_id=1) -> Optional[tuple]:
+        """(sale_date, total) of the best / worst day in [start_date, end_date)."""
+        br_sql, br_params = branch_filter(br_id)
+        return self._one(f"SELECT sale_date, SUM(total) as total FROM sales_rollup_daily "
+                         f"WHERE sale_date >= ? AND sale_date < ?{br_sql} "
+                         f"GROUP BY sale_date ORDER BY total {_order(descending)} LIMIT 1",
+                         (start_date, end_date, *br_params))
+
+    def extreme_branch(self, year, month_num: int = 0, descending: bool = True) -> Optional[tuple]:
+        """(br_id, total) of the best / worst branch in a month, or the year when month_num is 0."""
+        if month_num:
+            return self._one(f"SELECT br_id, SUM(total) as total FROM sales_rollup_monthly WHERE year = ? AND month = ? "
+                             f"GROUP BY br_id ORDER BY total {_order(descending)} LIMIT 1", (int(year), int(month_num)))
+        return self._one(f"SELECT br_id, SUM(total) as total FROM sales_rollup_yearly WHERE year = ? "
+                         f"GROUP BY br_id ORDER BY total {_order(descending)} LIMIT 1", (int(year),))
+
+    # ---------------------------------------------------------
+    # BATCHED SPANS (one GROUP BY per request)
+    # ---------------------------------------------------------
+    def daily_sums(self, start_date: str, end_exclusive: str, br_ids=1, by_branch: bool = False) -> List[tuple]:
+        """(sale_date[, br_id], total) for every day in [start_date, end_exclusive)."""
+        br_sql, br_params = branch_filter(br_ids)
+        keys = "sale_date, br_id" if by_branch else "sale_date"
+        return self._all(f"SELECT {keys}, SUM(total) FROM sales_rollup_daily "
+                         f"WHERE sale_date >= ? AND sale_date < ?{br_sql} GROUP BY {keys}",
+                         (start_date, end_exclusive, *br_params))
+
+    def monthly_sums(self, start: Tuple[int, int], end: Tuple[int, int], br_ids=1,
+                     by_branch: bool = False) -> List[tuple]:
+        """(year, month[, br_id], total) for every month from start to end (inclusive)."""
+        br_sql, br_params = branch_filter(br_ids)
+        keys = "year, month, br_id" if by_branch else "year, month"
+        return self._all(f"SELECT {keys}, SUM(total) FROM sales_rollup_monthly "
+                         f"WHERE (year, month) >= (?, ?) AND (year, month) <= (?, ?){br_sql} GROUP BY {keys}",
+                         (int(start[0]), int(start[1]), int(end[0]), int(end[1]), *br_params))
+
+    def daily_cells(self) -> List[tuple]:
+        """Every (sale_date, br_id, account_id, total, row_count) day cell (sales_cube.py source)."""
+        return self._all("SELECT sale_date, br_id, account_id, total, row_count FROM sales_rollup_daily")
+
+    # ---------------------------------------------------------
+    # ACCOUNTING
+    # ---------------------------------------------------------
+    def hierarchy_tree(self) -> List[tuple]:
+        """Chart of accounts in depth-first order: (id, parent_id, name, level, type, allow_ledger, depth)."""
+        return self._all("""
+            WITH RECURSIVE coa_tree AS (
+                SELECT id, parent_id, name, level, type, allow_ledger, 0 as depth, cast(id as text) as path
+                FROM accounts
+                WHERE parent_id IS NULL -- Roots
+                UNION ALL
+                SELECT a.id, a.parent_id, a.name, a.level, a.type, a.allow_ledger, ct.depth + 1, ct.path || '/' || a.id
+                FROM accounts a
+                JOIN coa_tree ct ON a.parent_id = ct.id
+            )
+            SELECT id, parent_id, name, level, type, allow_ledger, depth FROM coa_tree ORDER BY path
+        """)
+
+    def find_account(self, account_name: str) -> Optional[tuple]:
+        """(id, allow_ledger) of the first account matching the name (LIKE)."""
+        return self._one("SELECT id, allow_ledger FROM accounts WHERE name LIKE ? LIMIT 1", (account_name,))
+
+    def account_balance(self, account_id: int, year, br_id="ALL", ledger: bool = True) -> float:
+        """Yearly total of a ledger account, or of every ledger account below a group account."""
+        br_sql, br_params = branch_filter(br_id, "br_id" if ledger else "r.br_id")
+        if ledger:
+            val = self._scalar(f"SELECT SUM(total) FROM sales_rollup_yearly WHERE account_id = ? AND year = ?{br_sql}",
+                               (account_id, int(year), *br_params))
+        else:
+            val = self._scalar(f"""
+                WITH RECURSIVE descendants AS (
+                    SELECT id, allow_ledger FROM accounts WHERE id = ?
+                    UNION ALL
+                    SELECT a.id, a.allow_ledger FROM accounts a JOIN descendants d ON a.parent_id = d.id
+                )
+                SELECT SUM(r.total)
+                FROM sales_rollup_yearly r
+                WHERE r.account_id IN (SELECT id FROM descendants WHERE allow_ledger = 'yes')
+                AND r.year = ?{br_sql}
+            """, (account_id, int(year), *br_params))
+        return val or 0.0
+
+    # ---------------------------------------------------------
+    # CATALOGUE
+    # ---------------------------------------------------------
+    def years(self) -> List[int]:
+        return [int(r[0]) for r in self._all("SELECT DISTINCT year FROM sales_rollup_yearly ORDER BY 1 DESC")]
+
+    def branches(self) -> List[int]:
+        return [r[0] for r in self._all("SELECT DISTINCT br_id FROM sales_rollup_yearly ORDER BY br_id")]
+
+    def busiest_branch(self) -> Optional[int]:
+        """Branch with the most recorded sales rows."""
+        row = self._one("SELECT br_id, SUM(row_count) as c FROM sales_rollup_yearly GROUP BY br_id ORDER BY c DESC LIMIT 1")
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend}
+
+
+class SQLiteSalesRepository(SalesRepository):
+    """Reads the local SQLite store through db_pool (migrated at startup or with `python3 db_migrations.py`)."""
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str = SQLITE_DB):
+        self.db_path = db_path
+
+    def _all(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        metrics.count_db(self.backend)
+        with metrics.stage("db", sql=sql, params=list(params)), db_pool.connection(self.db_path) as conn:
+            rows = conn.execute(sql, tuple(params)).fetchall()
+            tracing.annotate(rows=len(rows))
+            return rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "db_path": self.db_path}
+
+
+class PostgresSalesRepository(SalesRepository):
+    """
+    Postgres reads over a bounded psycopg2 pool.
+
+    Every distinct query text is PREPAREd once per connection (named after its hash)
+    and then run with EXECUTE, so Postgres parses and plans it once per connection
+    rather than once per call.
+    """
+
+    backend = "postgres"
+
+    def __init__(self, config: Optional[Dict[str, str]] = None, min_size: int = PG_POOL_MIN,
+                 max_size: int = PG_POOL_MAX):
+        import psycopg2.pool  # optional: only needed for the Postgres backend
+
+        self.max_size = max(1, int(max_size))
+        self._pool = psycopg2.pool.ThreadedConnectionPool(max(0, min(min_size, self.max_size)), self.max_size,
+                                                          **(config or PG_CONFIG))
+        self._slots = threading.BoundedSemaphore(self.max_size)  # block instead of PoolError when exhausted
+        self._prepared: Dict[int, set] = {}                      # id(conn) -> prepared statement names
+        self._statements: Dict[str, Tuple[str, int]] = {}        # sql -> (name, param count)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._queries = 0
+        self._prepares = 0
+        self._errors = 0
+        self._wait_time = 0.0
+
+        conn = self._pool.getconn()
+        try:
+            prepare_postgres_schema(conn)
+        finally:
+            self._pool.putconn(conn)
+
+    def _statement(self, sql: str) -> Tuple[str, int]:
+        """Statement name and parameter count for a qmark query."""
+        with self._lock:
+            stmt = self._statements.get(sql)
+            if stmt is None:
+                stmt = ("mm_" + hashlib.sha1(sql.encode()).hexdigest()[:16], sql.count("?"))
+                self._statements[sql] = stmt
+            return stmt
+
+    @staticmethod
+    def _to_numbered(sql: str) -> str:
+        """qmark placeholders -> $1, $2, ... (queries here never contain literal '?')."""
+        counter = iter(range(1, sql.count("?") + 1))
+        return re.sub(r"\?", lambda _: f"${next(counter)}", sql)
+
+    @staticmethod
+    def _convert(value):
+        """Match SQLite's row types: dates as 'YYYY-MM-DD', NUMERIC as float."""
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (date, datetime)):
+            return value.strftime("%Y-%m-%d")
+        return value
+
+    def _all(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        metrics.count_db(self.backend)
+        with metrics.stage("db", sql=sql, params=list(params)):
+            rows = self._execute(sql, params)
+            tracing.annotate(rows=len(rows))
+            return rows
+
+    def _execute(self, sql: str, params: Sequence[Any]) -> List[tuple]:
+        name, n_params = self._statement(sql)
+        start = time.perf_counter()
+        self._slots.acquire()
+        conn = None
+        broken = False
+        try:
+            conn = self._pool.getconn()
+            waited = time.perf_counter() - start
+            conn.autocommit = True  # plain reads: no idle-in-transaction connections
+            prepared = self._prepared.setdefault(id(conn), set())
+            with conn.cursor() as cur:
+                if name not in prepared:
+                    cur.execute(f"PREPARE {name} AS {self._to_numbered(sql)}")
+                    prepared.add(name)
+                    with self._lock:
+                        self._prepares += 1
+                args = f" ({', '.join(['%s'] * n_params)})" if n_params else ""
+                cur.execute(f"EXECUTE {name}{args}", tuple(params))
+                rows = [tuple(self._convert(v) for v in row) for row in cur.fetchall()]
+            with self._lock:
+                self._queries += 1
+                self._wait_time += waited
+            return rows
+        except Exception:
+            broken = True
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            if conn is not None:
+                if broken:
+                    self._prepared.pop(id(conn), None)
+                self._pool.putconn(conn, close=broken)
+            self._slots.release()
+
+    # ---------------------------------------------------------
+    # MONTHS AND YEARS (half-open sale_date ranges on the daily view)
+    # ---------------------------------------------------------
+    def _period_sum(self, start: str, end: str, br_id, column: str = "SUM(total)") -> Optional[float]:
+        br_sql, br_params = branch_filter(br_id)
+        return self._scalar(f"SELECT {column} FROM sales_rollup_daily WHERE sale_date >= ? AND sale_date < ?{br_sql}",
+                            (start, end, *br_params))
+
+    def monthly_total(self, year, month_num, br_id=1) -> Optional[float]:
+        return self._period_sum(*month_bounds(year, month_num), br_id)
+
+    def monthly_average(self, year, month_num, br_id=1) -> Optional[float]:
+        if br_id == 'ALL':
+            return super().monthly_average(year, month_num, br_id)
+        return self._period_sum(*month_bounds(year, month_num), br_id, "SUM(total) / SUM(row_count)")
+
+    def year_total(self, year, br_id=1) -> Optional[float]:
+        return self._period_sum(*year_bounds(year), br_id)
+
+    def extreme_month(self, year, descending: bool = True, br_id=1) -> Optional[tuple]:
+        br_sql, br_params = branch_filter(br_id)
+        return self._one(f"SELECT EXTRACT(MONTH FROM sale_date)::int AS month, SUM(total) as total "
+                         f"FROM sales_rollup_daily WHERE sale_date >= ? AND sale_date < ?{br_sql} "
+                         f"GROUP BY 1 ORDER BY total {_order(descending)} LIMIT 1", (*year_bounds(year), *br_params))
+
+    def extreme_branch(self, year, month_num: int = 0, descending: bool = True) -> Optional[tuple]:
+        start, end = month_bounds(year, month_num) if month_num else year_bounds(year)
+        return self._one(f"SELECT br_id, SUM(total) as total FROM sales_rollup_daily WHERE sale_date >= ? AND sale_date < ? "
+                         f"GROUP BY br_id ORDER BY total {_order(descending)} LIMIT 1", (start, end))
+
+    def monthly_sums(self, start: Tuple[int, int], end: Tuple[int, int], br_ids=1,
+                     by_branch: bool = False) -> List[tuple]:
+        br_sql, br_params = branch_filter(br_ids)
+        keys = "EXTRACT(YEAR FROM sale_date)::int, EXTRACT(MONTH FROM sale_date)::int" + (", br_id" if by_branch else "")
+        groups = "1, 2, 3" if by_branch else "1, 2"
+        return self._all(f"SELECT {keys}, SUM(total) FROM sales_rollup_daily "
+                         f"WHERE sale_date >= ? AND sale_date < ?{br_sql} GROUP BY {groups}",
+                         (month_bounds(*start)[0], month_bounds(*end)[1], *br_params))
+
+    def account_balance(self, account_id: int, year, br_id="ALL", ledger: bool = True) -> float:
+        br_sql, br_params = branch_filter(br_id, "br_id" if ledger else "r.br_id")
+        if ledger:
+            val = self._scalar(f"SELECT SUM(total) FROM sales_rollup_daily "
+                               f"WHERE account_id = ? AND sale_date >= ? AND sale_date < ?{br_sql}",
+                               (account_id, *year_bounds(year), *br_params))
+        else:
+            val = self._scalar(f"""
+                WITH RECURSIVE descendants AS (
+                    SELECT id, allow_ledger FROM accounts WHERE id = ?
+                    UNION ALL
+                    SELECT a.id, a.allow_ledger FROM accounts a JOIN descendants d ON a.parent_id = d.id
+                )
+                SELECT SUM(r.total)
+                FROM sales_rollup_daily r
+                WHERE r.account_id IN (SELECT id FROM descendants WHERE allow_ledger = 'yes')
+                AND r.sale_date >= ? AND r.sale_date < ?{br_sql}
+            """, (account_id, *year_bounds(year), *br_params))
+        return val or 0.0
+
+    def close(self):
+        self._pool.closeall()
+        self._prepared.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "max_size": self.max_size,
+                "connections": len(self._prepared),
+                "statements": len(self._statements),
+                "queries": self._queries,
+                "prepares": self._prepares,
+                "errors": self._errors,
+                "avg_wait_ms": round(self._wait_time / self._queries * 1000, 3) if self._queries else 0.0,
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_BACKEND = DB_BACKEND
+_REPOS: Dict[str, SalesRepository] = {}
+_REPOS_LOCK = threading.Lock()
+
+
+def get_repository(db_path: str = SQLITE_DB) -> SalesRepository:
+    """
+    The repository for the configured backend. With SQLite, one per database file
+    (`db_path`); with Postgres, one shared pool (db_path is ignored).
+    """
+    key = "postgres" if _BACKEND == "postgres" else db_path
+    repo = _REPOS.get(key)
+    if repo is None:
+        with _REPOS_LOCK:
+            repo = _REPOS.get(key)
+            if repo is None:
+                if _BACKEND == "postgres":
+                    repo = PostgresSalesRepository()
+                else:
+                    if _BACKEND != "sqlite":
+                        print(f"⚠️ Unknown DB_BACKEND '{_BACKEND}', using sqlite")
+                    repo = SQLiteSalesRepository(db_path)
+                _REPOS[key] = repo
+    return repo
+
+
+def configure(backend: str = DB_BACKEND):
+    """Switch backend (e.g. from tests); open Postgres pools are closed."""
+    global _BACKEND
+    with _REPOS_LOCK:
+        for repo in _REPOS.values():
+            if isinstance(repo, PostgresSalesRepository):
+                repo.close()
+        _REPOS.clear()
+        _BACKEND = backend.lower()
+
+
+def stats() -> Dict[str, Any]:
+    return {key: repo.stats() for key, repo in list(_REPOS.items())}
+
+
+# Example usage
+if __name__ == "__main__":
+    repo = get_repository()
+    print(f"Backend: {repo.backend}")
+    print(f"Years: {repo.years()}  Branches: {repo.branches()}")
+    if repo.years():
+        year = repo.years()[0]
+        print(f"{year} total (ALL): {repo.year_total(year, 'ALL'):,.2f}")
+        print(f"Best month {year}: {repo.extreme_month(year, True, 'ALL')}")
+    print(stats())
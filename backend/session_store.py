@@ -0,0 +1,266 @@
+"""
+Session Context Store for Mr. Mark Chatbot
+Per-session follow-up context (pending "which branch?" query, last successful and last
+attempted query), so concurrent users and multiple uvicorn workers never share state.
+
+Backends (SESSION_BACKEND):
+    memory  - bounded in-process LRU with TTL (default, single worker)
+    sqlite  - shared SQLite table in SESSION_DB (multiple workers on one host)
+
+Clients name their session in the request body or the X-Session-ID header; one that
+sends neither is issued an id (SESSION_COOKIE cookie + X-Session-ID response header)
+and starts from a fresh context.
+"""
+
+import copy
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import db_pool
+
+
+# --- CONFIGURATION (env overridable) ---
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))        # idle seconds before a session is forgotten
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))          # in-memory sessions kept (LRU)
+
+SESSION_COOKIE = os.getenv("SESSION_COOKIE", "mm_session")   # id issued to clients that send none
+SESSION_HEADER = "X-Session-ID"
+
+
+def resolve_session_id(*candidates: Optional[str]) -> str:
+    """
+    The caller's session id: the first non-blank candidate (request body, X-Session-ID
+    header, session cookie), or a new random id, so that session-less clients never
+    share one context.
+    """
+    for candidate in candidates:
+        if candidate and candidate.strip():
+            return candidate.strip()[:128]
+    return secrets.token_urlsafe(16)
+
+
+def new_context() -> Dict[str, Dict[str, Optional[str]]]:
+    """Fresh context in the shape the chat pipeline reads and mutates."""
+    return {
+        "pending": {"query": None},           # query waiting for a "Which branch?" answer
+        "last_successful": {"text": None},    # last resolved query (base for follow-ups)
+        "last_attempted": {"text": None},     # last unresolved query (clarification loop)
+    }
+
+
+def _normalize(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in missing keys so older / partial stored contexts stay usable."""
+    fresh = new_context()
+    for key, value in (context or {}).items():
+        if key in fresh and isinstance(value, dict):
+            fresh[key].update(value)
+    return fresh
+
+
+class MemorySessionStore:
+    """Bounded LRU of session contexts; idle sessions expire after ttl seconds."""
+
+    backend = "memory"
+
+    def __init__(self, max_sessions: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        self.max_sessions = max(1, int(max_sessions))
+        self.ttl = float(ttl)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (expires_at, context)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._loads = 0
+        self._saves = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def load(self, session_id: str) -> Dict[str, Any]:
+        """Context for the session (a private copy; call save() to persist changes)."""
+        now = time.time()
+        with self._lock:
+            self._loads += 1
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return new_context()
+            if entry[0] <= now:
+                del self._sessions[session_id]
+                self._expirations += 1
+                return new_context()
+            self._sessions.move_to_end(session_id)
+            return copy.deepcopy(entry[1])
+
+    def save(self, session_id: str, context: Dict[str, Any]):
+        with self._lock:
+            self._saves += 1
+            self._sessions[session_id] = (time.time() + self.ttl, copy.deepcopy(context))
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_s": self.ttl,
+                "loads": self._loads,
+                "saves": self._saves,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+class SQLiteSessionStore:
+    """
+    Session contexts in a SQLite table shared by every worker process on the host.
+    Expired rows are ignored on load and purged every `purge_every` saves.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str = SESSION_DB, ttl: float = SESSION_TTL, purge_every: int = 500):
+        self.db_path = db_path
+        self.ttl = float(ttl)
+        self.purge_every = max(1, int(purge_every))
+        self._ready = False
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._loads = 0
+        self._saves = 0
+        self._expirations = 0
+        self._errors = 0
+
+    def _ensure_table(self, conn):
+        if not self._ready:
+            conn.execute("""CREATE TABLE IF NOT EXISTS chat_sessions
+                            (session_id TEXT PRIMARY KEY,
+                             context TEXT NOT NULL,
+                             expires_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_expires ON chat_sessions (expires_at)")
+            conn.commit()
+            self._ready = True
+
+    def load(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            self._loads += 1
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                self._ensure_table(conn)
+                row = conn.execute("SELECT context, expires_at FROM chat_sessions WHERE session_id = ?",
+                                   (session_id,)).fetchone()
+            if row is None:
+                return new_context()
+            if row[1] <= time.time():
+                with self._lock:
+                    self._expirations += 1
+                return new_context()
+            return _normalize(json.loads(row[0]))
+        except Exception as e:
+            print(f"⚠️ Session Load Error: {e}")
+            with self._lock:
+                self._errors += 1
+            return new_context()
+
+    def save(self, session_id: str, context: Dict[str, Any]):
+        with self._lock:
+            self._saves += 1
+            purge = self._saves % self.purge_every == 0
+        now = time.time()
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                self._ensure_table(conn)
+                conn.execute("""INSERT INTO chat_sessions (session_id, context, expires_at) VALUES (?, ?, ?)
+                                ON CONFLICT(session_id) DO UPDATE SET context = excluded.context,
+                                                                      expires_at = excluded.expires_at""",
+                             (session_id, json.dumps(context), now + self.ttl))
+                if purge:
+                    conn.execute("DELETE FROM chat_sessions WHERE expires_at <= ?", (now,))
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Session Save Error: {e}")
+            with self._lock:
+                self._errors += 1
+
+    def delete(self, session_id: str):
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                self._ensure_table(conn)
+                conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+                conn.commit()
+        except Exception as e:
+            print(f"⚠️ Session Delete Error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        sessions = None
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                self._ensure_table(conn)
+                sessions = conn.execute("SELECT COUNT(*) FROM chat_sessions WHERE expires_at > ?",
+                                        (time.time(),)).fetchone()[0]
+        except Exception as e:
+            print(f"⚠️ Session Stats Error: {e}")
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "db_path": self.db_path,
+                "sessions": sessions,
+                "ttl_s": self.ttl,
+                "loads": self._loads,
+                "saves": self._saves,
+                "expirations": self._expirations,
+                "errors": self._errors,
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+def create_store(backend: str = SESSION_BACKEND, **kwargs):
+    if backend == "sqlite":
+        return SQLiteSessionStore(**kwargs)
+    if backend != "memory":
+        print(f"⚠️ Unknown SESSION_BACKEND '{backend}', using memory")
+    return MemorySessionStore(**kwargs)
+
+
+_STORE = create_store()
+
+
+def get_store():
+    return _STORE
+
+
+def configure(backend: str = SESSION_BACKEND, **kwargs):
+    """Replace the shared store (e.g. from tests)."""
+    global _STORE
+    _STORE = create_store(backend, **kwargs)
+    return _STORE
+
+
+def stats() -> Dict[str, Any]:
+    return _STORE.stats()
+
+
+# Example usage
+if __name__ == "__main__":
+    store = configure("memory", max_sessions=2, ttl=60)
+    ctx = store.load("alice")
+    ctx["last_successful"]["text"] = "Sales in June 2025 Branch 1"
+    store.save("alice", ctx)
+    print("alice:", store.load("alice"))
+    print("bob:  ", store.load("bob"))
+    print(stats())
@@ -0,0 +1,263 @@
+"""
+ERP Sync Engine for Mr. Mark Chatbot
+Incremental, transactional sync of daily branch totals from the ERP API into the sales
+store (SQLite or Postgres): branches are fetched concurrently, each branch is upserted
+on the (br_id, sale_date) key with executemany inside one transaction, and only the
+trailing window that can still change is re-pulled.
+
+Run: python3 sync_engine.py [path/to/sales.db] [--year 2024] [--window 7] [--backend sqlite|postgres]
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import db_migrations
+import db_pool
+import erp_client
+from sales_repository import DB_BACKEND, PG_CONFIG, prepare_postgres_schema
+
+
+# --- CONFIGURATION (env overridable) ---
+SYNC_DB = os.getenv("SYNC_DB", "sales.db")
+SYNC_BRANCHES = [int(b) for b in os.getenv("SYNC_BRANCHES", "1,2,3,4,5").split(",") if b.strip()]
+SYNC_WINDOW_DAYS = int(os.getenv("SYNC_WINDOW_DAYS", "7"))     # recent days re-pulled (late corrections)
+SYNC_MAX_DAYS = int(os.getenv("SYNC_MAX_DAYS", "366"))         # range for an empty branch / full year
+SYNC_TIMEOUT = float(os.getenv("SYNC_TIMEOUT", "30"))
+SYNC_ACCOUNT_ID = os.getenv("SYNC_ACCOUNT_ID", "")             # empty = the 'Sales Revenue' account
+
+UPSERT_SQL = """
+    INSERT INTO sales (item_name, sale_date, amount, br_id, account_id) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (br_id, sale_date) DO UPDATE SET amount = excluded.amount
+    WHERE sales.amount IS NOT excluded.amount
+"""
+
+PG_UPSERT_SQL = """
+    INSERT INTO sales (item_name, sale_date, amount, br_id, account_id) VALUES %s
+    ON CONFLICT (br_id, sale_date) DO UPDATE SET amount = EXCLUDED.amount
+    WHERE sales.amount IS DISTINCT FROM EXCLUDED.amount
+"""
+
+LAST_DAYS_SQL = "SELECT br_id, MAX(sale_date) FROM sales WHERE br_id IS NOT NULL GROUP BY br_id"
+
+
+def sales_account_id(conn) -> Optional[int]:
+    """Account new rows are booked to (same default as migrate_accounting.py); sqlite3 or psycopg2 `conn`."""
+    if SYNC_ACCOUNT_ID:
+        return int(SYNC_ACCOUNT_ID)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM accounts WHERE name = 'Sales Revenue'")
+        row = cur.fetchone()
+        return row[0] if row else None
+    except Exception:
+        return None  # no accounting layer in this database
+
+
+def plan_ranges(last: Dict[int, str], branches: Sequence[int], today: date, window_days: int = SYNC_WINDOW_DAYS,
+                max_days: int = SYNC_MAX_DAYS) -> Dict[int, int]:
+    """
+    Days to request per branch: everything since the branch's last stored day (`last`,
+    br_id -> 'YYYY-MM-DD') plus the trailing `window_days` (which the ERP may still
+    revise); max_days for a new branch.
+    """
+    ranges = {}
+    for b in branches:
+        if not last.get(b):
+            ranges[b] = max_days
+            continue
+        gap = (today - datetime.strptime(last[b], "%Y-%m-%d").date()).days
+        ranges[b] = min(max_days, max(window_days, gap + window_days))
+    return ranges
+
+
+def _stage_rows(rows: List[Dict[str, Any]], br_id: int, account_id: Optional[int], today: date,
+                year: Optional[int]) -> List[tuple]:
+    """API rows -> upsert parameters (valid, non-future days; one row per day, last wins)."""
+    today_str = today.strftime("%Y-%m-%d")
+    staged = {}
+    for row in rows:
+        period = row.get("period")
+        if not period or len(period) != 10 or period > today_str:
+            continue
+        if year is not None and not period.startswith(f"{year}-"):
+            continue
+        amount = float(row.get("total_sales", row.get("total_sale", 0)) or 0)
+        staged[period] = (f"Daily_Sales_{period}", period, amount, br_id, account_id)
+    return list(staged.values())
+
+
+# ===============================
+# BACKENDS
+# ===============================
+class SQLiteStore:
+    """Pooled connections to a migrated SQLite file."""
+
+    def __init__(self, db_path: str = SYNC_DB):
+        self.db_path = db_path
+        db_migrations.ensure_schema(db_path)
+        with db_pool.connection(db_path) as conn:
+            self.account_id = sales_account_id(conn)
+
+    def last_days(self) -> Dict[int, str]:
+        with db_pool.connection(self.db_path) as conn:
+            return dict(conn.execute(LAST_DAYS_SQL))
+
+    def write_branch(self, params: List[tuple]) -> int:
+        """Upsert one branch in a single transaction; returns rows inserted or changed."""
+        with db_pool.connection(self.db_path) as conn:
+            conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # rowcount: rows inserted or updated by the upsert itself (not the rollup triggers)
+                changed = conn.executemany(UPSERT_SQL, params).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return max(changed, 0)
+
+    def close(self):
+        pass
+
+
+class PostgresStore:
+    """One psycopg2 connection (writes are serialised by sync()); same upsert as SQLiteStore."""
+
+    def __init__(self, config: Optional[Dict[str, str]] = None):
+        import psycopg2  # optional: only needed for the Postgres backend
+        import psycopg2.extras
+
+        self._execute_values = psycopg2.extras.execute_values
+        self.conn = psycopg2.connect(**(config or PG_CONFIG))
+        # Branch / account columns and the unique (br_id, sale_date) key on older databases
+        prepare_postgres_schema(self.conn)
+        self.account_id = sales_account_id(self.conn)
+        self.conn.rollback()   # end the read transaction sales_account_id opened
+
+    def last_days(self) -> Dict[int, str]:
+        with self.conn.cursor() as cur:
+            cur.execute(LAST_DAYS_SQL)
+            last = {b: d.strftime("%Y-%m-%d") for b, d in cur.fetchall()}
+        self.conn.rollback()
+        return last
+
+    def write_branch(self, params: List[tuple]) -> int:
+        """Upsert one branch in a single transaction; returns rows inserted or changed."""
+        if not params:
+            return 0
+        try:
+            with self.conn.cursor() as cur:
+                # One multi-row statement (one page), so rowcount covers the whole branch
+                self._execute_values(cur, PG_UPSERT_SQL, params, page_size=len(params))
+                changed = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return changed
+
+    def close(self):
+        self.conn.close()
+
+
+def create_store(backend: str = DB_BACKEND, db_path: str = SYNC_DB):
+    if backend == "postgres":
+        return PostgresStore()
+    if backend != "sqlite":
+        print(f"⚠️ Unknown DB_BACKEND '{backend}', using sqlite")
+    return SQLiteStore(db_path)
+
+
+def sync(db_path: str = SYNC_DB, branches: Optional[Sequence[int]] = None, window_days: int = SYNC_WINDOW_DAYS,
+         year: Optional[int] = None, client: Optional[erp_client.ERPClient] = None,
+         verbose: bool = True, backend: str = DB_BACKEND) -> List[Dict[str, Any]]:
+    """
+    Sync daily totals for every branch.
+
+    - year=None: incremental (trailing window of the current year's data).
+    - year=YYYY: full pull of that year (backfill / historical re-sync).
+
+    Returns:
+        One result dict per branch (rows fetched/changed, timings, rows/sec, error).
+    """
+    branches = list(branches or SYNC_BRANCHES)
+    today = date.today()
+    own_client = client is None
+    client = client or erp_client.ERPClient(branches=branches, timeout=SYNC_TIMEOUT, ttl=0)
+
+    store = create_store(backend, db_path)
+    account_id = store.account_id
+    if year is None:
+        ranges = plan_ranges(store.last_days(), branches, today, window_days)
+    else:
+        ranges = {b: SYNC_MAX_DAYS for b in branches}
+    api_year = str(year or today.year)
+
+    def fetch(b):
+        start = time.perf_counter()
+        rows = client.fetch_rows(b, type_="daily", year=api_year, range_=str(ranges[b]))
+        return rows, time.perf_counter() - start
+
+    if verbose:
+        mode = f"year {year}" if year else f"incremental, window {window_days}d"
+        print(f"🚀 Syncing branches {branches} ({mode})...")
+
+    started = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, len(branches)), thread_name_prefix="sync") as pool:
+        futures = {pool.submit(fetch, b): b for b in branches}
+        # Writes are serialised (SQLite has one writer); each starts as soon as its fetch lands
+        for future in as_completed(futures):
+            b = futures[future]
+            result = {"br_id": b, "range_days": ranges[b], "fetched": 0, "changed": 0,
+                      "fetch_s": 0.0, "write_s": 0.0, "rows_per_s": 0.0, "error": None}
+            try:
+                rows, result["fetch_s"] = future.result()
+                params = _stage_rows(rows, b, account_id, today, year)
+                result["fetched"] = len(params)
+                start = time.perf_counter()
+                result["changed"] = store.write_branch(params)
+                result["write_s"] = time.perf_counter() - start
+                busy = result["fetch_s"] + result["write_s"]
+                result["rows_per_s"] = round(len(params) / busy, 1) if busy else 0.0
+            except Exception as e:
+                result["error"] = str(e)
+                if verbose:
+                    print(f"   ❌ Branch {b} Sync Error: {e}")
+            results.append(result)
+    elapsed = time.perf_counter() - started
+
+    store.close()
+    if own_client:
+        client.close()
+
+    results.sort(key=lambda r: r["br_id"])
+    if verbose:
+        print(f"{'Branch':<8}{'days':>6}{'rows':>7}{'changed':>9}{'fetch s':>9}{'write s':>9}{'rows/s':>10}")
+        print("-" * 58)
+        for r in results:
+            if r["error"]:
+                print(f"{r['br_id']:<8}{r['range_days']:>6}  ❌ {r['error']}")
+                continue
+            print(f"{r['br_id']:<8}{r['range_days']:>6}{r['fetched']:>7}{r['changed']:>9}"
+                  f"{r['fetch_s']:>9.3f}{r['write_s']:>9.3f}{r['rows_per_s']:>10}")
+        fetched = sum(r["fetched"] for r in results)
+        print(f"🏁 Sync Complete: {fetched} rows, {sum(r['changed'] for r in results)} changed "
+              f"in {elapsed:.2f}s ({fetched / elapsed if elapsed else 0:,.0f} rows/s)")
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sync ERP daily totals into the sales store")
+    parser.add_argument("db", nargs="?", default=SYNC_DB)
+    parser.add_argument("--year", type=int, help="full pull of one year instead of the trailing window")
+    parser.add_argument("--window", type=int, default=SYNC_WINDOW_DAYS, help="trailing days to re-pull")
+    parser.add_argument("--backend", default=DB_BACKEND, choices=["sqlite", "postgres"])
+    opts = parser.parse_args()
+    sync(db_path=opts.db, year=opts.year, window_days=opts.window, backend=opts.backend)
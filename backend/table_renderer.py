@@ -0,0 +1,285 @@
+"""
+Table Renderer for Mr. Mark Chatbot
+One layout engine behind every result table. build() turns headers + rows into a
+Table: cell text, display labels and column types are worked out once per value,
+widths and alignment once per table, and the HTML (pgsql code block), ASCII and
+Markdown renderings are produced from that layout with list joins.
+
+Tables rendered while a chat turn is inside collect() are also kept in structured
+form (column names, types, raw rows) so /chat can return them as JSON next to the
+HTML answer and the frontend does not have to parse it back.
+"""
+
+import contextvars
+import math
+import re
+import threading
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Display-only header names (unknown headers fall back to Title Case)
+HEADER_LABELS = {
+    "period": "Period",
+    "sales_lkr": "Sales",
+    "metric": "Metric",
+    "total_sales_lkr": "Total Sales",
+    "average_lkr": "Average Sales",
+    "live_sales_lkr": "Live Sales",
+    "date": "Date",
+    "month": "Month"
+}
+
+# psql style: a text cell is a number when it is digits with an optional sign / decimals (commas ignored)
+_NUMERIC_TEXT = re.compile(r'^-?[\d,]+\.?\d*$')
+# Whole-column fast paths, one regex call per column (cells joined with newlines)
+_NUMERIC_LINES = re.compile(r'-?\d+\.?\d*(?:\n-?\d+\.?\d*)*')
+_AMOUNT_LINES = re.compile(r'(?: *-?\d+\.?\d* *)?(?:\n(?: *-?\d+\.?\d* *)?)*')
+
+HTML_OPEN = ('<div class="gpt-codeblock"><div class="gpt-header"><span class="lang">pgsql</span>'
+             '<button class="copy-btn-code">Copy code</button></div><pre><code>\n')
+HTML_CLOSE = '\n</code></pre></div>'
+
+
+@lru_cache(maxsize=256)
+def header_label(header: str) -> str:
+    """'sales_lkr' -> 'Sales', 'branch' -> 'Branch'."""
+    return HEADER_LABELS.get(header.lower(), header.title())
+
+
+def _psql_text(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def _joined(texts: Sequence[str], cleaned: str) -> bool:
+    """True when no cell has a newline of its own, so `cleaned` has one line per cell."""
+    return cleaned.count("\n") == len(texts) - 1
+
+
+def _psql_column(values: Sequence[Any]):
+    """(cell texts, is_number) for the pgsql tables: NULL for None, floats as 1,234.50."""
+    if not values:
+        return [], True
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        return list(map(str, values)), True
+    if kinds == {float}:
+        return [f"{v:,.2f}" for v in values], all(map(math.isfinite, values))
+    texts = values if kinds == {str} else [_psql_text(v) for v in values]
+    cleaned = "\n".join(texts).replace(",", "")
+    if _joined(texts, cleaned) and _NUMERIC_LINES.fullmatch(cleaned):
+        return texts, True
+    return texts, all(_NUMERIC_TEXT.match(t.replace(',', '')) for t in texts)
+
+
+def _is_amount(text: str) -> bool:
+    stripped = text.replace("LKR", "").replace(",", "").replace("%", "").strip()
+    if not stripped:
+        return True
+    try:
+        float(stripped)
+        return True
+    except ValueError:
+        return False
+
+
+def _plain_column(values: Sequence[Any]):
+    """(cell texts, is_number) for plain tables: str() as given, LKR / % amounts and blanks count as numbers."""
+    texts = values if all(type(v) is str for v in values) else [str(v) for v in values]
+    if not texts:
+        return [], True
+    cleaned = "\n".join(texts).replace("LKR", "").replace(",", "").replace("%", "")
+    if _joined(texts, cleaned) and _AMOUNT_LINES.fullmatch(cleaned):
+        return texts, True
+    return texts, all(map(_is_amount, texts))
+
+
+_COLUMN_STYLES = {"psql": _psql_column, "plain": _plain_column}
+
+
+def _json_value(value: Any, is_number: bool) -> Any:
+    """Raw value for the structured output: numbers stay numbers, numeric text becomes one."""
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value if math.isfinite(value) else None
+    if is_number and isinstance(value, str):
+        raw = value.replace("LKR", "").replace(",", "").replace("%", "").strip()
+        try:
+            number = int(raw) if raw.lstrip("-").isdigit() else float(raw)
+        except ValueError:
+            return value
+        return number if math.isfinite(number) else value
+    return value if isinstance(value, str) else str(value)
+
+
+class Column:
+    """One column: source header, display label, type ('number' / 'text') and width."""
+
+    __slots__ = ("name", "label", "kind", "numeric", "width")
+
+    def __init__(self, name: str, label: str, kind: str, width: int):
+        self.name = name
+        self.label = label
+        self.kind = kind
+        self.numeric = kind == "number"
+        self.width = width
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"name": self.name, "label": self.label, "type": self.kind}
+
+
+class Table:
+    """Laid-out table (cell text kept per column); each rendering is computed once and reused."""
+
+    def __init__(self, columns: List[Column], texts: List[Sequence[str]], values: Sequence[Sequence[Any]],
+                 footer: Optional[List[str]] = None, footer_values: Optional[List[Any]] = None):
+        self.columns = columns
+        self.texts = texts
+        self.values = values
+        self.footer = footer
+        self.footer_values = footer_values
+
+    @property
+    def row_count(self) -> int:
+        return len(self.values)
+
+    @property
+    def cells(self) -> List[tuple]:
+        """Cell text row by row."""
+        return list(zip(*self.texts))
+
+    @cached_property
+    def ascii(self) -> str:
+        """psql layout: left-aligned header, numbers right-aligned, optional footer under a second rule."""
+        # One format template per table: every body row is laid out by a single str.format call
+        row = " | ".join(f"{{:{'>' if col.numeric else '<'}{col.width}}}" if col.width else "{}"
+                         for col in self.columns)
+        rule = "-+-".join("-" * col.width for col in self.columns)
+        lines = [" | ".join(col.label.ljust(col.width) for col in self.columns), rule]
+        if self.values:
+            lines.append("\n".join([row] * len(self.values)).format(*chain.from_iterable(zip(*self.texts))))
+        if self.footer is not None:
+            lines.append(rule)
+            lines.append(" | ".join(cell.rjust(col.width) if col.numeric else cell.ljust(col.width)
+                                    for col, cell in zip(self.columns, self.footer)))
+        return "\n".join(lines)
+
+    @cached_property
+    def html(self) -> str:
+        """ASCII layout inside the chat UI's pgsql code block."""
+        return HTML_OPEN + self.ascii + HTML_CLOSE
+
+    @cached_property
+    def markdown(self) -> str:
+        def row(cells):
+            return "| " + " | ".join(str(c).replace("|", "\\|") for c in cells) + " |"
+        lines = [row(col.label for col in self.columns),
+                 "|" + "|".join("---:" if col.numeric else ":---" for col in self.columns) + "|"]
+        lines.extend(row(cells) for cells in self.cells)
+        if self.footer is not None:
+            lines.append(row(self.footer))
+        return "\n".join(lines)
+
+    def render(self, fmt: str = "html") -> str:
+        if fmt not in ("html", "ascii", "markdown"):
+            raise ValueError(f"Unknown table format: {fmt}")
+        return getattr(self, fmt)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready form for the frontend (column types decide number vs text)."""
+        data = {
+            "columns": [col.to_dict() for col in self.columns],
+            "rows": [[_json_value(v, col.numeric) for col, v in zip(self.columns, row)] for row in self.values],
+        }
+        if self.footer_values is not None:
+            data["footer"] = [_json_value(v, col.numeric) for col, v in zip(self.columns, self.footer_values)]
+        return data
+
+
+def build(headers: Sequence[Any], rows: Sequence[Sequence[Any]], footer: Optional[Sequence[Any]] = None,
+          style: str = "psql") -> Table:
+    """
+    Lay out a table. style="psql" maps headers to display labels and formats values the
+    pgsql way (NULL, 1,234.50); style="plain" keeps headers and str() values as given.
+    A column is numeric when every data row's cell is (the footer does not vote); columns
+    of ints or floats are typed without looking at their text.
+    """
+    column_of = _COLUMN_STYLES[style]
+    names = [str(h) for h in headers]
+    labels = [header_label(n) for n in names] if style == "psql" else names
+    by_column = list(zip(*rows)) if rows else [()] * len(names)
+    footer_texts = None
+    if footer is not None:
+        footer_texts = [_psql_text(v) if style == "psql" else str(v) for v in footer]
+    columns, texts = [], []
+    for i, (name, label, values) in enumerate(zip(names, labels, by_column)):
+        cells, numeric = column_of(values)
+        width = max(len(label), max(map(len, cells), default=0))
+        if footer_texts is not None and i < len(footer_texts):
+            width = max(width, len(footer_texts[i]))
+        columns.append(Column(name, label, "number" if numeric else "text", width))
+        texts.append(cells)
+    return Table(columns, texts, rows, footer_texts, list(footer) if footer is not None else None)
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+# Structured tables of the current chat turn; None outside collect()
+_COLLECTED: contextvars.ContextVar = contextvars.ContextVar("rendered_tables", default=None)
+_COUNTS = {"tables": 0, "rows": 0}
+_LOCK = threading.Lock()
+
+
+def render(headers: Sequence[Any], rows: Sequence[Sequence[Any]], footer: Optional[Sequence[Any]] = None,
+           fmt: str = "html", style: str = "psql") -> str:
+    """build() + render in one call; the structured table is kept when inside collect()."""
+    table = build(headers, rows, footer, style)
+    with _LOCK:
+        _COUNTS["tables"] += 1
+        _COUNTS["rows"] += table.row_count
+    collected = _COLLECTED.get()
+    if collected is not None:
+        collected.append(table.to_dict())
+    return table.render(fmt)
+
+
+@contextmanager
+def collect() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the structured form of every table rendered in this context."""
+    tables: List[Dict[str, Any]] = []
+    token = _COLLECTED.set(tables)
+    try:
+        yield tables
+    finally:
+        _COLLECTED.reset(token)
+
+
+def configure():
+    """Reset counters and the header label cache (e.g. from tests or benchmarks)."""
+    header_label.cache_clear()
+    with _LOCK:
+        _COUNTS.update(tables=0, rows=0)
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        info = dict(_COUNTS)
+    labels = header_label.cache_info()
+    info["label_cache"] = {"hits": labels.hits, "misses": labels.misses, "size": labels.currsize}
+    return info
+
+
+# Example usage
+if __name__ == "__main__":
+    t = build(["month", "sales_lkr"], [["January", 1250000.5], ["February", "980,000.00"]],
+              footer=["Total", "2,230,000.50"])
+    print(t.ascii)
+    print(t.markdown)
+    print(t.to_dict())
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import analysis_prompt
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import metrics
+import ollama_client
+import response_rules
+from benchmark_ollama_prompt import run
+from fake_ollama import FakeOllama, keep_alive_seconds
+from loadtest_chat import asgi_request
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+
+def test_request_shapes_and_modelfile():
+    with open(analysis_prompt.MODELFILE_PATH) as f:
+        assert f.read() == analysis_prompt.modelfile()   # regenerate: python3 analysis_prompt.py modelfile
+    assert "User Role" not in analysis_prompt.system_prompt()
+    assert "[CHART_JSON]" in analysis_prompt.system_prompt(True)
+
+    request = analysis_prompt.build("MANAGER", "DATA TABLE", "Sales in May")
+    assert request["system"] == analysis_prompt.system_prompt()
+    assert request["prompt"].startswith("User Role: MANAGER\n\nDATA:\nDATA TABLE")
+    try:
+        analysis_prompt.configure("model")
+        assert analysis_prompt.build("ADMIN", "t", "q") == {"model": analysis_prompt.ANALYSIS_BAKED_MODEL,
+                                                           "prompt": analysis_prompt.turn_prompt("ADMIN", "t", "q")}
+        assert analysis_prompt.build("ADMIN", "t", "q", llm_charts=True)["system"] == analysis_prompt.system_prompt(True)
+        analysis_prompt.configure("inline")
+        request = analysis_prompt.build("ADMIN", "t", "q")
+        assert "system" not in request and request["prompt"].startswith(analysis_prompt.system_prompt())
+        assert analysis_prompt.stats() == {"built": 1, "system_chars": 0, "prompt_chars": len(request["prompt"]), "mode": "inline"}
+    finally:
+        analysis_prompt.configure()
+    assert keep_alive_seconds("30m") == 1800 and keep_alive_seconds(-1) < 0 and keep_alive_seconds(None) == 300
+
+
+def _chat(path, message, role):
+    status, chunks = asyncio.run(asgi_request(main.app, "POST", path, {"message": message, "role": role}))
+    assert status == 200
+    return b"".join(chunks)
+
+
+def test_chat_reuses_system_prefix():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(ttl=0)
+        response_rules.configure("llm")  # these answers exercise the Ollama path
+        metrics.configure()
+        try:
+            with FakeOllama() as ollama:
+                main.OLLAMA_URL = ollama.url
+                _chat("/chat", "Sales in Q1 2025 for Branch 1", "ADMIN")
+                first = ollama.prompt_eval_tokens
+                _chat("/chat/stream", "Sales in Q2 2025 for Branch 2", "MANAGER")
+                second = ollama.prompt_eval_tokens - first
+                for body in ollama.requests:
+                    assert body["system"] == analysis_prompt.system_prompt()
+                    assert body["keep_alive"] == ollama_client.OLLAMA_KEEP_ALIVE
+                assert ollama.requests[1]["prompt"].startswith("User Role: MANAGER")
+                # Different role and data: only the turn after the shared instructions is evaluated
+                assert second < first / 3, (first, second)
+
+            status, chunks = asyncio.run(asgi_request(main.app, "GET", "/metrics"))
+            text = b"".join(chunks).decode()
+            assert f'mrmark_ollama_prompt_eval_tokens_total{{model="tinyllama"}} {first + second}' in text
+            assert 'mrmark_ollama_prompt_eval_seconds_count{model="tinyllama"} 2' in text
+        finally:
+            metrics.configure()
+            llm_cache.configure()
+            response_rules.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+def test_benchmark_reports_fewer_eval_tokens():
+    results = {r["mode"]: r for r in run(requests=6, eval_ms=0, verbose=False)}
+    assert results["system"]["prompt_eval_tokens"] < results["legacy"]["prompt_eval_tokens"] / 2
+    assert results["model"]["prompt_eval_tokens"] == results["system"]["prompt_eval_tokens"]
+    assert results["model"]["bytes_per_call"] < results["system"]["bytes_per_call"] / 3
+    assert results["system, keep_alive=0"]["prompt_eval_tokens"] > results["legacy"]["prompt_eval_tokens"]
+
+
+if __name__ == "__main__":
+    try:
+        test_request_shapes_and_modelfile()
+        test_chat_reuses_system_prefix()
+        test_benchmark_reports_fewer_eval_tokens()
+        print("All Analysis Prompt Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
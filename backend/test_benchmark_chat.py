@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from benchmark_chat import QUERY_MIX, build_db, build_schedule, compare, percentile, run
+
+
+def test_synthetic_db_is_reproducible():
+    with tempfile.TemporaryDirectory() as tmp:
+        totals = []
+        for name in ("a.db", "b.db"):
+            path = os.path.join(tmp, name)
+            assert build_db(path, years=1, branches=3, accounts=2, seed=7) == 365 * 3
+            conn = sqlite3.connect(path)
+            totals.append(conn.execute("SELECT SUM(total) FROM sales_rollup_yearly").fetchone()[0])
+            accounts = conn.execute("SELECT COUNT(DISTINCT account_id) FROM sales").fetchone()[0]
+            conn.close()
+            assert accounts == 2
+        assert totals[0] == totals[1]
+    assert build_schedule(50, seed=3) == build_schedule(50, seed=3)
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50 and percentile(values, 95) == 95 and percentile(values, 99) == 99
+    assert percentile([4.0], 99) == 4.0 and percentile([], 50) is None
+
+
+def test_run_reports_and_saves_json():
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "bench.json")
+        result = run(years=1, branches=2, accounts=2, requests=40, concurrency=4, ollama_delay=0, erp_delay=0,
+                     out=out, verbose=False)
+        with open(out) as f:
+            assert json.load(f) == json.loads(json.dumps(result))
+    overall = result["overall"]
+    assert overall["requests"] == 40 and overall["errors"] == 0
+    assert overall["p50_ms"] <= overall["p95_ms"] <= overall["p99_ms"] <= overall["max_ms"]
+    assert overall["db_queries_mean"] > 0 and result["throughput_rps"] > 0
+    assert set(result["by_type"]) <= {m[0] for m in QUERY_MIX}
+    assert compare(result, result)["overall"]["p95_ms"] == 0.0
+    assert main.DB_NAME == "sales.db"
+
+
+if __name__ == "__main__":
+    try:
+        test_synthetic_db_is_reproducible()
+        test_percentile_nearest_rank()
+        test_run_reports_and_saves_json()
+        print("All Chat Benchmark Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
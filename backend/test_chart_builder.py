@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import chart_builder
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import response_rules
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+CHART_BLOCK = '[CHART_JSON]\n{"chart_type": "line", "title": "t", "labels": [], "datasets": []}\n[/CHART_JSON]'
+
+
+def test_series_matrix_and_ranking_charts():
+    rows = [["2024", "1,000.00"], ["2025", "1,500.50"], ["DIFFERENCE", "500.50"]]
+    chart = chart_builder.series_chart("Sales 2024 vs 2025", rows, chart_type="bar")
+    assert chart == {"chart_type": "bar", "title": "Sales 2024 vs 2025", "labels": ["2024", "2025"],
+                     "datasets": [{"label": "Sales", "data": [1000.0, 1500.5]}], "unit": "LKR"}
+    assert chart_builder.series_chart("one point", [["June 2025", "10.00"]]) is None
+
+    single = {"branches": [1, 2], "periods": [("June", 6, 2025)], "cells": {1: [5.0], 2: [7.0]},
+              "totals": {1: 5.0, 2: 7.0}}
+    assert chart_builder.matrix_chart("June", single)["labels"] == ["Branch 1", "Branch 2"]
+    multi = {"branches": [1, 2], "periods": [("May", 5, 2025), ("June", 6, 2025)],
+             "cells": {1: [1.0, 2.0], 2: [3.0, 4.0]}, "totals": {1: 3.0, 2: 7.0}}
+    chart = chart_builder.matrix_chart("Past 2", multi)
+    assert chart["labels"] == ["May 2025", "June 2025"]
+    assert chart["datasets"] == [{"label": "Branch 1", "data": [1.0, 2.0]}, {"label": "Branch 2", "data": [3.0, 4.0]}]
+
+    assert chart_builder.ranking_chart("Lowest", {1: 5.0, 2: 3.0, 3: 9.0}, descending=False)["labels"] == \
+        ["Branch 2", "Branch 1", "Branch 3"]
+    assert chart_builder.strip_chart_block(f"Sales rose.\n{CHART_BLOCK}") == "Sales rose."
+
+
+def _chat(message, role="ADMIN"):
+    status, chunks = asyncio.run(asgi_request(main.app, "POST", "/chat", {"message": message, "role": role}))
+    assert status == 200
+    return json.loads(b"".join(chunks))
+
+
+def test_chat_returns_server_side_chart():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(ttl=0)
+        response_rules.configure("llm")  # these answers exercise the Ollama path
+        chart_builder.configure("server")
+        try:
+            with FakeOllama(response=f"Sales rose in March. {CHART_BLOCK}") as ollama:
+                main.OLLAMA_URL = ollama.url
+                body = _chat("Sales in Q1 2025 for Branch 1")
+                chart = body["chart"]
+                assert chart["chart_type"] == "line" and chart["unit"] == "LKR"
+                assert chart["labels"] == [r[0] for r in body["tables"][0]["rows"]]
+                assert chart["datasets"][0]["data"] == [r[1] for r in body["tables"][0]["rows"]]
+                assert "[CHART_JSON]" not in body["answer"] and "Sales rose in March." in body["answer"]
+                assert "VISUALIZATION ROLE" not in ollama.requests[-1]["system"]
+
+                best = _chat("Which branch had the highest sales in 2025")
+                assert best["chart"]["chart_type"] == "bar"
+                assert best["chart"]["labels"][0] == best["tables"][0]["rows"][0][0]
+                values = best["chart"]["datasets"][0]["data"]
+                assert values == sorted(values, reverse=True)
+
+                assert "chart" not in _chat("Sales in Q1 2025", role="STAFF")
+
+                chart_builder.configure("llm")
+                body = _chat("Sales in Q1 2025 for Branch 1")
+                assert "chart" not in body and "[CHART_JSON]" in body["answer"]
+                assert "VISUALIZATION ROLE" in ollama.requests[-1]["system"]
+        finally:
+            chart_builder.configure()
+            llm_cache.configure()
+            response_rules.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+if __name__ == "__main__":
+    try:
+        test_series_matrix_and_ranking_charts()
+        test_chat_returns_server_side_chart()
+        print("All Chart Builder Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
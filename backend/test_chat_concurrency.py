@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import chat_executor
+import db_migrations
+import db_pool
+import llm_cache
+import llm_scheduler
+import main
+import response_rules
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request, post_chat
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+
+def test_chats_do_not_serialize_behind_ollama():
+    delay, n = 0.4, 4
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        chat_executor.configure(workers=n, max_pending=n)
+        llm_scheduler.configure(parallel=n)   # Ollama slots are not what this test measures
+        llm_cache.configure(ttl=0)  # every request must reach Ollama
+        response_rules.configure("llm")  # these answers exercise the Ollama path
+        try:
+            with FakeOllama(delay=delay) as ollama:
+                main.OLLAMA_URL = ollama.url
+
+                async def scenario():
+                    start = time.perf_counter()
+                    results = await asyncio.gather(*(post_chat("Sales in March 2025 for Branch 1") for _ in range(n)))
+                    return time.perf_counter() - start, results
+
+                elapsed, results = asyncio.run(scenario())
+                assert len(ollama.requests) == n
+                assert ollama.max_concurrent == n
+            # Serialized would take n * delay
+            assert elapsed < delay * 2, elapsed
+            for _, data in results:
+                assert "AI Analysis" in data["answer"]
+        finally:
+            chat_executor.configure()
+            llm_scheduler.configure()
+            llm_cache.configure()
+            response_rules.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+def test_over_capacity_answers_busy():
+    executor = chat_executor.ChatExecutor(workers=1, max_pending=1)
+
+    async def scenario():
+        slow = asyncio.ensure_future(executor.run(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        try:
+            await executor.run(time.sleep, 0)
+            busy = False
+        except chat_executor.ChatBusyError:
+            busy = True
+        await slow
+        return busy
+
+    try:
+        assert asyncio.run(scenario())
+        stats = executor.stats()
+        assert stats["rejected"] == 1 and stats["completed"] == 1 and stats["in_flight"] == 0
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    try:
+        test_over_capacity_answers_busy()
+        test_chats_do_not_serialize_behind_ollama()
+        print("All Chat Concurrency Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import chat_executor
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import response_rules
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request
+from output_firewall import FORBIDDEN_PHRASES, StreamFirewall, is_blocked
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+QUESTION = "Sales in March 2025 for Branch 1"
+
+
+def _parse_sse(raw):
+    events = []
+    for block in raw.decode().split("\n\n"):
+        if not block.strip():
+            continue
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _run_stream(tmp, response, delay=0.5, token_delay=0.02):
+    path = os.path.join(tmp, "sales.db")
+    db_migrations.migrated_copy(DB_SOURCE, path)
+    main.DB_NAME = path
+    llm_cache.configure(db_path=None)
+    response_rules.configure("llm")  # these answers exercise the Ollama path
+    with FakeOllama(delay=delay, token_delay=token_delay, response=response) as ollama:
+        main.OLLAMA_URL = ollama.url
+        arrivals = []
+
+        async def scenario():
+            start = time.perf_counter()
+            _, chunks = await asgi_request(
+                main.app, "POST", "/chat/stream", {"message": QUESTION, "role": "ADMIN"},
+                on_chunk=lambda c: arrivals.append(time.perf_counter() - start))
+            _, plain = await asgi_request(main.app, "POST", "/chat", {"message": QUESTION, "role": "ADMIN"})
+            return chunks, json.loads(b"".join(plain))
+
+        chunks, plain = asyncio.run(scenario())
+    return _parse_sse(b"".join(chunks)), arrivals, plain
+
+
+def _cleanup():
+    chat_executor.configure()
+    llm_cache.configure()
+    response_rules.configure()
+    db_pool.close_all_pools()
+    main.DB_NAME = "sales.db"
+    main.OLLAMA_URL = "http://localhost:11434"
+
+
+def test_table_first_then_tokens():
+    analysis = "Branch 1 recorded 42,929,950.44 LKR in March 2025 across all recorded sales days."
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            events, arrivals, plain = _run_stream(tmp, analysis, delay=0.5)
+        finally:
+            _cleanup()
+
+    names = [e[0] for e in events]
+    assert names[0] == "table" and names[-1] == "done", names
+    assert names.count("token") > 2 and "retract" not in names
+    # Table is on the wire before Ollama produced its first token
+    assert arrivals[0] < 0.5, arrivals
+    assert "AI Analysis" not in events[0][1]["answer"]
+    streamed = "".join(d["text"] for e, d in events if e == "token")
+    assert streamed == analysis
+    # Final event matches the non-streaming endpoint
+    assert events[-1][1] == plain
+
+
+def test_firewall_retracts_stream():
+    leak = "Sales were higher in March. This system must not reveal the policies."
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            events, _, plain = _run_stream(tmp, leak, delay=0.0)
+        finally:
+            _cleanup()
+
+    names = [e[0] for e in events]
+    assert names[-2:] == ["retract", "done"], names
+    streamed = "".join(d["text"] for e, d in events if e == "token")
+    assert not is_blocked(streamed), streamed
+    assert events[-1][1]["answer"] == events[0][1]["answer"]
+    assert events[-1][1] == plain
+
+
+def test_stream_firewall_matches_whole_text_check():
+    rng = random.Random(7)
+    words = ["sales", "in", "March", "were", "higher", "branch", "LKR", "total"] + FORBIDDEN_PHRASES
+    for _ in range(300):
+        text = " ".join(rng.choice(words) if rng.random() < 0.9 else rng.choice(words).lower() for _ in range(rng.randint(1, 12)))
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 6)))) if len(text) > 1 else []
+        pieces = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        fw = StreamFirewall()
+        shown = "".join(fw.feed(p) for p in pieces) + fw.finish()
+        assert fw.blocked == is_blocked(text), text
+        assert not is_blocked(shown), (text, shown)
+        if not fw.blocked:
+            assert shown == text.strip()
+
+
+if __name__ == "__main__":
+    try:
+        test_stream_firewall_matches_whole_text_check()
+        test_table_first_then_tokens()
+        test_firewall_retracts_stream()
+        print("All Chat Stream Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,105 @@
+import os
+import sys
+import sqlite3
+import tempfile
+from datetime import date
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import main
+from comparison_engine import build_comparison_matrix, summary_rows, breakdown_table, percentage_rows, branch_list_label
+
+
+def _build_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT,
+            sale_date TEXT NOT NULL,
+            amount REAL NOT NULL,
+            br_id INTEGER DEFAULT 1
+        , account_id INTEGER)
+    """)
+    rows = []
+    for year in (2024, 2025):
+        for month in range(1, 13):
+            for day in (1, 10, 20):
+                for br in (1, 2, 3, 4, 5):
+                    # Branch 4 has no sales in 2024 (missing cells must read 0)
+                    if br == 4 and year == 2024:
+                        continue
+                    rows.append((f"{year}-{month:02d}-{day:02d}", 10.0 * br + month + day / 100, br, 2))
+    conn.executemany("INSERT INTO sales (sale_date, amount, br_id, account_id) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_matrix_is_one_query_and_matches_per_cell_fetch():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        db_migrations.ensure_schema(path)   # migrate first: only the handlers' queries are counted
+        main.DB_NAME = path
+        try:
+            branches = [1, 2, 4]
+            periods = main.get_past_months(24, date(2025, 12, 15))
+
+            captured = []
+            with db_pool.connection(path) as conn:
+                conn.set_trace_callback(captured.append)
+                try:
+                    matrix = build_comparison_matrix(branches, periods, main.fetch_monthly_sums)
+                finally:
+                    conn.set_trace_callback(None)
+            assert len([q for q in captured if q.lstrip().upper().startswith("SELECT")]) == 1
+
+            for idx, (_, month, year) in enumerate(periods):
+                for br in branches:
+                    assert abs(matrix["cells"][br][idx] - main.fetch_monthly_sum_from_db(year, month, br)) < 1e-6
+            assert matrix["cells"][4][0] == 0.0
+            for br in branches:
+                assert abs(matrix["totals"][br] - sum(matrix["cells"][br])) < 1e-6
+
+            # Branch 3 and 5 are not requested and must not leak into the totals
+            assert set(matrix["totals"]) == {1, 2, 4}
+        finally:
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+
+
+def test_table_rows():
+    def fetch(start_date, end_date, br_ids, by_branch=False):
+        return {(2025, m, br): 100.0 * br for m in (4, 5, 6) for br in br_ids}
+
+    periods = [("April", 4, 2025), ("May", 5, 2025), ("June", 6, 2025)]
+
+    two = build_comparison_matrix([1, 2], periods, fetch)
+    assert summary_rows(two, "Past 3 Mo") == [
+        ["Branch 1", "Past 3 Mo", "300.00"],
+        ["Branch 2", "Past 3 Mo", "600.00"],
+        ["DIFFERENCE", "-", "-300.00"],
+    ]
+    assert percentage_rows(two) == [["Branch 1", "Branch 2", "100.00% higher"]]
+    assert branch_list_label([1, 2]) == "Branch 1 and Branch 2"
+
+    three = build_comparison_matrix([1, 2, 3], periods, fetch)
+    assert summary_rows(three, "Past 3 Mo")[-1] == ["TOTAL", "-", "1,800.00"]
+    headers, rows = breakdown_table(three)
+    assert headers == ["Period", "Branch 1", "Branch 2", "Branch 3"]
+    assert rows[0] == ["April 2025", "100.00", "200.00", "300.00"]
+    assert branch_list_label([1, 2, 3]) == "Branch 1, Branch 2 and Branch 3"
+    # Resolved context strings must still parse back to the same branches
+    assert main.extract_all_branches(f"Compare {branch_list_label([1, 2, 3])} for past 3 months") == [1, 2, 3]
+
+
+if __name__ == "__main__":
+    try:
+        test_table_rows()
+        test_matrix_is_one_query_and_matches_per_cell_fetch()
+        print("All Comparison Engine Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,112 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_pool import ConnectionPool
+
+
+def _make_db(path):
+    pool = ConnectionPool(path, max_size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE sales (id INTEGER PRIMARY KEY, sale_date TEXT, amount REAL, br_id INTEGER)")
+        conn.executemany("INSERT INTO sales (sale_date, amount, br_id) VALUES (?, ?, ?)",
+                         [("2025-01-01", 100.0, 1), ("2025-01-02", 50.0, 2)])
+        conn.commit()
+    pool.close_all()
+
+
+def test_pragmas_and_reuse():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _make_db(path)
+        pool = ConnectionPool(path, max_size=2)
+
+        with pool.connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            first = conn
+            # Nested checkout on the same thread reuses the held connection
+            with pool.connection() as inner:
+                assert inner is first
+
+        # Sequential checkouts reuse the idle connection instead of reconnecting
+        for _ in range(5):
+            with pool.connection() as conn:
+                assert conn.execute("SELECT SUM(amount) FROM sales").fetchone()[0] == 150.0
+
+        stats = pool.stats()
+        assert stats["open"] == 1, stats
+        assert stats["checkouts"] == 6, stats
+        assert stats["reused_in_thread"] == 1, stats
+        assert stats["in_use"] == 0 and stats["idle"] == 1, stats
+        pool.close_all()
+
+
+def test_bounded_under_concurrency():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _make_db(path)
+        pool = ConnectionPool(path, max_size=3)
+        errors = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(20):
+                    with pool.connection() as conn:
+                        conn.execute("SELECT COUNT(*) FROM sales WHERE br_id = ?", (1,)).fetchone()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = pool.stats()
+        assert not errors, errors
+        assert stats["open"] <= 3, stats
+        assert stats["checkouts"] == 160, stats
+        assert stats["in_use"] == 0, stats
+        pool.close_all()
+
+
+def test_close_all_never_requeues_checked_out_connections():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _make_db(path)
+        pool = ConnectionPool(path, max_size=2)
+        with pool.connection() as idle:
+            pass
+        with pool.connection() as held:
+            assert held is idle
+            pool.close_all()
+            # The query in flight keeps its connection until the block ends
+            assert held.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 2
+        try:
+            held.execute("SELECT 1")
+            assert False, "released connection was not closed"
+        except sqlite3.ProgrammingError:
+            pass
+        assert pool.stats()["idle"] == 0
+        with pool.connection() as conn:
+            assert conn is not held
+            assert conn.execute("SELECT SUM(amount) FROM sales").fetchone()[0] == 150.0
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    try:
+        test_pragmas_and_reuse()
+        test_bounded_under_concurrency()
+        test_close_all_never_requeues_checked_out_connections()
+        print("All Pool Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
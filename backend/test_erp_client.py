@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import erp_client
+import main
+from fake_erp import FakeERP
+
+
+def test_all_branches_in_one_parallel_round_trip():
+    with FakeERP(delay=0.3) as erp:
+        client = erp_client.ERPClient(url=erp.url, branches=[1, 2, 3], ttl=60)
+        try:
+            start = time.perf_counter()
+            total = client.today_total("ALL")
+            elapsed = time.perf_counter() - start
+            assert total == 6000.0                      # 1,000 + 2,000 + 3,000
+            assert elapsed < 0.6, elapsed               # sequential would be >= 0.9s
+            assert erp.max_concurrent == 3
+            assert sorted(r["br_id"] for r in erp.requests) == ["1", "2", "3"]
+            assert all(r["range"] == "1" for r in erp.requests)   # today only, not 30 days
+
+            # Within the TTL: no HTTP at all
+            start = time.perf_counter()
+            assert client.today_total("ALL") == 6000.0
+            assert client.today_total(2) == 2000.0
+            assert time.perf_counter() - start < 0.1
+            assert len(erp.requests) == 3
+            assert client.stats()["hits"] == 4
+        finally:
+            client.close()
+
+
+def test_concurrent_chats_do_not_queue_behind_each_other():
+    with FakeERP(delay=0.3) as erp:
+        client = erp_client.ERPClient(url=erp.url, branches=[1, 2, 3], ttl=0)
+        try:
+            assert client.stats()["workers"] == erp_client.CHAT_WORKERS * 3
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=4) as chats:
+                totals = list(chats.map(lambda _: client.today_total("ALL"), range(4)))
+            elapsed = time.perf_counter() - start
+            assert totals == [6000.0] * 4
+            assert elapsed < 0.6, elapsed               # a pool of 3 would take >= 1.2s
+            assert erp.max_concurrent == 12
+        finally:
+            client.close()
+    sized = erp_client.ERPClient(branches=[1, 2], workers=5)
+    assert sized.stats()["workers"] == 5
+    sized.close()
+
+
+def test_failed_branch_counts_as_zero_and_is_not_cached():
+    with FakeERP(fail_branches=[2]) as erp:
+        client = erp_client.ERPClient(url=erp.url, branches=[1, 2, 3], ttl=60)
+        try:
+            assert client.today_total("ALL") == 4000.0
+            totals = client.today_totals("ALL")
+            assert isinstance(totals[2], Exception)      # retried, still failing
+            assert client.stats()["errors"] == 2
+            assert [r["br_id"] for r in erp.requests].count("2") == 2
+        finally:
+            client.close()
+
+
+def test_main_uses_shared_client():
+    with FakeERP() as erp:
+        erp_client.configure(url=erp.url, branches=[1, 2], ttl=60)
+        try:
+            assert main.fetch_from_erp_api("ALL") == 3000.0
+            assert main.fetch_from_erp_api(2) == 2000.0
+            assert main.fetch_live_sales(br_id="ALL") == {"total": 3000.0}
+            assert len([r for r in erp.requests if r["type"] == "daily"]) == 2
+            assert main.read_stats()["erp"]["hits"] == 3
+        finally:
+            erp_client.configure()
+
+
+if __name__ == "__main__":
+    try:
+        test_all_branches_in_one_parallel_round_trip()
+        test_concurrent_chats_do_not_queue_behind_each_other()
+        test_failed_branch_counts_as_zero_and_is_not_cached()
+        test_main_uses_shared_client()
+        print("All ERP Client Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
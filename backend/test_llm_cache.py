@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import response_rules
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+
+def test_key_normalization():
+    table = "Sales in June 2025 for Branch 1: 41,000,000.00 LKR."
+    key = llm_cache.make_key("ADMIN", "Sales in June 2025 branch 1", table)
+    assert key == llm_cache.make_key("admin", "  sales in  june 2025 BRANCH 1? ", table + "\n")
+    assert key != llm_cache.make_key("MANAGER", "Sales in June 2025 branch 1", table)
+    assert key != llm_cache.make_key("ADMIN", "Sales in July 2025 branch 1", table)
+    assert key != llm_cache.make_key("ADMIN", "Sales in June 2025 branch 1", table.replace("41", "42"))
+
+
+def test_lru_and_ttl():
+    cache = llm_cache.LLMCache(max_entries=2, ttl=0.2, db_path=None)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"      # a is now most recent
+    cache.put("c", "C")               # evicts b
+    assert cache.get("b") is None
+    assert cache.get("c") == "C"
+    time.sleep(0.25)
+    assert cache.get("a") is None     # expired
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+
+    disabled = llm_cache.LLMCache(ttl=0, db_path=None)
+    disabled.put("a", "A")
+    assert disabled.get("a") is None
+
+
+def test_disk_store_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cache.db")
+        try:
+            first = llm_cache.LLMCache(max_entries=8, ttl=60, db_path=path)
+            first.put("k", "cached analysis")
+            second = llm_cache.LLMCache(max_entries=8, ttl=60, db_path=path)
+            assert second.get("k") == "cached analysis"
+            assert second.stats()["disk_hits"] == 1
+            assert second.get("k") == "cached analysis"   # promoted to memory
+            assert second.stats()["disk_hits"] == 1
+        finally:
+            db_pool.close_all_pools()
+
+
+def test_repeat_question_skips_ollama():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(max_entries=16, ttl=60, db_path=None)
+        response_rules.configure("llm")  # these answers exercise the Ollama path
+        try:
+            with FakeOllama(delay=0.2, response="June sales for Branch 1 are shown above.") as ollama:
+                main.OLLAMA_URL = ollama.url
+
+                async def scenario():
+                    answers = []
+                    for msg in ["Sales in June 2025 for Branch 1", "sales in june 2025 for branch 1?"]:
+                        start = time.perf_counter()
+                        _, chunks = await asgi_request(main.app, "POST", "/chat", {"message": msg, "role": "ADMIN"})
+                        answers.append((time.perf_counter() - start, json.loads(b"".join(chunks))))
+                    return answers
+
+                (t1, a1), (t2, a2) = asyncio.run(scenario())
+                assert len(ollama.requests) == 1
+            assert a1["answer"] == a2["answer"] and "AI Analysis" in a2["answer"]
+            assert t2 < 0.2 <= t1, (t1, t2)
+            stats = llm_cache.stats()
+            assert stats["hits"] == 1 and stats["misses"] == 1 and stats["stores"] == 1
+        finally:
+            llm_cache.configure()
+            response_rules.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+if __name__ == "__main__":
+    try:
+        test_key_normalization()
+        test_lru_and_ttl()
+        test_disk_store_survives_restart()
+        test_repeat_question_skips_ollama()
+        print("All LLM Cache Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
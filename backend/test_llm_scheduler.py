@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+import contextlib
+import io
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import llm_cache
+import llm_scheduler
+import main
+import metrics
+import response_rules
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request, post_chat
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+
+def test_fifo_queue_budget_and_deadline():
+    scheduler = llm_scheduler.LLMScheduler(parallel=1, queue_size=2, budget=1.0, deadline=0.3)
+    order, errors = [], []
+
+    def call(i, hold, fail=False):
+        try:
+            with scheduler.slot():
+                order.append(i)
+                time.sleep(hold)
+                if fail:
+                    raise TimeoutError("Ollama read timed out")
+        except llm_scheduler.LLMBusyError as e:
+            errors.append((i, e.reason))
+        except TimeoutError:
+            errors.append((i, "timeout"))
+
+    threads = [threading.Thread(target=call, args=(i, 0.1)) for i in range(4)]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)   # arrive in order: 0 runs, 1 and 2 wait, 3 finds the queue full
+    for t in threads:
+        t.join()
+    assert order == [0, 1, 2] and errors == [(3, "queue_full")]
+
+    call(4, 0.35)   # admitted, runs past its deadline but succeeds: not degraded
+    assert scheduler.stats()["degraded"]["deadline"] == 0
+    call(7, 0.35, fail=True)   # times out on its remaining time: degraded
+    assert errors[-1] == (7, "timeout")
+    scheduler.budget = 0.05
+    holder = threading.Thread(target=call, args=(5, 0.2))
+    holder.start()
+    time.sleep(0.02)
+    call(6, 0)
+    holder.join()
+    assert errors[-1] == (6, "wait_budget")
+    stats = scheduler.stats()
+    assert stats["admitted"] == 6 and stats["degraded"] == {"queue_full": 1, "wait_budget": 1, "deadline": 1}
+    assert stats["running"] == 0 and stats["queued"] == 0 and stats["queue_wait_max_ms"] >= 50
+
+
+def test_chat_degrades_to_table_when_ollama_is_busy():
+    delay = 0.5
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(ttl=0)
+        response_rules.configure("llm")  # these answers exercise the Ollama path
+        metrics.configure()
+        llm_scheduler.configure(parallel=1, queue_size=4, budget=0.1)
+        try:
+            with FakeOllama(delay=delay) as ollama:
+                main.OLLAMA_URL = ollama.url
+
+                async def scenario():
+                    return await asyncio.gather(post_chat("Sales in March 2025 for Branch 1"),
+                                                post_chat("Sales in April 2025 for Branch 1"))
+
+                log = io.StringIO()
+                with contextlib.redirect_stdout(log):
+                    results = asyncio.run(scenario())
+                assert ollama.max_concurrent == 1 and len(ollama.requests) == 1
+            answered = [r for r in results if "AI Analysis" in r[1]["answer"]]
+            degraded = [r for r in results if "AI Analysis" not in r[1]["answer"]]
+            assert len(answered) == 1 and len(degraded) == 1
+            assert "LKR" in degraded[0][1]["answer"] and degraded[0][0] < delay   # the data, without waiting
+            assert "Ollama Busy (wait_budget)" in log.getvalue() and "Firewall Blocked" not in log.getvalue()
+
+            status, chunks = asyncio.run(asgi_request(main.app, "GET", "/metrics"))
+            text = b"".join(chunks).decode()
+            assert 'mrmark_llm_degraded_total{reason="wait_budget"} 1' in text
+            assert "mrmark_llm_queue_wait_seconds_count 2" in text
+            assert "mrmark_llm_queue_depth 0" in text
+        finally:
+            llm_scheduler.configure()
+            metrics.configure()
+            llm_cache.configure()
+            response_rules.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+def _stream_events(message):
+    status, chunks = asyncio.run(asgi_request(main.app, "POST", "/chat/stream", {"message": message, "role": "ADMIN"}))
+    assert status == 200
+    events = []
+    for block in b"".join(chunks).decode().split("\n\n"):
+        if block.strip():
+            lines = dict(line.split(": ", 1) for line in block.split("\n"))
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_deadline_and_busy():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(ttl=0)
+        response_rules.configure("llm")  # these answers exercise the Ollama path
+        try:
+            with FakeOllama(response=" ".join(["Sales"] * 30) + ".", token_delay=0.03) as ollama:
+                main.OLLAMA_URL = ollama.url
+                llm_scheduler.configure(deadline=0.3)
+                events = _stream_events("Sales in March 2025 for Branch 1")
+                assert ("retract", {"reason": "deadline"}) in events
+                assert events[-1][0] == "done" and "AI Analysis" not in events[-1][1]["answer"]
+                assert llm_scheduler.stats()["degraded"]["deadline"] == 1
+
+                llm_scheduler.configure(parallel=1, queue_size=0)
+                with llm_scheduler.slot():   # Ollama busy with another turn
+                    events = _stream_events("Sales in April 2025 for Branch 1")
+                assert [e for e, _ in events] == ["table", "done"]
+                assert events[1][1]["answer"] == events[0][1]["answer"]
+                assert len(ollama.requests) == 1
+        finally:
+            llm_scheduler.configure()
+            llm_cache.configure()
+            response_rules.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+if __name__ == "__main__":
+    try:
+        test_fifo_queue_budget_and_deadline()
+        test_chat_degrades_to_table_when_ollama_is_busy()
+        test_stream_deadline_and_busy()
+        print("All LLM Scheduler Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
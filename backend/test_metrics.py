@@ -0,0 +1,126 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import metrics
+import response_rules
+from erp_client import ERPClient
+from fake_erp import FakeERP
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request, post_chat
+from metrics import Counter, Histogram
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+
+def _sample(text, series):
+    """Value of one exposition line, e.g. 'name{a="b"}'."""
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_histogram_and_counter_exposition():
+    hist = Histogram("t_seconds", "test", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, stage="db")
+    lines = hist.render()
+    assert 't_seconds_bucket{stage="db",le="0.1"} 2' in lines   # le is inclusive
+    assert 't_seconds_bucket{stage="db",le="1"} 3' in lines
+    assert 't_seconds_bucket{stage="db",le="+Inf"} 4' in lines
+    assert 't_seconds_count{stage="db"} 4' in lines
+    assert 't_seconds_sum{stage="db"} 3.650000' in lines
+    assert hist.snapshot(stage="db")["p50"] == 0.1 and hist.snapshot(stage="db")["p99"] == float("inf")
+
+    counter = Counter("t_total", "test", ["target"])
+    counter.inc(target='say "hi"')
+    counter.inc(2, target='say "hi"')
+    assert counter.render() == ['t_total{target="say \\"hi\\""} 3']
+
+
+def test_nested_stage_timed_once():
+    metrics.configure()
+    try:
+        with metrics.request("chat") as scope:
+            with metrics.stage("format"):
+                with metrics.stage("format"):
+                    metrics.count_db("sqlite")
+        assert metrics.STAGE_SECONDS.snapshot(stage="format")["count"] == 1
+        assert metrics.STAGE_SECONDS.snapshot(stage="other")["count"] == 1
+        assert scope.db_queries == 1
+        # Outside a request only the global counter moves
+        metrics.count_db("sqlite")
+        assert metrics.DB_QUERIES.value(backend="sqlite") == 2 and scope.db_queries == 1
+    finally:
+        metrics.configure()
+
+
+def test_erp_fan_out_counted_per_request():
+    metrics.configure()
+    try:
+        with FakeERP() as erp:
+            client = ERPClient(url=erp.url, branches=[1, 2, 3], ttl=30)
+            with metrics.request("chat") as first:
+                client.fetch_many([1, 2, 3], type_="daily", range_="1")
+            with metrics.request("chat") as second:
+                client.fetch_many([1, 2, 3], type_="daily", range_="1")   # all cached
+        # Calls made on the ERP pool threads are attributed to the request that fanned out
+        assert first.http_calls("erp") == 3 and second.http_calls("erp") == 0
+        assert metrics.HTTP_CALLS.value(target="erp", outcome="ok") == 3
+    finally:
+        metrics.configure()
+
+
+def test_chat_stages_and_counts_exposed():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(ttl=0)
+        response_rules.configure("llm")  # these answers exercise the Ollama path
+        metrics.configure()
+        try:
+            with FakeOllama() as ollama:
+                main.OLLAMA_URL = ollama.url
+                _, data = asyncio.run(post_chat("Sales in Q1 2025 for Branch 1"))
+            assert "AI Analysis" in data["answer"]
+
+            status, chunks = asyncio.run(asgi_request(main.app, "GET", "/metrics"))
+            text = b"".join(chunks).decode()
+            assert status == 200
+            assert _sample(text, 'mrmark_chat_requests_total{endpoint="chat",outcome="ok"}') == 1
+            assert _sample(text, 'mrmark_http_requests_total{target="ollama",outcome="ok"}') == 1
+            assert _sample(text, 'mrmark_chat_http_calls_per_request_sum{endpoint="chat",target="ollama"}') == 1
+            db_queries = _sample(text, 'mrmark_chat_db_queries_per_request_sum{endpoint="chat"}')
+            assert db_queries >= 1 and db_queries == _sample(text, 'mrmark_db_queries_total{backend="sqlite"}')
+            for stage in ("fuzzy_correct", "normalize", "classify", "extract", "validate", "db", "format",
+                          "log", "llm_cache", "ollama", "session", "other"):
+                assert _sample(text, f'mrmark_chat_stage_seconds_count{{stage="{stage}"}}') >= 1, stage
+            assert "mrmark_chat_in_flight 0" in text
+        finally:
+            metrics.configure()
+            llm_cache.configure()
+            response_rules.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+if __name__ == "__main__":
+    try:
+        test_histogram_and_counter_exposition()
+        test_nested_stage_timed_once()
+        test_erp_fan_out_counted_per_request()
+        test_chat_stages_and_counts_exposed()
+        print("All Metrics Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,140 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import calendar
+from datetime import datetime, timedelta
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import main
+from query_handlers import handle_quarter_query, handle_week_query, handle_range_query
+
+
+def _build_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT,
+            sale_date TEXT NOT NULL,
+            amount REAL NOT NULL,
+            br_id INTEGER DEFAULT 1
+        , account_id INTEGER)
+    """)
+    rows = []
+    day = datetime(2024, 11, 1).date()
+    while day < datetime(2026, 2, 1).date():
+        # Leave gaps so missing days/months are exercised
+        if day.day % 9 != 0:
+            for br in (1, 2, 3):
+                rows.append((day.strftime("%Y-%m-%d"), 100.0 * br + day.day, br, 2))
+        day += timedelta(days=1)
+    conn.executemany("INSERT INTO sales (sale_date, amount, br_id, account_id) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _legacy_rows(start_date, end_date, br_id, daily):
+    """Row/total contract of the old one-query-per-bucket handlers."""
+    rows, total = [], 0.0
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    if daily:
+        current = start
+        while current <= end:
+            amount = main.fetch_from_db(current.strftime("%Y-%m-%d"), br_id) or 0.0
+            rows.append([f"{current.strftime('%A')}, {current.strftime('%b %d')}", f"{amount:,.2f}"])
+            total += amount
+            current += timedelta(days=1)
+    else:
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            amount = main.fetch_monthly_sum_from_db(year, month, br_id)
+            rows.append([f"{calendar.month_name[month]} {year}", f"{amount:,.2f}"])
+            total += amount
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return rows, total
+
+
+def _count_selects(path, fn):
+    captured = []
+    with db_pool.connection(path) as conn:
+        conn.set_trace_callback(captured.append)
+        try:
+            result = fn()
+        finally:
+            conn.set_trace_callback(None)
+    return result, len([q for q in captured if q.lstrip().upper().startswith("SELECT")])
+
+
+def test_batched_handlers_match_legacy_and_use_one_query():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        db_migrations.ensure_schema(path)   # migrate first: only the handlers' queries are counted
+        main.DB_NAME = path
+        try:
+            for br in (1, "ALL", [1, 3]):
+                (rows, total), n = _count_selects(path, lambda: handle_quarter_query(4, 2025, br, main.fetch_monthly_sums))
+                assert n == 1, n
+                if br != [1, 3]:
+                    assert (rows, total) == _legacy_rows("2025-10-01", "2025-12-31", br, daily=False)
+
+                (rows, total), n = _count_selects(path, lambda: handle_week_query("2025-12-26", "2026-01-01", br, main.fetch_daily_sums))
+                assert n == 1, n
+                assert len(rows) == 7
+                if br != [1, 3]:
+                    assert (rows, total) == _legacy_rows("2025-12-26", "2026-01-01", br, daily=True)
+
+                (rows, total), n = _count_selects(path, lambda: handle_range_query("2024-11-15", "2026-01-10", br, main.fetch_monthly_sums))
+                assert n == 1, n
+                assert len(rows) == 15
+                if br != [1, 3]:
+                    assert (rows, total) == _legacy_rows("2024-11-15", "2026-01-10", br, daily=False)
+
+            # A branch set is the sum of its members
+            _, t13 = handle_range_query("2025-01-01", "2025-12-31", [1, 3], main.fetch_monthly_sums)
+            _, t1 = handle_range_query("2025-01-01", "2025-12-31", 1, main.fetch_monthly_sums)
+            _, t3 = handle_range_query("2025-01-01", "2025-12-31", 3, main.fetch_monthly_sums)
+            assert abs(t13 - (t1 + t3)) < 1e-6
+
+            by_branch = main.fetch_daily_sums("2025-03-01", "2025-03-02", "ALL", by_branch=True)
+            assert by_branch[("2025-03-01", 2)] == 201.0
+        finally:
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+
+
+def test_month_lists_use_one_query():
+    # Quarter, past-N (and its average) and multi-month answers ask for a list of months
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        db_migrations.ensure_schema(path)
+        main.DB_NAME = path
+        try:
+            months = [(2025, 12), (2026, 1), ("2025", 3), (2026, 3)]
+            for br in (1, "ALL"):
+                totals, n = _count_selects(path, lambda: main.fetch_month_totals(months, br))
+                assert n == 1, n
+                assert list(totals) == [(2025, 12), (2026, 1), (2025, 3), (2026, 3)]
+                for (year, month), total in totals.items():
+                    assert total == main.fetch_monthly_sum_from_db(year, month, br)
+                assert totals[(2026, 3)] == 0.0
+            assert main.fetch_month_totals([]) == {}
+        finally:
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+
+
+if __name__ == "__main__":
+    try:
+        test_batched_handlers_match_legacy_and_use_one_query()
+        test_month_lists_use_one_query()
+        print("All Query Handler Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
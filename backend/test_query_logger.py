@@ -0,0 +1,92 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_pool
+import main
+import query_logger
+from query_logger import QueryLogger
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT user_query, intent, response_text FROM query_logs ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_rows_written_in_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        logger = QueryLogger(path, batch_size=50, flush_ms=60_000)
+        try:
+            for i in range(120):
+                logger.log(f"q{i}", "Financial Query (ADMIN)", {"n": i})
+            assert logger.flush()
+            rows = _rows(path)
+            assert [r[0] for r in rows] == [f"q{i}" for i in range(120)]
+            assert rows[5] == ("q5", "Financial Query (ADMIN)", "{'n': 5}")
+            stats = logger.stats()
+            assert stats["written"] == 120 and stats["batches"] == 3 and stats["dropped"] == 0
+        finally:
+            logger.close()
+
+
+def test_partial_batch_written_after_flush_interval():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        logger = QueryLogger(path, batch_size=100, flush_ms=50)
+        try:
+            logger.log("only one", "intent", "answer")
+            deadline = time.time() + 5
+            while logger.stats()["written"] < 1 and time.time() < deadline:
+                time.sleep(0.01)
+            assert _rows(path) == [("only one", "intent", "answer")]
+        finally:
+            logger.close()
+
+
+def test_full_queue_drops_oldest_and_close_flushes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        # Batches never fill and the interval never expires: rows stay queued until close()
+        logger = QueryLogger(path, max_queue=10, batch_size=100, flush_ms=60_000)
+        for i in range(25):
+            logger.log(f"q{i}", "intent", "answer")
+        assert logger.stats()["dropped"] == 15 and logger.stats()["queued"] == 10
+        logger.close()
+        assert [r[0] for r in _rows(path)] == [f"q{i}" for i in range(15, 25)]
+        assert logger.stats()["written"] == 10
+
+
+def test_log_query_is_off_the_response_path():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        main.DB_NAME = path
+        query_logger.configure(flush_ms=60_000)
+        try:
+            main.generate_smart_response("Total: 100.00", "Sales on 2025-01-01", role="STAFF")
+            assert main.read_stats()["query_logger"][path]["queued"] == 1
+            query_logger.shutdown()
+            assert _rows(path) == [("Sales on 2025-01-01", "Financial Query (STAFF)", "Total: 100.00")]
+        finally:
+            query_logger.configure()
+            main.DB_NAME = "sales.db"
+            db_pool.close_all_pools()
+
+
+if __name__ == "__main__":
+    try:
+        test_rows_written_in_batches()
+        test_partial_batch_written_after_flush_interval()
+        test_full_queue_drops_oldest_and_close_flushes()
+        test_log_query_is_off_the_response_path()
+        print("All Query Logger Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
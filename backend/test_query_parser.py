@@ -0,0 +1,49 @@
+import os
+import sys
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import query_parser
+from benchmark_query_parser import LEGACY, PHRASES, parsed
+
+
+def test_single_pass_matches_per_alias_extractors():
+    for text in PHRASES:
+        for name, legacy in LEGACY.items():
+            assert parsed(name, text) == legacy(text), (name, text)
+
+
+def test_alias_order_and_date_rules():
+    # First alias in MONTH_ALIASES order wins, not first in the text
+    assert main.extract_month_only("may or march?") == ("March", 3)
+    assert main.extract_all_months("may or march?") == [("March", 3), ("May", 5)]
+    assert main.extract_date("feb 30 and mar 2 2024") == "2024-03-02"     # invalid day skipped
+    assert main.extract_date("jan 9 or feb 3") == "2025-01-09"
+    assert main.extract_date("sales on the 5th of sept") == "2025-09-05"
+    assert main.extract_date("sales september 2024") is None             # a year is not a day
+    assert main.extract_year("sales") == query_parser.DEFAULT_YEAR
+    assert main.extract_all_branches("branch 2 vs 4 and branch 1") == [1, 2, 4]
+    assert main.extract_goal_amount("aim for 750k") == 750_000.0
+
+
+def test_repeated_extracts_parse_once():
+    query_parser.clear_cache()
+    msg = "Which day in June had highest sale for Branch 1?"
+    main.extract_year(msg)
+    main.extract_month_only(msg)
+    main.extract_date(msg)
+    main.extract_branch(msg)
+    stats = query_parser.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 3
+
+
+if __name__ == "__main__":
+    try:
+        test_single_pass_matches_per_alias_extractors()
+        test_alias_order_and_date_rules()
+        test_repeated_extracts_parse_once()
+        print("All Query Parser Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
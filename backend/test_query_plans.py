@@ -0,0 +1,152 @@
+import os
+import sys
+import sqlite3
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import main
+import accounting
+
+# The hot fetch helpers are served from the rollups and must never touch raw sales
+RAW_TABLES = ("sales", "s")
+# Rollup tables must be reached through their primary key, never a full scan
+HOT_TABLES = ("sales_rollup_daily", "sales_rollup_monthly", "sales_rollup_yearly", "r")
+
+
+def _build_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_name TEXT,
+            sale_date TEXT NOT NULL,
+            amount REAL NOT NULL,
+            br_id INTEGER DEFAULT 1
+        , account_id INTEGER)
+    """)
+    conn.execute("""
+        CREATE TABLE accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, parent_id INTEGER, name TEXT NOT NULL,
+            level INTEGER NOT NULL, type TEXT NOT NULL, allow_ledger TEXT NOT NULL)
+    """)
+    conn.executemany("INSERT INTO accounts (id, parent_id, name, level, type, allow_ledger) VALUES (?, ?, ?, ?, ?, ?)", [
+        (1, None, "Income", 1, "INCOME", "no"),
+        (2, 1, "Sales Revenue", 2, "INCOME", "yes"),
+    ])
+    rows = []
+    for month in range(1, 13):
+        for day in range(1, 29):
+            for br in (1, 2, 3):
+                rows.append((f"2025-{month:02d}-{day:02d}", 1000.0 * br + day, br, 2))
+    conn.executemany("INSERT INTO sales (sale_date, amount, br_id, account_id) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _capture_queries(path, calls):
+    """Run the fetch helpers against `path` and return every SELECT they issued."""
+    main.DB_NAME = path
+    accounting.DB_NAME = path
+    captured = []
+    with db_pool.connection(path) as conn:
+        conn.set_trace_callback(captured.append)
+        try:
+            for fn in calls:
+                fn()
+        finally:
+            conn.set_trace_callback(None)
+    return [q for q in captured if q.lstrip().upper().startswith(("SELECT", "WITH"))]
+
+
+def _plan(conn, sql):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+
+
+def test_hot_queries_use_rollups():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        db_migrations.ensure_schema(path)   # migrate first: only the handlers' queries are counted
+        try:
+            queries = _capture_queries(path, [
+                lambda: main.fetch_from_db("2025-03-05", 1),
+                lambda: main.fetch_from_db("2025-03-05", "ALL"),
+                lambda: main.fetch_monthly_sum_from_db(2025, 3, 1),
+                lambda: main.fetch_monthly_sum_from_db(2025, 3, "ALL"),
+                lambda: main.fetch_monthly_average(2025, 3, 1),
+                lambda: main.fetch_monthly_average(2025, 3, "ALL"),
+                lambda: main.fetch_year_total(2025, 2),
+                lambda: main.fetch_year_total(2025, "ALL"),
+                lambda: main.find_extreme_month(2025, "max", 1),
+                lambda: main.find_extreme_month(2025, "min", "ALL"),
+                lambda: main.find_extreme_day_in_month(2025, 6, 1),
+                lambda: main.find_extreme_day_in_month(2025, 6, "ALL"),
+                lambda: accounting.get_account_balance("Sales Revenue", 2025),
+                lambda: accounting.get_account_balance("Income", 2025, 1),
+            ])
+            assert len(queries) >= 14, queries
+
+            conn = sqlite3.connect(path)
+            for sql in queries:
+                for detail in _plan(conn, sql):
+                    parts = detail.split()
+                    if len(parts) < 2 or parts[0] not in ("SCAN", "SEARCH"):
+                        continue
+                    assert parts[1] not in RAW_TABLES, f"Reads raw sales: {detail}\n  for: {sql}"
+                    if parts[1] in HOT_TABLES:
+                        assert parts[0] == "SEARCH", f"Full rollup scan: {detail}\n  for: {sql}"
+            conn.close()
+        finally:
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            accounting.DB_NAME = "sales.db"
+
+
+def test_rollups_follow_sales_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        conn = sqlite3.connect(path)
+        db_migrations.apply_migrations(conn)
+
+        conn.execute("INSERT INTO sales (sale_date, amount, br_id, account_id) VALUES ('2025-03-29', 500, 1, 2)")
+        conn.execute("UPDATE sales SET amount = amount + 1 WHERE sale_date = '2025-06-01'")
+        conn.execute("UPDATE sales SET sale_date = '2026-01-01' WHERE sale_date = '2025-12-28' AND br_id = 3")
+        conn.execute("DELETE FROM sales WHERE sale_date >= '2025-02-01' AND sale_date < '2025-03-01' AND br_id = 2")
+        conn.commit()
+
+        checks = [
+            ("SELECT sale_date, br_id, SUM(amount), COUNT(*) FROM sales GROUP BY 1, 2",
+             "SELECT sale_date, br_id, SUM(total), SUM(row_count) FROM sales_rollup_daily GROUP BY 1, 2"),
+            ("SELECT substr(sale_date, 1, 7), br_id, SUM(amount) FROM sales GROUP BY 1, 2",
+             "SELECT printf('%04d-%02d', year, month), br_id, SUM(total) FROM sales_rollup_monthly GROUP BY 1, 2"),
+            ("SELECT CAST(substr(sale_date, 1, 4) AS INTEGER), br_id, SUM(amount) FROM sales GROUP BY 1, 2",
+             "SELECT year, br_id, SUM(total) FROM sales_rollup_yearly GROUP BY 1, 2"),
+        ]
+        for raw_sql, rollup_sql in checks:
+            raw = sorted(conn.execute(raw_sql).fetchall())
+            rolled = sorted(conn.execute(rollup_sql).fetchall())
+            assert raw == rolled, (raw_sql, len(raw), len(rolled))
+        # Emptied buckets are removed, not left at zero
+        assert conn.execute("SELECT COUNT(*) FROM sales_rollup_daily WHERE row_count <= 0").fetchone()[0] == 0
+        conn.close()
+
+
+def test_half_open_bounds():
+    assert main.month_bounds(2025, 12) == ("2025-12-01", "2026-01-01")
+    assert main.month_bounds(2025, 2) == ("2025-02-01", "2025-03-01")
+    assert main.year_bounds(2024) == ("2024-01-01", "2025-01-01")
+
+
+if __name__ == "__main__":
+    try:
+        test_half_open_bounds()
+        test_hot_queries_use_rollups()
+        test_rollups_follow_sales_writes()
+        print("All Query Plan Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import metrics
+import response_rules
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+
+def test_shapes_and_notes():
+    assert response_rules.series([]) is None
+    assert response_rules.series([["March 2025", "911,580.00"]]) == ("single", ["March 2025"], [911580.0])
+    shape = response_rules.comparison([["2024", "400.00"], ["2025", "500.00"], ["DIFFERENCE", "100.00"]])
+    assert shape == ("comparison", ["2024", "2025"], [400.0, 500.0])
+    assert response_rules.note_for(shape) == \
+        "2025 (500.00 LKR) is 25.0% higher than 2024 (400.00 LKR), a difference of 100.00 LKR."
+    assert response_rules.comparison([["Branch 1", "1.00"]]) is None
+
+    shape = response_rules.series([["Jan", 30.0], ["Feb", 10.0], ["Mar", 20.0]])
+    assert response_rules.note_for(shape) == ("Across 3 entries from Jan to Mar, the highest value was Jan (30.00 LKR) "
+                                              "and the lowest was Feb (10.00 LKR). Mar is 33.3% lower than Jan.")
+    assert response_rules.note_for(response_rules.SINGLE) == response_rules.SINGLE_POINT_NOTE
+
+    # Rankings are not a time series: no first-vs-last change
+    shape = response_rules.ranking({1: 20.0, 2: 50.0, 3: 10.0})
+    assert shape == ("ranking", ["Branch 2", "Branch 1", "Branch 3"], [50.0, 20.0, 10.0])
+    assert response_rules.note_for(shape) == ("Across 3 branches, Branch 2 recorded the highest sales (50.00 LKR) "
+                                              "and Branch 3 the lowest (10.00 LKR).")
+    assert response_rules.ranking({1: 20.0}) is None
+
+    # Empty periods
+    assert response_rules.note_for(response_rules.series([["Jan", 0], ["Feb", 0]])) == response_rules.NO_SALES_NOTE
+    assert response_rules.note_for(response_rules.ranking({1: 0.0, 2: 0.0})) == response_rules.NO_SALES_NOTE
+    assert response_rules.note_for(("series", [], [])) is None
+
+
+def test_policy_per_role():
+    assert response_rules.stats()["default"] == "rules"
+    assert response_rules.decide("ADMIN", response_rules.SINGLE) == (response_rules.SINGLE_POINT_NOTE, False)
+    response_rules.configure("llm")   # opt-in: always ask the model
+    assert response_rules.decide("ADMIN", response_rules.SINGLE) == (None, True)
+    response_rules.configure("rules", roles={"ADMIN": "llm", "MANAGER": "strict"})
+    try:
+        single = response_rules.SINGLE
+        assert response_rules.decide("ADMIN", single) == (None, True)
+        assert response_rules.decide("BUSINESS_OWNER", single) == (response_rules.SINGLE_POINT_NOTE, False)
+        assert response_rules.decide("BUSINESS_OWNER", None) == (None, True)
+        assert response_rules.decide("MANAGER", None) == (None, False)
+        stats = response_rules.stats()
+        assert stats["llm_calls_avoided"] == 2 and stats["llm_fallbacks"] == 1 and stats["no_note"] == 1
+        assert stats["shapes"]["single"] == 1
+    finally:
+        response_rules.configure()
+
+
+def _chat(path, message, role="ADMIN"):
+    status, chunks = asyncio.run(asgi_request(main.app, "POST", path, {"message": message, "role": role}))
+    assert status == 200
+    return b"".join(chunks)
+
+
+def test_chat_skips_ollama_for_known_shapes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(ttl=0)
+        metrics.configure()
+        response_rules.configure("rules", roles={"MANAGER": "strict"})
+        try:
+            with FakeOllama() as ollama:
+                main.OLLAMA_URL = ollama.url
+                single = json.loads(_chat("/chat", "Sales in March 2025 for Branch 1"))
+                series = json.loads(_chat("/chat", "Sales in Q1 2025 for Branch 1"))
+                pair = json.loads(_chat("/chat", "Compare Branch 1 vs Branch 2 in Jan"))
+                assert len(ollama.requests) == 0
+                assert single["answer"].endswith(response_rules.SINGLE_POINT_NOTE)
+                assert "Across 3 entries from January 2025 to March 2025" in series["answer"]
+                assert "than Branch 1" in pair["answer"]
+                best = json.loads(_chat("/chat", "Which branch had the highest sales in 2025"))
+                assert "recorded the highest sales" in best["answer"] and "Across" in best["answer"]
+
+                # Streaming: the template note arrives as one token
+                events = [b.split("\n")[0] for b in _chat("/chat/stream", "Sales in Q1 2025 for Branch 1").decode()
+                          .split("\n\n") if b.strip()]
+                assert events == ["event: table", "event: token", "event: done"]
+
+                # Branch x month matrix: not a known shape -> model (rules) or no note (strict)
+                matrix = "Compare Branch 1 vs Branch 2 for past 3 months"
+                assert "AI Analysis" in json.loads(_chat("/chat", matrix))["answer"]
+                assert len(ollama.requests) == 1
+                assert "AI Analysis" not in json.loads(_chat("/chat", matrix, role="MANAGER"))["answer"]
+                assert len(ollama.requests) == 1
+
+            status, chunks = asyncio.run(asgi_request(main.app, "GET", "/metrics"))
+            text = b"".join(chunks).decode()
+            assert 'mrmark_llm_calls_avoided_total{role="ADMIN",shape="series"} 2' in text
+            assert 'mrmark_llm_calls_avoided_total{role="MANAGER",shape="none"} 1' in text
+            assert response_rules.stats()["llm_calls_avoided"] == 6
+        finally:
+            response_rules.configure()
+            metrics.configure()
+            llm_cache.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+if __name__ == "__main__":
+    try:
+        test_shapes_and_notes()
+        test_policy_per_role()
+        test_chat_skips_ollama_for_known_shapes()
+        print("All Response Rules Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
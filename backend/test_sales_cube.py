@@ -0,0 +1,123 @@
+import os
+import sys
+import sqlite3
+import tempfile
+
+import pytest
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("numpy")
+
+import db_pool
+import main
+import sales_cube
+import sales_repository
+from test_sales_repository import _build_db
+
+
+def _same(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        return a == pytest.approx(b)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def test_cube_matches_sqlite_repository():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        try:
+            repo = sales_repository.SQLiteSalesRepository(path)
+            cube = sales_cube.CubeSalesRepository(repo)
+            calls = []
+            for br in (1, 3, "ALL", 9):
+                calls += [("daily_total", ("2025-03-09", br)), ("daily_total", ("2025-03-10", br)),
+                          ("monthly_total", (2025, 3, br)), ("monthly_total", (2023, 3, br)),
+                          ("monthly_average", (2024, 2, br)), ("monthly_average", (2026, 1, br)),
+                          ("year_total", (2024, br)), ("year_total", (2030, br)),
+                          ("extreme_month", (2025, True, br)), ("extreme_month", (2024, False, br)),
+                          ("extreme_day", ("2025-06-01", "2025-07-01", True, br)),
+                          ("extreme_day", ("2023-12-01", "2024-01-10", False, br)),
+                          ("extreme_day", ("2025-06-02", "2025-06-05", False, br))]
+            for month in (0, 5, 12):
+                calls += [("extreme_branch", (2025, month, True)), ("extreme_branch", (2024, month, False))]
+            calls.append(("extreme_branch", (2030, 0, True)))
+            for brs in (1, [1, 2], [2, 9], "ALL"):
+                for by_branch in (False, True):
+                    calls += [("daily_sums", ("2024-12-20", "2025-02-01", brs, by_branch)),
+                              ("daily_sums", ("2026-01-01", "2026-02-01", brs, by_branch)),
+                              ("monthly_sums", ((2024, 11), (2025, 2), brs, by_branch)),
+                              ("monthly_sums", ((2023, 1), (2023, 6), brs, by_branch))]
+
+            for name, args in calls:
+                expected = getattr(repo, name)(*args)
+                actual = getattr(cube, name)(*args)
+                if name.endswith("_sums"):
+                    expected, actual = sorted(expected), sorted(actual)
+                assert _same(actual, expected), (name, args, actual, expected)
+
+            stats = cube.stats()
+            assert stats["loads"] == 1 and stats["served"] == len(calls)
+            assert stats["shape"][1:] == [3, 1]
+        finally:
+            cube.close()
+            db_pool.close_all_pools()
+
+
+def test_cube_reloads_after_writes_from_other_connections():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        try:
+            repo = sales_repository.SQLiteSalesRepository(path)
+            cube = sales_cube.CubeSalesRepository(repo)
+            before = cube.year_total(2025, 2)
+            assert cube.year_total(2025, 2) == before
+            assert cube.stats()["loads"] == 1
+
+            # e.g. sync_engine / import_sales committing through their own connection
+            conn = sqlite3.connect(path)
+            conn.execute("INSERT INTO sales (sale_date, amount, br_id, account_id) VALUES ('2025-07-04', 50, 2, 2)")
+            conn.commit()
+            conn.close()
+
+            assert cube.year_total(2025, 2) == before + 50
+            assert cube.daily_total("2025-07-04", 2) == 50
+            assert cube.stats()["loads"] == 2
+        finally:
+            cube.close()
+            db_pool.close_all_pools()
+
+
+def test_chat_helpers_served_from_cube():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        main.DB_NAME = path
+        try:
+            expected = (main.fetch_year_total(2025, "ALL"), main.find_extreme_month(2025, "max", 2),
+                        main.fetch_monthly_average(2025, 3, "ALL"))
+            sales_cube.configure(True)
+            assert main.get_repository().backend == "sqlite+cube"
+            assert (main.fetch_year_total(2025, "ALL"), main.find_extreme_month(2025, "max", 2),
+                    main.fetch_monthly_average(2025, 3, "ALL")) == expected
+            assert main.get_repository().years() == [2025, 2024]   # non-aggregate queries fall through
+            cube_stats = main.read_stats()["cube"]
+            assert cube_stats["enabled"] and cube_stats["cubes"][0]["served"] == 3
+        finally:
+            sales_cube.configure()
+            main.DB_NAME = "sales.db"
+            db_pool.close_all_pools()
+
+
+if __name__ == "__main__":
+    try:
+        test_cube_matches_sqlite_repository()
+        test_cube_reloads_after_writes_from_other_connections()
+        test_chat_helpers_served_from_cube()
+        print("All Sales Cube Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,191 @@
+import os
+import sys
+import sqlite3
+import tempfile
+
+import pytest
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import accounting
+import db_migrations
+import db_pool
+import main
+import sales_repository
+
+
+def _build_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT, sale_date TEXT NOT NULL,
+            amount REAL NOT NULL, br_id INTEGER DEFAULT 1, account_id INTEGER)
+    """)
+    conn.execute("""
+        CREATE TABLE accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, parent_id INTEGER, name TEXT NOT NULL,
+            level INTEGER NOT NULL, type TEXT NOT NULL, allow_ledger TEXT NOT NULL)
+    """)
+    conn.executemany("INSERT INTO accounts VALUES (?, ?, ?, ?, ?, ?)", [
+        (1, None, "Income", 1, "INCOME", "no"),
+        (2, 1, "Sales Revenue", 2, "INCOME", "yes"),
+    ])
+    rows = [(f"{y}-{m:02d}-{d:02d}", 100.0 * br + d + m, br, 2)
+            for y in (2024, 2025) for m in range(1, 13) for d in (1, 9, 17, 25) for br in (1, 2, 3)]
+    conn.executemany("INSERT INTO sales (sale_date, amount, br_id, account_id) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    db_migrations.apply_migrations(conn)   # reads never migrate (main.py does it at startup)
+    conn.close()
+
+
+def _raw(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_sqlite_repository_matches_raw_table():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        try:
+            repo = sales_repository.SQLiteSalesRepository(path)
+            raw_month = _raw(path, "SELECT SUM(amount) FROM sales WHERE sale_date LIKE '2025-03-%' AND br_id = 2")[0][0]
+            assert repo.monthly_total(2025, 3, 2) == raw_month
+            assert repo.daily_total("2025-03-09", "ALL") == _raw(path, "SELECT SUM(amount) FROM sales WHERE sale_date = '2025-03-09'")[0][0]
+            assert repo.year_total(2024, "ALL") == _raw(path, "SELECT SUM(amount) FROM sales WHERE sale_date LIKE '2024-%'")[0][0]
+            assert repo.monthly_average(2025, 3, 1) == _raw(path, "SELECT AVG(amount) FROM sales WHERE sale_date LIKE '2025-03-%' AND br_id = 1")[0][0]
+            assert repo.extreme_month(2025, True, "ALL")[0] == 12
+            assert repo.extreme_day("2025-06-01", "2025-07-01", False, 3) == ("2025-06-01", 307.0)
+            assert repo.extreme_branch(2025, 0, True)[0] == 3
+            assert repo.extreme_branch(2025, 5, False)[0] == 1
+            assert len(repo.daily_sums("2025-01-01", "2025-02-01", [1, 2], by_branch=True)) == 8
+            assert len(repo.monthly_sums((2024, 11), (2025, 2), "ALL")) == 4
+            assert repo.years() == [2025, 2024] and repo.branches() == [1, 2, 3]
+            assert repo.find_account("Income") == (1, "no")
+            assert repo.account_balance(1, 2025, 2, ledger=False) == repo.account_balance(2, 2025, 2) == repo.year_total(2025, 2)
+            assert len(repo.hierarchy_tree()) == 2
+        finally:
+            db_pool.close_all_pools()
+
+
+def test_chat_helpers_read_through_repository():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        _build_db(path)
+        main.DB_NAME = path
+        accounting.DB_NAME = path
+        try:
+            assert main.fetch_year_total(2025, 1) == sales_repository.get_repository(path).year_total(2025, 1)
+            assert main.find_extreme_month(2025, "min", 1)[0] == "January"
+            assert accounting.get_account_balance("Income", 2025)[0] == main.fetch_year_total(2025, "ALL")
+            assert main.read_root()["db_status"] == "Connected to DB ✅"
+            assert main.read_stats()["repository"][path]["backend"] == "sqlite"
+        finally:
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            accounting.DB_NAME = "sales.db"
+
+
+def test_reads_never_migrate():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        conn = sqlite3.connect(path)
+        db_migrations._ensure_base_schema(conn)
+        conn.commit()
+        conn.close()
+        main.DB_NAME = path
+        try:
+            assert main.fetch_year_total(2025, 1) is None   # no rollups yet: the helper's fallback
+            with main.get_db() as conn:
+                assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+            db_migrations.ensure_schema(path)   # what the app's startup does
+            assert main.fetch_year_total(2025, 1) == 0.0
+            with main.get_db() as conn:
+                assert conn.execute("PRAGMA user_version").fetchone()[0] == db_migrations.MIGRATIONS[-1][0]
+        finally:
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+
+
+def test_unavailable_backend_falls_back():
+    sales_repository.configure("postgres")
+    try:
+        # No reachable Postgres (or driver): helpers keep their fallback values
+        assert main.fetch_year_total(2025, 1) is None
+        assert main.fetch_monthly_sum_from_db(2025, 1, 1) == 0.0
+        assert main.fetch_daily_sums("2025-01-01", "2025-01-31") == {}
+        assert main.read_root()["db_status"] == "DB Connection Failed ❌"
+    finally:
+        sales_repository.configure("sqlite")
+
+
+def test_postgres_placeholders_and_types():
+    pg = sales_repository.PostgresSalesRepository
+    assert pg._to_numbered("SELECT 1 WHERE a = ? AND b IN (?, ?)") == "SELECT 1 WHERE a = $1 AND b IN ($2, $3)"
+    from datetime import date
+    from decimal import Decimal
+    assert pg._convert(date(2025, 3, 9)) == "2025-03-09"
+    assert pg._convert(Decimal("12.50")) == 12.5
+
+
+def test_postgres_month_and_year_queries_use_date_ranges():
+    class Captured(sales_repository.PostgresSalesRepository):
+        def __init__(self):   # no pool: record the queries instead of running them
+            self.queries = []
+
+        def _all(self, sql, params=()):
+            self.queries.append((sql, tuple(params)))
+            return []
+
+    repo = Captured()
+    repo.monthly_total(2025, 12, 1)
+    repo.monthly_average(2025, 2, 2)
+    repo.year_total(2024, "ALL")
+    repo.extreme_month(2025, True, [1, 3])
+    repo.extreme_branch(2025, 5, False)
+    repo.extreme_branch(2025, 0, True)
+    repo.monthly_sums((2024, 11), (2025, 2), "ALL", by_branch=True)
+    repo.account_balance(2, 2025, 1)
+    repo.account_balance(1, 2025, "ALL", ledger=False)
+    for sql, _ in repo.queries:
+        # Only the daily view groups on a raw column, so only its sale_date filter can use the index
+        assert "sales_rollup_daily" in sql and "sale_date >= ? AND" in sql and "sale_date < ?" in sql, sql
+        assert "rollup_monthly" not in sql and "rollup_yearly" not in sql, sql
+    params = [p for _, p in repo.queries]
+    assert params[0] == ("2025-12-01", "2026-01-01", 1)
+    assert params[2] == ("2024-01-01", "2025-01-01")
+    assert params[4] == ("2025-05-01", "2025-06-01")
+    assert params[6] == ("2024-11-01", "2025-03-01")
+
+
+def test_postgres_repository_parity():
+    pytest.importorskip("psycopg2")
+    try:
+        repo = sales_repository.PostgresSalesRepository(max_size=2)
+    except Exception as e:
+        pytest.skip(f"Postgres not reachable: {e}")
+    try:
+        for year in repo.years()[:1]:
+            assert repo.year_total(year, "ALL") is not None
+            assert repo.stats()["prepares"] >= 1
+            repo.year_total(year, "ALL")
+            assert repo.stats()["queries"] > repo.stats()["prepares"]
+    finally:
+        repo.close()
+
+
+if __name__ == "__main__":
+    try:
+        test_sqlite_repository_matches_raw_table()
+        test_chat_helpers_read_through_repository()
+        test_reads_never_migrate()
+        test_unavailable_backend_falls_back()
+        test_postgres_placeholders_and_types()
+        test_postgres_month_and_year_queries_use_date_ranges()
+        print("All Sales Repository Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
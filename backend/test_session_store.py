@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import session_store
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+
+def test_memory_store_lru_ttl_and_isolation():
+    store = session_store.MemorySessionStore(max_sessions=2, ttl=0.2)
+    ctx = store.load("a")
+    ctx["last_successful"]["text"] = "Sales in June 2025 Branch 1"
+    store.save("a", ctx)
+
+    # load() hands out copies: unsaved changes never leak
+    copy_a = store.load("a")
+    copy_a["last_successful"]["text"] = "changed"
+    assert store.load("a")["last_successful"]["text"] == "Sales in June 2025 Branch 1"
+
+    store.save("b", session_store.new_context())
+    store.load("a")                                  # a is now most recent
+    store.save("c", session_store.new_context())     # evicts b
+    assert store.stats()["evictions"] == 1
+    assert store.load("b") == session_store.new_context()
+    time.sleep(0.25)
+    assert store.load("a") == session_store.new_context()
+    assert store.stats()["expirations"] == 1
+
+
+def test_sqlite_store_is_shared_between_workers():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        try:
+            worker_1 = session_store.SQLiteSessionStore(db_path=path, ttl=60)
+            worker_2 = session_store.SQLiteSessionStore(db_path=path, ttl=60)
+            ctx = worker_1.load("alice")
+            ctx["pending"]["query"] = "Compare sales in June"
+            worker_1.save("alice", ctx)
+            assert worker_2.load("alice")["pending"]["query"] == "Compare sales in June"
+            assert worker_2.load("bob") == session_store.new_context()
+
+            short = session_store.SQLiteSessionStore(db_path=path, ttl=0.1, purge_every=2)
+            short.save("carol", session_store.new_context())
+            time.sleep(0.15)
+            assert short.load("carol") == session_store.new_context()
+            short.save("dave", session_store.new_context())   # second save purges expired rows
+            assert short.stats()["sessions"] == 2              # alice + dave
+        finally:
+            db_pool.close_all_pools()
+
+
+def test_follow_ups_are_per_session():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        session_store.configure("memory")
+        llm_cache.configure(ttl=0)
+        try:
+            with FakeOllama() as ollama:
+                main.OLLAMA_URL = ollama.url
+
+                async def ask(msg, sid):
+                    _, chunks = await asgi_request(main.app, "POST", "/chat",
+                                                   {"message": msg, "role": "ADMIN", "session_id": sid})
+                    return json.loads(b"".join(chunks))["answer"]
+
+                async def scenario():
+                    await ask("Sales in January 2025 Branch 1", "alice")
+                    await ask("Sales in March 2025 Branch 3", "bob")
+                    a = await ask("Compare Branch 2 in January 2025", "alice")
+                    b = await ask("Compare Branch 2 in January 2025", "bob")
+                    c = await ask("Compare Branch 2 in January 2025", "carol")
+                    return a, b, c
+
+                a, b, c = asyncio.run(scenario())
+            # Each follow-up borrows the missing branch from its own session only
+            assert "Branch 2:" in a and "Branch 1:" in a and "Branch 3" not in a
+            assert "Branch 2:" in b and "Branch 3:" in b and "Branch 1" not in b
+            assert "Diff" not in c
+            assert session_store.stats()["sessions"] == 3
+        finally:
+            session_store.configure()
+            llm_cache.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+def test_session_less_clients_get_their_own_context():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        session_store.configure("memory")
+        llm_cache.configure(ttl=0)
+        try:
+            with FakeOllama() as ollama:
+                main.OLLAMA_URL = ollama.url
+
+                async def ask(msg, headers=None, path="/chat"):
+                    got = []
+                    _, chunks = await asgi_request(main.app, "POST", path, {"message": msg, "role": "ADMIN"},
+                                                   headers=headers, response_headers=got)
+                    return b"".join(chunks).decode(), dict(got)
+
+                async def scenario():
+                    _, first = await ask("Sales in January 2025 Branch 1")
+                    other, second = await ask("Compare Branch 2 in January 2025")
+                    cookie = first["set-cookie"].split(";")[0].encode()
+                    again, echoed = await ask("Compare Branch 2 in January 2025", headers=[(b"cookie", cookie)])
+                    await ask("Sales in March 2025 Branch 3", headers=[(b"x-session-id", b"dave")])
+                    by_header, _ = await ask("Compare Branch 2 in March 2025", headers=[(b"x-session-id", b"dave")],
+                                             path="/chat/stream")
+                    return first, other, second, again, echoed, by_header
+
+                first, other, second, again, echoed, by_header = asyncio.run(scenario())
+            # Each session-less client is issued its own id and starts from a fresh context
+            assert first["x-session-id"] != second["x-session-id"]
+            assert first["set-cookie"].startswith(f"{session_store.SESSION_COOKIE}={first['x-session-id']};")
+            assert "Diff" not in other
+            # Sending the issued cookie (or an X-Session-ID header) back continues that context
+            assert echoed["x-session-id"] == first["x-session-id"]
+            assert "Branch 2:" in again and "Branch 1:" in again
+            assert "Branch 2:" in by_header and "Branch 3:" in by_header
+        finally:
+            session_store.configure()
+            llm_cache.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+if __name__ == "__main__":
+    try:
+        test_memory_store_lru_ttl_and_isolation()
+        test_sqlite_store_is_shared_between_workers()
+        test_follow_ups_are_per_session()
+        test_session_less_clients_get_their_own_context()
+        print("All Session Store Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import erp_client
+import sync_engine
+from fake_erp import FakeERP
+
+
+def test_migration_reports_then_removes_duplicate_days():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        conn = sqlite3.connect(path)
+        db_migrations._ensure_base_schema(conn)
+        conn.executemany("INSERT INTO sales (sale_date, amount, br_id) VALUES (?, ?, ?)",
+                         [("2024-12-30", 100.0, 1), ("2024-12-31", 50.0, 1), ("2024-12-30", 100.0, 1),
+                          ("2024-12-30", 70.0, 2)])
+        conn.commit()
+        try:
+            db_migrations.apply_migrations(conn)
+            assert False, "duplicate days were not reported"
+        except db_migrations.DuplicateDaysError as e:
+            assert [(r[0], r[1], r[2]) for r in e.rows] == [(1, 1, "2024-12-30"), (3, 1, "2024-12-30")]
+            assert "br_id=1 sale_date=2024-12-30" in str(e)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 4
+
+        db_migrations.configure(dedupe=True)
+        try:
+            assert db_migrations.apply_migrations(conn) == db_migrations.MIGRATIONS[-1][0]
+        finally:
+            db_migrations.configure()
+        assert conn.execute("SELECT id FROM sales WHERE br_id = 1 ORDER BY sale_date").fetchall() == [(3,), (2,)]
+        rollup = conn.execute(
+            "SELECT SUM(total) FROM sales_rollup_daily WHERE br_id = 1 AND sale_date = '2024-12-30'").fetchone()[0]
+        assert rollup == 100.0
+        conn.close()
+
+
+def test_incremental_sync_upserts_trailing_window():
+    amounts = {}
+
+    def total(br_id, day):
+        return amounts.get((br_id, day), 100.0 * br_id)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        try:
+            with FakeERP(delay=0.2, total_fn=total) as erp:
+                client = erp_client.ERPClient(url=erp.url, branches=[1, 2, 3], ttl=0)
+                # Empty store: full pull, all branches in parallel
+                start = time.perf_counter()
+                first = sync_engine.sync(path, branches=[1, 2, 3], window_days=7, client=client, verbose=False)
+                assert time.perf_counter() - start < 0.5       # sequential would be >= 0.6s
+                assert erp.max_concurrent == 3
+                assert [r["range_days"] for r in first] == [sync_engine.SYNC_MAX_DAYS] * 3
+                assert all(r["changed"] == r["fetched"] == sync_engine.SYNC_MAX_DAYS for r in first)
+
+                # Up to date: only the trailing window is re-pulled and nothing changes
+                second = sync_engine.sync(path, branches=[1, 2, 3], window_days=7, client=client, verbose=False)
+                assert [r["range_days"] for r in second] == [7, 7, 7]
+                assert [r["changed"] for r in second] == [0, 0, 0]
+
+                # A late correction inside the window is applied in place
+                yesterday = (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
+                amounts[(2, yesterday)] = 999.0
+                third = sync_engine.sync(path, branches=[1, 2, 3], window_days=7, client=client, verbose=False)
+                assert [r["changed"] for r in third] == [0, 1, 0]
+                assert all(r["error"] is None and r["rows_per_s"] > 0 for r in third)
+                client.close()
+
+            conn = sqlite3.connect(path)
+            rows, days = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT br_id || '|' || sale_date) FROM sales").fetchone()
+            assert rows == days == 3 * sync_engine.SYNC_MAX_DAYS
+            assert conn.execute("SELECT amount FROM sales WHERE br_id = 2 AND sale_date = ?",
+                                (yesterday,)).fetchone()[0] == 999.0
+            raw = conn.execute("SELECT SUM(amount) FROM sales").fetchone()[0]
+            rollup = conn.execute("SELECT SUM(total) FROM sales_rollup_yearly").fetchone()[0]
+            assert abs(raw - rollup) < 1e-6
+            conn.close()
+        finally:
+            db_pool.close_all_pools()
+
+
+def test_failed_branch_does_not_block_others():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        try:
+            with FakeERP(fail_branches=[2]) as erp:
+                client = erp_client.ERPClient(url=erp.url, branches=[1, 2], ttl=0)
+                results = sync_engine.sync(path, branches=[1, 2], year=date.today().year,
+                                           client=client, verbose=False)
+                client.close()
+            assert results[0]["error"] is None and results[0]["fetched"] > 0
+            assert results[1]["error"] and results[1]["changed"] == 0
+            conn = sqlite3.connect(path)
+            assert conn.execute("SELECT COUNT(*) FROM sales WHERE br_id = 2").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM sales WHERE substr(sale_date, 1, 4) != ?",
+                                (str(date.today().year),)).fetchone()[0] == 0
+            conn.close()
+        finally:
+            db_pool.close_all_pools()
+
+
+def test_postgres_sync_upserts_branch():
+    pytest.importorskip("psycopg2")
+    try:
+        store = sync_engine.PostgresStore()
+    except Exception as e:
+        pytest.skip(f"Postgres not reachable: {e}")
+    year = date.today().year
+    try:
+        with FakeERP() as erp:
+            client = erp_client.ERPClient(url=erp.url, branches=[999], ttl=0)
+            first = sync_engine.sync(branches=[999], year=year, client=client, verbose=False, backend="postgres")
+            again = sync_engine.sync(branches=[999], year=year, client=client, verbose=False, backend="postgres")
+            client.close()
+        assert first[0]["error"] is None and first[0]["changed"] == first[0]["fetched"] > 0
+        assert again[0]["changed"] == 0                      # unchanged amounts are not rewritten
+        assert store.last_days()[999].startswith(f"{year}-")
+        with store.conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*), COUNT(DISTINCT sale_date) FROM sales WHERE br_id = 999")
+            count, days = cur.fetchone()
+            assert count == days == first[0]["fetched"]
+    finally:
+        with store.conn.cursor() as cur:
+            cur.execute("DELETE FROM sales WHERE br_id = 999")
+        store.conn.commit()
+        store.close()
+
+
+if __name__ == "__main__":
+    try:
+        test_migration_reports_then_removes_duplicate_days()
+        test_incremental_sync_upserts_trailing_window()
+        test_failed_branch_does_not_block_others()
+        print("All Sync Engine Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
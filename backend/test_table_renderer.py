@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_migrations
+import db_pool
+import llm_cache
+import main
+import table_renderer
+from benchmark_table_renderer import (DAILY_HEADERS, HIERARCHY_HEADERS, daily_rows, hierarchy_rows,
+                                      legacy_as_table, legacy_psql_table)
+from fake_ollama import FakeOllama
+from loadtest_chat import asgi_request
+
+DB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db")
+
+EDGE_ROWS = [
+    [None, 1, 2.5, "1,234.00", "LKR 300", "12.5%", ""],
+    ["x", -3, float("inf"), "-5", " 7 ", "1e3", "NULL"],
+    [True, 0, -2.25, "abc", "5\n", "-.5", "  "],
+]
+
+
+def test_output_matches_legacy_formatters():
+    hierarchy, daily = hierarchy_rows(300), daily_rows(200)
+    footer = ["Total Sales", "1,000.00"]
+    assert main.format_psql_table(HIERARCHY_HEADERS, hierarchy) == legacy_psql_table(HIERARCHY_HEADERS, hierarchy)
+    assert main.format_psql_table_with_footer(DAILY_HEADERS, daily, footer) == \
+        legacy_psql_table(DAILY_HEADERS, daily, footer)
+    assert main.format_as_table(DAILY_HEADERS, daily) == legacy_as_table(DAILY_HEADERS, daily)
+    headers = ["period", "sales_lkr", "metric", "Month", "x_y", "ID", "average_lkr"]
+    for n in range(len(EDGE_ROWS) + 1):
+        for rows in (EDGE_ROWS[:n], [r[::-1] for r in EDGE_ROWS[:n]]):
+            assert main.format_psql_table(headers, rows) == legacy_psql_table(headers, rows), rows
+            assert main.format_psql_table_with_footer(headers, rows, EDGE_ROWS[0]) == \
+                legacy_psql_table(headers, rows, EDGE_ROWS[0]), rows
+            assert main.format_as_table(headers, rows) == legacy_as_table(headers, rows), rows
+
+
+def test_typed_columns_markdown_and_json():
+    table = table_renderer.build(["month", "sales_lkr", "count"], [["January", 1250000.5, 3], ["Feb|Mar", "980,000.00", 4]],
+                                 footer=["Total", "2,230,000.50", 7])
+    assert [(c.label, c.kind) for c in table.columns] == [("Month", "text"), ("Sales", "number"), ("Count", "number")]
+    assert table.markdown.splitlines()[:3] == ["| Month | Sales | Count |", "|:---|---:|---:|",
+                                               "| January | 1,250,000.50 | 3 |"]
+    assert "Feb\\|Mar" in table.markdown
+    assert table.to_dict() == {
+        "columns": [{"name": "month", "label": "Month", "type": "text"},
+                    {"name": "sales_lkr", "label": "Sales", "type": "number"},
+                    {"name": "count", "label": "Count", "type": "number"}],
+        "rows": [["January", 1250000.5, 3], ["Feb|Mar", 980000.0, 4]],
+        "footer": ["Total", 2230000.5, 7],
+    }
+    assert table.render("html") is table.render("html")   # laid out once
+    with table_renderer.collect() as tables:
+        table_renderer.render(["a"], [[1]])
+    table_renderer.render(["b"], [[2]])
+    assert [t["columns"][0]["name"] for t in tables] == ["a"]
+
+
+def test_chat_response_carries_structured_tables():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        db_migrations.migrated_copy(DB_SOURCE, path)
+        main.DB_NAME = path
+        llm_cache.configure(ttl=0)
+        try:
+            with FakeOllama() as ollama:
+                main.OLLAMA_URL = ollama.url
+                status, chunks = asyncio.run(asgi_request(main.app, "POST", "/chat",
+                                                          {"message": "Sales in Q1 2025 for Branch 1", "role": "ADMIN"}))
+            body = json.loads(b"".join(chunks))
+            assert status == 200
+            table = body["tables"][0]
+            assert [c["type"] for c in table["columns"]] == ["text", "number"]
+            assert len(table["rows"]) == 3 and all(isinstance(r[1], float) for r in table["rows"])
+            assert abs(table["footer"][1] - sum(r[1] for r in table["rows"])) < 0.01
+
+            status, chunks = asyncio.run(asgi_request(main.app, "POST", "/chat", {"message": "hello", "role": "ADMIN"}))
+            assert "tables" not in json.loads(b"".join(chunks))
+        finally:
+            llm_cache.configure()
+            db_pool.close_all_pools()
+            main.DB_NAME = "sales.db"
+            main.OLLAMA_URL = "http://localhost:11434"
+
+
+if __name__ == "__main__":
+    try:
+        test_output_matches_legacy_formatters()
+        test_typed_columns_markdown_and_json()
+        test_chat_response_carries_structured_tables()
+        print("All Table Renderer Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,51 @@
+import difflib
+import os
+import sys
+
+import pytest
+
+# Allow import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import typo_index
+from benchmark_typo_index import MESSAGES, TYPOS, legacy_fuzzy_correct, typo_corpus
+from typo_index import MONTHS, TypoIndex
+
+
+def test_index_matches_difflib_exactly():
+    tokens = TYPOS + typo_corpus() + MONTHS + [w.lower().strip(",.?!") for m in MESSAGES for w in m.split()]
+    tokens += ["x" * 250, "mayyyy" * 40, "", "ma", "junejuly", "jule", "marc", "jun"]
+    for cutoff in (0.6, 0.7, 0.85):
+        index = TypoIndex(MONTHS, cutoff=cutoff)
+        for token in tokens:
+            expected = difflib.get_close_matches(token, MONTHS, n=1, cutoff=cutoff)
+            assert index.correct(token) == (expected[0] if expected else None), (cutoff, token)
+
+
+def test_fuzzy_correct_months_unchanged():
+    typo_index.configure()
+    try:
+        for msg in MESSAGES:
+            assert main.fuzzy_correct_months(msg) == legacy_fuzzy_correct(msg), msg
+        # "octobrrrr" is 3 edits from "october" but still above the 0.7 ratio
+        assert main.fuzzy_correct_months("sales octobrrrr, branch 1") == "sales october branch 1"
+        stats = typo_index.stats()
+        assert stats["memo_hits"] > 0 and stats["compared"] < stats["memo_misses"] * len(MONTHS)
+    finally:
+        typo_index.configure()
+
+
+def test_invalid_cutoff_rejected_like_difflib():
+    with pytest.raises(ValueError):
+        TypoIndex(MONTHS, cutoff=1.5)
+
+
+if __name__ == "__main__":
+    try:
+        test_index_matches_difflib_exactly()
+        test_fuzzy_correct_months_unchanged()
+        test_invalid_cutoff_rejected_like_difflib()
+        print("All Typo Index Tests Passed")
+    except Exception as e:
+        print(f"Test Failed: {e}")
@@ -0,0 +1,282 @@
+"""
+Request Tracing for Mr. Mark Chatbot
+Span trees for individual chat turns. Each turn gets a request id, and the stages
+below it (parser, handlers, fetch_* helpers, accounting, SQL, ERP and Ollama calls)
+record nested spans with their attributes (SQL text and parameters, branch, model)
+and durations. The last TRACE_KEEP traces stay in memory for GET /trace/{id}.
+Turns slower than TRACE_SLOW_MS are also written to the slow_requests table, next
+to query_logs, by the same batched background writer (query_logger.QueryLogger).
+"""
+
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import db_migrations
+import db_pool
+import query_logger
+
+
+# --- CONFIGURATION (env overridable) ---
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))   # turns at least this slow go to slow_requests
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "500"))            # recent traces kept in memory
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))  # per trace; extra spans are counted, not kept
+
+SLOW_INSERT_SQL = ("INSERT INTO slow_requests (request_id, timestamp, endpoint, user_query, duration_ms, "
+                   "sql_count, trace_json) VALUES (?, ?, ?, ?, ?, ?, ?)")
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Span:
+    """One timed step; children are the spans opened while it was current."""
+
+    __slots__ = ("name", "attrs", "start", "duration", "children")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [c.to_dict(origin) for c in list(self.children)]
+        return data
+
+
+class Trace:
+    """Span tree of one chat turn (shared by the worker and ERP pool threads it fans out to)."""
+
+    def __init__(self, endpoint: str, request_id: Optional[str] = None, **attrs):
+        self.request_id = request_id or new_request_id()
+        self.endpoint = endpoint
+        self.timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())   # UTC, like CURRENT_TIMESTAMP
+        self.root = Span(endpoint, attrs)
+        self.spans = 1
+        self.dropped = 0
+        self.sql_count = 0
+        self._lock = threading.Lock()
+
+    def _attach(self, parent: Span, span: Span) -> bool:
+        with self._lock:
+            if self.spans >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return False
+            self.spans += 1
+            if "sql" in span.attrs:
+                self.sql_count += 1
+            parent.children.append(span)
+            return True
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.duration if self.root.duration is not None else time.perf_counter() - self.root.start
+        return round(end * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "request_id": self.request_id,
+                "endpoint": self.endpoint,
+                "timestamp": self.timestamp,
+                "duration_ms": self.duration_ms,
+                "sql_count": self.sql_count,
+                "dropped_spans": self.dropped,
+                "root": self.root.to_dict(self.root.start),
+            }
+
+
+_TRACE: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_SPAN: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Caller-supplied id (X-Request-ID) when it is safe to echo back, else a fresh one."""
+    if incoming and _REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> Optional[str]:
+    trace = _TRACE.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Child of the current span; a no-op (yields None) outside a traced request."""
+    trace = _TRACE.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, attrs)
+    if not trace._attach(_SPAN.get() or trace.root, current):
+        yield None
+        return
+    token = _SPAN.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _SPAN.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator: one span per call, named after the function, with its arguments."""
+    def decorate(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _TRACE.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name, args=[repr(a) for a in args], **{k: repr(v) for k, v in kwargs.items()}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def annotate(**attrs):
+    """Add attributes to the current span (e.g. row counts known only afterwards)."""
+    current = _SPAN.get()
+    if current is not None and _TRACE.get() is not None:
+        current.attrs.update(attrs)
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_RECENT: "OrderedDict[str, Trace]" = OrderedDict()
+_SLOW_LOGGERS: Dict[str, query_logger.QueryLogger] = {}
+_LOCK = threading.Lock()
+_SETTINGS = {"enabled": TRACE_ENABLED, "slow_ms": TRACE_SLOW_MS, "keep": TRACE_KEEP}
+_COUNTS = {"traced": 0, "slow": 0}
+
+
+def _slow_logger(db_path: str) -> query_logger.QueryLogger:
+    key = os.path.abspath(db_path)
+    with _LOCK:
+        logger = _SLOW_LOGGERS.get(key)
+        if logger is None:
+            logger = query_logger.QueryLogger(db_path, insert_sql=SLOW_INSERT_SQL, **query_logger._SETTINGS)
+            _SLOW_LOGGERS[key] = logger
+    return logger
+
+
+def _finish(trace: Trace, db_path: Optional[str], query: str):
+    with _LOCK:
+        _RECENT[trace.request_id] = trace
+        _RECENT.move_to_end(trace.request_id)
+        while len(_RECENT) > _SETTINGS["keep"]:
+            _RECENT.popitem(last=False)
+        _COUNTS["traced"] += 1
+        slow = trace.duration_ms >= _SETTINGS["slow_ms"]
+        if slow:
+            _COUNTS["slow"] += 1
+    if slow and db_path:
+        _slow_logger(db_path).append((trace.request_id, trace.timestamp, trace.endpoint, query, trace.duration_ms,
+                                      trace.sql_count, json.dumps(trace.to_dict(), default=str)))
+
+
+@contextmanager
+def request(endpoint: str, request_id: Optional[str] = None, db_path: Optional[str] = None,
+            query: str = "", **attrs) -> Iterator[Optional[Trace]]:
+    """
+    Trace one chat turn (enter it before handing work to chat_executor, which copies
+    the context). Slow turns are logged to slow_requests in `db_path`.
+    """
+    if not _SETTINGS["enabled"]:
+        yield None
+        return
+    trace = Trace(endpoint, request_id, query=query, **attrs)
+    trace_token = _TRACE.set(trace)
+    span_token = _SPAN.set(trace.root)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        trace.root.duration = time.perf_counter() - trace.root.start
+        _SPAN.reset(span_token)
+        _TRACE.reset(trace_token)
+        _finish(trace, db_path, query)
+
+
+def get_trace(request_id: str, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Recent trace from memory, else the slow_requests row for it (None when unknown)."""
+    with _LOCK:
+        trace = _RECENT.get(request_id)
+    if trace is not None:
+        return trace.to_dict()
+    if not db_path:
+        return None
+    try:
+        logger = _SLOW_LOGGERS.get(os.path.abspath(db_path))
+        if logger is not None:
+            logger.flush()
+        db_migrations.ensure_schema(db_path)
+        with db_pool.connection(db_path) as conn:
+            row = conn.execute("SELECT trace_json FROM slow_requests WHERE request_id = ? ORDER BY id DESC LIMIT 1",
+                               (request_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        print(f"⚠️ Trace Lookup Error: {e}")
+        return None
+
+
+def shutdown(timeout: float = 5.0):
+    """Flush and stop the slow-log writers (app shutdown)."""
+    for logger in list(_SLOW_LOGGERS.values()):
+        logger.close(timeout)
+
+
+def configure(enabled: bool = TRACE_ENABLED, slow_ms: float = TRACE_SLOW_MS, keep: int = TRACE_KEEP):
+    """Drop kept traces, flush the slow log and use new settings (e.g. from tests)."""
+    with _LOCK:
+        _RECENT.clear()
+        _SETTINGS.update(enabled=enabled, slow_ms=slow_ms, keep=max(1, int(keep)))
+        _COUNTS.update(traced=0, slow=0)
+        loggers = list(_SLOW_LOGGERS.values())
+        _SLOW_LOGGERS.clear()
+    for logger in loggers:
+        logger.close()
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        info = dict(_SETTINGS, kept=len(_RECENT), **_COUNTS)
+        loggers = list(_SLOW_LOGGERS.values())
+    info["slow_log"] = {logger.db_path: logger.stats() for logger in loggers}
+    return info
+
+
+# Example usage
+if __name__ == "__main__":
+    with request("chat", query="Sales in June") as t:
+        with span("normalize"):
+            time.sleep(0.002)
+        with span("db", sql="SELECT SUM(total) FROM sales_rollup_monthly WHERE year = ? AND month = ?",
+                  params=[2025, 6]):
+            time.sleep(0.001)
+    print(json.dumps(get_trace(t.request_id), indent=2))
@@ -0,0 +1,144 @@
+"""
+Typo Index for Mr. Mark Chatbot
+Precomputed fuzzy-match index for short vocabularies (month names). Returns exactly what
+difflib.get_close_matches(token, vocabulary, n=1, cutoff) returns, but rejects most
+candidates with precomputed length / letter-count bounds before any SequenceMatcher
+runs, and memoizes whole tokens in an LRU.
+"""
+
+import os
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+
+# --- CONFIGURATION (env overridable) ---
+TYPO_CUTOFF = float(os.getenv("TYPO_CUTOFF", "0.7"))
+TYPO_MEMO_SIZE = int(os.getenv("TYPO_MEMO_SIZE", "4096"))   # distinct tokens remembered
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september",
+          "october", "november", "december"]
+
+
+def _ratio(matches: int, length: int) -> float:
+    """difflib's _calculate_ratio (same float arithmetic, so bounds agree exactly)."""
+    return 2.0 * matches / length if length else 1.0
+
+
+class TypoIndex:
+    """
+    Closest vocabulary word for a token, identical to get_close_matches(n=1).
+
+    difflib scores a pair as 2 * matching_chars / (len(a) + len(b)) and only keeps
+    scores >= cutoff. Two upper bounds on that score are precomputed per word:
+
+    - length bound: at most min(len) characters can match (real_quick_ratio)
+    - letter bound: at most the shared letter counts can match (quick_ratio), summed
+      from a letter -> (word, count) postings list so each token letter is visited once
+
+    Candidates failing either are skipped; survivors get the exact ratio().
+    """
+
+    def __init__(self, vocabulary: Sequence[str], cutoff: float = TYPO_CUTOFF, memo_size: int = TYPO_MEMO_SIZE):
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError(f"cutoff must be in [0.0, 1.0]: {cutoff!r}")
+        self.vocabulary = list(vocabulary)
+        self.cutoff = cutoff
+        self._postings: Dict[str, List[tuple]] = {}    # letter -> [(word, count in word)]
+        for word in self.vocabulary:
+            for ch, count in Counter(word).items():
+                self._postings.setdefault(ch, []).append((word, count))
+        self._by_length: Dict[int, List[str]] = {}   # token length -> words passing the length bound
+        self._lock = threading.Lock()
+        self.correct = lru_cache(maxsize=memo_size)(self._correct)
+
+        # Metrics
+        self._length_skips = 0
+        self._letter_skips = 0
+        self._compared = 0
+
+    def _candidates(self, n: int) -> List[str]:
+        words = self._by_length.get(n)
+        if words is None:
+            words = [w for w in self.vocabulary if _ratio(min(n, len(w)), n + len(w)) >= self.cutoff]
+            self._by_length[n] = words
+        return words
+
+    def _correct(self, token: str) -> Optional[str]:
+        """Best match at or above the cutoff, or None (uncached; use `correct`)."""
+        candidates = self._candidates(len(token))
+        shared = dict.fromkeys(candidates, 0)
+        for ch, count in Counter(token).items():
+            for word, in_word in self._postings.get(ch, ()):
+                if word in shared:
+                    shared[word] += min(count, in_word)
+        matcher = None
+        best = None
+        length_skips, letter_skips, compared = len(self.vocabulary) - len(candidates), 0, 0
+        for word in candidates:
+            if _ratio(shared[word], len(token) + len(word)) < self.cutoff:
+                letter_skips += 1
+                continue
+            if matcher is None:
+                matcher = SequenceMatcher()
+                matcher.set_seq2(token)   # get_close_matches' orientation: token is b, word is a
+            matcher.set_seq1(word)
+            compared += 1
+            score = matcher.ratio()
+            # nlargest((score, word)): ties go to the larger word, as in difflib
+            if score >= self.cutoff and (best is None or (score, word) > best):
+                best = (score, word)
+        with self._lock:
+            self._length_skips += length_skips
+            self._letter_skips += letter_skips
+            self._compared += compared
+        return best[1] if best else None
+
+    def stats(self) -> Dict[str, float]:
+        info = self.correct.cache_info()
+        lookups = info.hits + info.misses
+        with self._lock:
+            return {
+                "words": len(self.vocabulary),
+                "memo_hits": info.hits,
+                "memo_misses": info.misses,
+                "memo_size": info.currsize,
+                "hit_rate": round(info.hits / lookups, 3) if lookups else 0.0,
+                "length_skips": self._length_skips,
+                "letter_skips": self._letter_skips,
+                "compared": self._compared,
+            }
+
+
+# ===============================
+# SHARED INSTANCE
+# ===============================
+_MONTHS_INDEX = TypoIndex(MONTHS)
+
+
+def month_index() -> TypoIndex:
+    return _MONTHS_INDEX
+
+
+def correct_month(token: str) -> Optional[str]:
+    """Month name a (lower-case, punctuation-stripped) token is a typo of, or None."""
+    return _MONTHS_INDEX.correct(token)
+
+
+def configure(cutoff: float = TYPO_CUTOFF, memo_size: int = TYPO_MEMO_SIZE):
+    """Rebuild the month index (e.g. from tests or benchmarks); the memo starts empty."""
+    global _MONTHS_INDEX
+    _MONTHS_INDEX = TypoIndex(MONTHS, cutoff=cutoff, memo_size=memo_size)
+
+
+def stats() -> Dict[str, float]:
+    return _MONTHS_INDEX.stats()
+
+
+# Example usage
+if __name__ == "__main__":
+    for typo in ["octomber", "decamber", "janury", "februry", "mach", "octobrrrr", "branch"]:
+        print(f"{typo} -> {correct_month(typo)}")
+    print(stats())
@@ -2,9 +2,27 @@ CREATE TABLE IF NOT EXISTS sales (
     id SERIAL PRIMARY KEY,
     item_name VARCHAR(255),
     sale_date DATE NOT NULL,
-    amount NUMERIC NOT NULL
+    amount NUMERIC NOT NULL,
+    br_id INTEGER DEFAULT 1,
+    account_id INTEGER
 );
 
+-- One daily total per branch (conflict target for imports and syncs)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sales_br_date ON sales (br_id, sale_date);
+
+-- Chart of accounts (sales rows book to a ledger account via account_id)
+CREATE TABLE IF NOT EXISTS accounts (
+    id SERIAL PRIMARY KEY,
+    parent_id INTEGER REFERENCES accounts(id),
+    name TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('ASSET', 'LIABILITY', 'EQUITY', 'INCOME', 'EXPENSE')),
+    allow_ledger TEXT NOT NULL CHECK (allow_ledger IN ('yes', 'no'))
+);
+
+-- The sales_rollup_* views the chat service reads are created by
+-- backend/sales_repository.py (prepare_postgres_schema) on first connect.
+
 -- Insert sample data (Mocking today's sync)
 INSERT INTO sales (item_name, sale_date, amount) VALUES
 ('Initial_Seed_Data', CURRENT_DATE, 42500);
@@ -36,6 +36,52 @@ const IconLogout = () => (
     <svg width="18" height="18" viewBox="0 0 24 24" fill="none" class="icon" stroke="currentColor" strokeWidth="2"><path d="M9 21H5a2 2 0 0 1-2-2V5a2 2 0 0 1 2-2h4"></path><polyline points="16 17 21 12 16 7"></polyline><line x1="21" y1="12" x2="9" y2="12"></line></svg>
 );
 
+const API_BASE = "http://127.0.0.1:8000";
+
+// One conversation context per browser tab (follow-ups are scoped to it server-side)
+const getSessionId = () => {
+    let id = sessionStorage.getItem("mm_session_id");
+    if (!id) {
+        id = (window.crypto && window.crypto.randomUUID)
+            ? window.crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        sessionStorage.setItem("mm_session_id", id);
+    }
+    return id;
+};
+
+// Streams POST /chat/stream (Server-Sent Events over fetch) and calls
+// onEvent(event, data) for each "table" / "token" / "retract" / "done" event.
+const streamChat = async (payload, onEvent) => {
+    const res = await fetch(`${API_BASE}/chat/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(payload)
+    });
+    if (!res.ok || !res.body) throw new Error(`Stream failed: ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = "message";
+            let data = "";
+            block.split("\n").forEach(line => {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+};
+
 function Chat({ user, onLogout }) {
     const [messages, setMessages] = useState([
         { sender: "bot", text: `Welcome back, ${user.name}. I am ready to analyze your financial data.` }
@@ -256,20 +302,63 @@ function Chat({ user, onLogout }) {
         setIsLoading(true);
         setCopiedIndex(null);
 
+        const payload = {
+            message: userMsg,
+            role: user.role,
+            branch_id: user.branch,
+            session_id: getSessionId()
+        };
+
+        // One bot bubble per request, created by the first event and updated in place
+        const botId = `bot-${Date.now()}`;
+        const renderBot = (text) => {
+            setMessages(prev => prev.some(m => m.id === botId)
+                ? prev.map(m => (m.id === botId ? { ...m, text } : m))
+                : [...prev, { sender: "bot", text, id: botId }]);
+        };
+
+        let streamed = false;
+        let table = "";
+        let analysis = "";
         try {
-            const res = await axios.post("http://127.0.0.1:8000/chat", {
-                message: userMsg,
-                role: user.role,
-                branch_id: user.branch
+            // Table first, then the AI analysis token by token
+            await streamChat(payload, (event, data) => {
+                streamed = true;
+                if (event === "table") {
+                    table = data.answer || "";
+                    renderBot(table);
+                    setIsLoading(false);
+                } else if (event === "token") {
+                    analysis += data.text;
+                    renderBot(`${table}\n\n> **📝 AI Analysis**: ${analysis}`);
+                } else if (event === "retract") {
+                    analysis = "";
+                    renderBot(table);
+                } else if (event === "done") {
+                    renderBot(data.answer ? data.answer : "System Error: Invalid response format.");
+                    setLastResolvedQuery(data.resolved_query ? data.resolved_query : userMsg);
+                }
             });
-            const botResponse = res.data && res.data.answer ? res.data.answer : "System Error: Invalid response format.";
-            const resolvedCtx = res.data && res.data.resolved_query ? res.data.resolved_query : userMsg;
-            setLastResolvedQuery(resolvedCtx);
-
-            setMessages(prev => [...prev, { sender: "bot", text: botResponse }]);
-        } catch (err) {
-            console.error(err);
-            setMessages(prev => [...prev, { sender: "bot", text: "Connection error. Please check system status." }]);
+            if (!streamed) throw new Error("Empty stream");
+        } catch (streamErr) {
+            if (streamed) {
+                // Stream broke mid-way: keep the table if it arrived
+                console.error(streamErr);
+                renderBot(table ? table : "Connection error. Please check system status.");
+                return;
+            }
+            // Streaming unavailable: fall back to the classic endpoint
+            try {
+                const res = await axios.post(`${API_BASE}/chat`, payload);
+                const botResponse = res.data && res.data.answer ? res.data.answer : "System Error: Invalid response format.";
+                const resolvedCtx = res.data && res.data.resolved_query ? res.data.resolved_query : userMsg;
+                setLastResolvedQuery(resolvedCtx);
+
+                setMessages(prev => [...prev, { sender: "bot", text: botResponse }]);
+            } catch (err) {
+                console.error(err);
+                setMessages(prev => [...prev, { sender: "bot", text: "Connection error. Please check system status." }]);
+            }
         } finally {
             setIsLoading(false);
         }